@@ -1,3 +1,5 @@
+import os
+
 # set the 2 fields below to the current academic year
 SEMESTER_YEAR = '2015' # 2015, 2016, etc.
 SEMESTER_SEASON = 'W'  # W or S for Winter and Summer respectively
@@ -15,3 +17,91 @@ FROM_EMAIL_PASS = 'example_password'  # put the corresponding password for the a
 MIN_DELAY_BW_CHECKS = 1200
 MAX_DELAY_BW_CHECKS = 1800
 
+
+# max number of course pages fetched at the same time during a check rotation
+MAX_CONCURRENT_CHECKS = 8
+# seat checks start at MAX_REQUESTS_PER_SECOND per host (i.e courses.students.ubc.ca) and adapt to how the server
+# copes: the rate grows by RATE_INCREASE requests per second for every second responses come back fine, and halves
+# (down to MIN_REQUESTS_PER_SECOND) when a response takes longer than SLOW_RESPONSE_SECONDS, is a throttling or server
+# error or is a blocked page
+MAX_REQUESTS_PER_SECOND = 2
+MIN_REQUESTS_PER_SECOND = 0.1
+RATE_INCREASE = 0.1
+SLOW_RESPONSE_SECONDS = 5
+# max number of login, registration and switch requests per second sent to a single host; they have their own budget
+# so seat checks never hold them up
+ACTION_REQUESTS_PER_SECOND = 2
+# max number of idle keep-alive connections kept open per host
+CONNECTION_POOL_SIZE = 8
+# check sections of the same course through one request to the course's section listing and only fetch the pages
+# of sections that aren't full
+BATCH_SECTION_CHECKS = True
+# the listing doesn't show how many students are registered in a full section, so the page of a section settled by the
+# listing is still fetched every SECTION_PAGE_CHECK_INTERVAL seconds to see it change hands, None to never fetch it
+SECTION_PAGE_CHECK_INTERVAL = 20 * 60
+# number of seconds a login session is trusted without checking, and how many seconds before that runs out the
+# session is refreshed in the background
+SESSION_TTL = 600
+SESSION_REFRESH_MARGIN = 60
+
+# the delay between checks of a course adapts to its activity: courses with changing seat counts or close to full are
+# checked as often as every MIN_CHECK_INTERVAL seconds, quiet courses every MIN_DELAY_BW_CHECKS to MAX_DELAY_BW_CHECKS
+# seconds, and all courses together are checked at most MAX_CHECKS_PER_HOUR times per hour
+MIN_CHECK_INTERVAL = 60
+MAX_CHECKS_PER_HOUR = 120
+# date ranges (inclusive) of add/drop periods where every course is checked more often,
+# i.e [('2015-09-08', '2015-09-18')]
+ADD_DROP_WINDOWS = []
+
+# number of times an email notification is tried before it is dropped and seconds to wait before the first retry,
+# doubled on every retry after
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_DELAY = 5
+
+# failed requests: seconds before a request times out, max number of times a request is sent, the retry delay which
+# starts at up to RETRY_BASE_DELAY seconds and doubles on every retry up to RETRY_MAX_DELAY, and the retry budget where
+# every request sent earns RETRY_BUDGET_RATIO retries on top of RETRY_MIN_BUDGET retries that are always allowed
+REQUEST_TIMEOUT = 15
+MAX_REQUEST_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+RETRY_BUDGET_RATIO = 0.2
+RETRY_MIN_BUDGET = 10
+# an endpoint failing CIRCUIT_FAILURE_THRESHOLD times in a row is skipped for CIRCUIT_COOLDOWN seconds
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 60
+
+# file every seat count observation is appended to, None to keep no history; it can only be used by one running bot at a
+# time, so every bot started from the same directory needs a file of its own
+SEAT_HISTORY_FILE = "seat_history.dat"
+
+# port of the local metrics page (http://127.0.0.1:METRICS_PORT/metrics) and seconds between metric summaries printed
+# to the console, None to turn either off; give every bot running on the same machine a port of its own, e.g. 8765
+METRICS_PORT = None
+METRICS_LOG_INTERVAL = 600
+
+# every exchange with the UBC site is appended to RECORD_FILE when set; when REPLAY_FILE is set, requests are answered
+# from the exchanges recorded in it instead of the network, each delayed by REPLAY_LATENCY seconds
+RECORD_FILE = None
+REPLAY_FILE = None
+REPLAY_LATENCY = 0
+
+# (host, port) the coordinator listens on for workers when the courses are split across several bot processes, i.e
+# ('127.0.0.1', 6000), None to check every course in this process; workers are started with
+# 'python sharding.py HOST PORT WORKER_NAME'. The coordinator and the workers exchange pickled messages and the account
+# password, so the address must be a loopback one (workers on other machines can reach it through an ssh tunnel) and
+# they authenticate with the secret in the SHARD_AUTHKEY environment variable; sharded mode won't start without it
+SHARD_COORDINATOR_ADDRESS = None
+SHARD_AUTHKEY = os.environ.get('SHARD_AUTHKEY')
+
+# file the login session cookies are saved to so a restart can skip logging in again while the session is still valid,
+# None to log in on every start. The CWL account name is added to the file name (i.e session_cookies_bob.lwp) so a run
+# for one account never resumes the session of another
+SESSION_FILE = "session_cookies.lwp"
+
+# section listings with at least PROCESS_PARSE_MIN_BYTES of section rows are parsed by a pool of PARSER_PROCESSES
+# processes so large listings don't hold up the other checks, 0 to parse every page in this process. Sending a listing
+# to another process costs more than parsing it here on a single core and UBC's listings are well under 256 KB, so the
+# pool is off; run 'python bench_parsing.py' to see whether and from which size it pays off on a machine with more cores
+PARSER_PROCESSES = 0
+PROCESS_PARSE_MIN_BYTES = 256 * 1024
@@ -0,0 +1,83 @@
+import courses_manager
+import scheduler
+
+
+class AccountPool(object):
+    """
+    Serves the watch lists of many accounts in one process. Every watched section is fetched once per check no matter
+    how many accounts watch it and the result is handed to each of those accounts' courses; registering and switching
+    then go through the account watching the course. Section pages are fetched with the default account, so it needs
+    its semester set like every other account.
+    """
+    def __init__(self, poller=None):
+        """
+        :param poller: the Poller whose worker threads do the requests of all the accounts
+        """
+        self.accounts = []
+        self.poller = poller if poller is not None else scheduler.Poller()
+
+    def add_account(self, account):
+        """
+        :param account: an AccountSession with its credentials and watch list set
+        """
+        if account not in self.accounts:
+            self.accounts.append(account)
+
+    def remove_account(self, account):
+        """
+        :param account: an AccountSession added with add_account
+        """
+        if account in self.accounts:
+            self.accounts.remove(account)
+
+    def login_all(self, year, season):
+        """
+        Logs every account in concurrently and sets the semester of all of them and of the default account
+
+        :param year: the school year as a string i.e 2015
+        :param season: the season (W or S)
+        :return: a list of the accounts that couldn't log in
+        """
+        def login(account):
+            courses_manager.send_login_request(account.user_id, account.password, account)
+            courses_manager.go_to_semester(year, season, account)
+            return account.session_state.is_valid()
+
+        logins = [(courses_manager.CAS_LOGIN_URL, lambda account=account: login(account)) for account in self.accounts]
+        logins.append((courses_manager.SEMESTER_URL_TEMPLATE, lambda: courses_manager.go_to_semester(year, season)))
+
+        logged_in = self.poller.fetch_all(logins)
+        return [account for account, is_logged_in in zip(self.accounts, logged_in) if not is_logged_in]
+
+    def poll(self, on_checked=None):
+        """
+        Fetches the seating info of every course watched by any of the accounts, once per section
+
+        :param on_checked: a function taking (account, course, seats_info, checked_at) called for every account
+        watching a section as soon as the section's check is done, see Poller.poll
+        :return: a list of (account, course, seats_info) tuples for every course in every account's watch list,
+        seats_info is None if the seating info couldn't be retrieved
+        """
+        watched_courses = [(account, course) for account in self.accounts
+                           for course in courses_manager.get_courses_watch_list(account)]
+
+        shared_courses = {}
+        watchers = {}
+        for account, course in watched_courses:
+            # monitor only courses need every seat count so they are the ones fetched when a section has one
+            if course.course_url not in shared_courses or course.monitor_only:
+                shared_courses[course.course_url] = course
+            watchers.setdefault(course.course_url, []).append((account, course))
+
+        seats_infos = {}
+
+        def hand_out(shared_course, seats_info, checked_at):
+            seats_infos[shared_course.course_url] = seats_info
+            for account, course in watchers[shared_course.course_url]:
+                if course is not shared_course:
+                    course.record_seats_info(seats_info)
+                if on_checked is not None:
+                    on_checked(account, course, seats_info, checked_at)
+
+        self.poller.poll(shared_courses.values(), hand_out)
+        return [(account, course, seats_infos[course.course_url]) for account, course in watched_courses]
@@ -0,0 +1,149 @@
+import itertools
+import threading
+import Queue
+import courses_manager
+import notifications
+
+
+def get_seat_type(course, status):
+    """
+    :param course: the Course object that was checked
+    :param status: the availability status of the check, see courses_manager.get_availability_status
+    :return: 'general' or 'restricted' if status is a seat course can take, None otherwise
+    """
+    if status == "General Seats":
+        return "general"
+    elif status == "Restricted Seats" and course.allow_restricted_seats:
+        return "restricted"
+    return None
+
+
+class ActionPipeline(object):
+    """
+    Registers or switches into the seats found by the checks from a dedicated thread so checking never waits on a
+    registration. Every section is acted on once: a seat seen again while its section is already queued or being
+    registered is ignored. Only one section of a SectionGroup is acted on at a time; once one is registered into
+    the rest of the group is dropped, and if it fails the other sections keep racing. When seats open for several
+    courses at once, the courses with the highest priority go first. A course is removed from the watch list once it
+    has been acted on or dropped and put in the completed queue so the check loop can stop scheduling it.
+    """
+    def __init__(self, user_id, password, notification_dispatcher, notify_email_addr, coordinator=None, account=None):
+        """
+        :param user_id: CWL account user ID
+        :param password: CWL account password
+        :param notification_dispatcher: the NotificationDispatcher the results are emailed with
+        :param notify_email_addr: email to receive notification
+        :param coordinator: the sharding Coordinator whose workers register and switch courses, None to do it here
+        :param account: the AccountSession to register with and whose watch list is used, the default account if
+        not set
+        """
+        self.user_id = user_id
+        self.password = password
+        self.notification_dispatcher = notification_dispatcher
+        self.notify_email_addr = notify_email_addr
+        self.coordinator = coordinator
+        self.account = account
+        # set whenever a course has been acted on so a sleeping check loop can wake up for it
+        self.completed_event = threading.Event()
+        self._actions = Queue.PriorityQueue()
+        self._completed = Queue.Queue()
+        self._claimed_sections = set()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+
+    def publish(self, course, status, detected_at):
+        """
+        Queues a registration or switch for course if status is a seat that course can take
+
+        :param course: the Course object that was checked
+        :param status: the availability status of the check, see courses_manager.get_availability_status
+        :param detected_at: time.time() of when the check finished
+        :return: True if status is a seat course can take, whether it was queued now or before
+        """
+        seat_type = get_seat_type(course, status)
+        if seat_type is None:
+            return False
+
+        section_key = courses_manager.WatchList.get_key(course.name)
+        with self._lock:
+            if section_key in self._claimed_sections or course.group in self._claimed_sections:
+                return True
+            self._claimed_sections.add(section_key)
+            if course.group is not None:
+                self._claimed_sections.add(course.group)
+
+        # the sequence keeps courses of the same priority in the order their seats were found
+        self._actions.put((-course.priority, next(self._sequence), course, seat_type, detected_at))
+        return True
+
+    def get_completed(self):
+        """
+        :return: a list of the courses acted on since the last call
+        """
+        self.completed_event.clear()
+        completed_courses = []
+        try:
+            while True:
+                completed_courses.append(self._completed.get_nowait())
+        except Queue.Empty:
+            return completed_courses
+
+    def _work(self):
+        while True:
+            _, _, course, seat_type, detected_at = self._actions.get()
+            is_success = False
+            try:
+                is_success = self._take_seat(course, seat_type, detected_at)
+            except Exception as e:
+                print "Unexpected error while registering into {0}: {1}".format(course.name, e)
+            finally:
+                self._finish(course, is_success)
+
+    def _finish(self, course, is_success):
+        if course.group is None:
+            finished_courses = [course]
+        elif is_success:
+            # the group is dropped as a whole before its claim could ever be released; sections that failed before
+            # keep their claim and were already dropped on their own
+            with self._lock:
+                finished_courses = [course] + [group_course for group_course in course.group.courses
+                                               if courses_manager.WatchList.get_key(group_course.name)
+                                               not in self._claimed_sections]
+        else:
+            finished_courses = [course]
+            with self._lock:
+                self._claimed_sections.discard(course.group)
+
+        for finished_course in finished_courses:
+            if finished_course in courses_manager.get_courses_watch_list(self.account):
+                courses_manager.remove_course_from_watch(finished_course, self.account)
+            if self.coordinator is not None:
+                self.coordinator.remove_course(finished_course)
+            self._completed.put(finished_course)
+        self.completed_event.set()
+
+    def _take_seat(self, course, seat_type, detected_at):
+        notification_msg = "A " + seat_type + " seat for " + course.name + " has been found!"
+
+        # try register or switch into course
+        is_switching = course.current_registered_section is not None
+        if self.coordinator is not None:
+            if is_switching:
+                is_success = self.coordinator.switch_section(course, detected_at)
+            else:
+                is_success = self.coordinator.register_course(course, detected_at)
+        else:
+            if is_switching:
+                is_success = course.switch_section(self.user_id, self.password, detected_at, self.account)
+            else:
+                is_success = course.register_course(self.user_id, self.password, detected_at, self.account)
+
+        notification_msg = notifications.generate_notification_message(notification_msg, course, is_switching,
+                                                                        is_success)
+        self.notification_dispatcher.notify(self.notify_email_addr, notification_msg, "UBC Course Bot: " + course.name)
+        print notification_msg
+        return is_success
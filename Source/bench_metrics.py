@@ -0,0 +1,42 @@
+import argparse
+import timeit
+import metrics
+
+
+def measure(repeat):
+    """
+    :return: a list of (operation, microseconds per call) tuples for recording every kind of metric
+    """
+    # records to a registry of its own so the metrics of the program are left as they were
+    original_registry = metrics.registry
+    metrics.registry = metrics.MetricsRegistry()
+
+    @metrics.timed('timed')
+    def timed_function():
+        pass
+
+    def time_block():
+        with metrics.timer('timer'):
+            pass
+
+    operations = [
+        ("increment", lambda: metrics.increment('requests')),
+        ("observe", lambda: metrics.observe('connect', 0.003)),
+        ("timer", time_block),
+        ("timed", timed_function),
+        ("untimed call", lambda: None),
+    ]
+    try:
+        return [(name, min(timeit.repeat(operation, number=repeat, repeat=3)) / repeat * 10 ** 6)
+                for name, operation in operations]
+    finally:
+        metrics.registry = original_registry
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Measures the time it takes to record a metric, which is "
+                                                          "added to every request and every check.")
+    argument_parser.add_argument('--repeat', type=int, default=100000, help="calls of every operation measured")
+    args = argument_parser.parse_args()
+
+    print ", ".join("{0} {1:.2f} us".format(name, microseconds) for name, microseconds in measure(args.repeat))
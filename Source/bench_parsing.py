@@ -0,0 +1,89 @@
+import argparse
+import multiprocessing
+import threading
+import time
+import CONFIGS
+import courses_manager
+
+# a section row as it appears in a section listing
+SECTION_ROW_HTML = "<tr class=section{0}><td>{1}</td><td nowrap><a href=/cs/main?pname=subjarea&amp;tname=subjareas&amp;" \
+                   "req=5&amp;dept=CPSC&amp;course=221&amp;section={2:03d}>CPSC 221 {2:03d}</a></td><td>Lecture</td>" \
+                   "<td>1</td><td>Mon Wed Fri</td><td>10:00</td><td>11:00</td><td></td></tr>\n"
+
+
+def build_section_table(section_count):
+    """
+    :param section_count: number of sections in the table
+    :return: the section rows of a section listing with section_count sections, two thirds of them full
+    """
+    return "".join(SECTION_ROW_HTML.format(index % 2 + 1, "Full" if index % 3 else "", index % 1000)
+                   for index in range(section_count))
+
+
+def measure_sections_per_second(table_html, section_count, parse, threads, seconds):
+    """
+    Parses table_html over and over from threads threads at the same time, like the checks of a Poller
+
+    :return: the number of sections parsed per second
+    """
+    parsed_tables = [0] * threads
+    stop_at = time.time() + seconds
+
+    def parse_tables(index):
+        while time.time() < stop_at:
+            parse(table_html)
+            parsed_tables[index] += 1
+
+    parsing_threads = [threading.Thread(target=parse_tables, args=(index,)) for index in range(threads)]
+    for parsing_thread in parsing_threads:
+        parsing_thread.start()
+    for parsing_thread in parsing_threads:
+        parsing_thread.join()
+
+    return sum(parsed_tables) * section_count / float(seconds)
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Measures how many listing sections per second are parsed "
+                                                          "in this process and in parsing pools of every size up to "
+                                                          "the number of cores, to pick PARSER_PROCESSES and "
+                                                          "PROCESS_PARSE_MIN_BYTES.")
+    argument_parser.add_argument('--sections', type=int, nargs='+', default=[100, 1000, 10000],
+                                 help="number of sections of the listings measured")
+    argument_parser.add_argument('--threads', type=int, default=CONFIGS.MAX_CONCURRENT_CHECKS,
+                                 help="number of threads parsing at the same time")
+    argument_parser.add_argument('--seconds', type=float, default=2, help="seconds every measurement takes")
+    args = argument_parser.parse_args()
+
+    core_count = multiprocessing.cpu_count()
+    pool_sizes = sorted(set([1, 2, core_count]) | set(range(1, core_count + 1)))
+    # the pools are forked before the measurements start any thread
+    pools = dict((processes, multiprocessing.Pool(processes)) for processes in pool_sizes)
+
+    print "{0} cores, {1} parsing threads".format(core_count, args.threads)
+    smallest_faster_size = None
+    for section_count in sorted(args.sections):
+        table_html = build_section_table(section_count)
+        in_process_rate = measure_sections_per_second(table_html, section_count, courses_manager._parse_section_rows,
+                                                      args.threads, args.seconds)
+        print "{0} sections ({1} KB): {2:.0f} sections/s in this process".format(section_count, len(table_html) // 1024,
+                                                                                in_process_rate)
+
+        for processes in pool_sizes:
+            pool = pools[processes]
+            pool_rate = measure_sections_per_second(
+                table_html, section_count, lambda table_html: pool.apply(courses_manager._parse_section_rows,
+                                                                         (table_html,)),
+                args.threads, args.seconds)
+            print "  {0:.0f} sections/s with a pool of {1}".format(pool_rate, processes)
+            if pool_rate > in_process_rate and smallest_faster_size is None:
+                smallest_faster_size = len(table_html)
+
+    for pool in pools.values():
+        pool.terminate()
+
+    if smallest_faster_size is None:
+        print "No pool parsed faster than this process; keep PARSER_PROCESSES = 0"
+    else:
+        print "A pool parsed faster from {0} KB on; set PROCESS_PARSE_MIN_BYTES around {1}".format(
+            smallest_faster_size // 1024, smallest_faster_size)
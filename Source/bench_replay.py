@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import resource
+import runpy
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from StringIO import StringIO
+import CONFIGS
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# a session recorded with ExchangeRecorder: a login, setting the semester, the section listing of CPSC 221 first with
+# every section full and then with seats, the pages of 2 of its sections, a registration and a switch
+FIXTURE_FILE = os.path.join(SOURCE_DIR, 'fixtures', 'ubc_session.jsonl')
+# the course of the fixture every benchmarked course is cloned from
+FIXTURE_COURSE_ID = ('CPSC', '221')
+
+# percentiles reported for every stage
+REPORTED_PERCENTILES = [50, 99]
+
+
+def get_course_ids(course_count):
+    """
+    :param course_count: number of courses
+    :return: a list of course_count distinct (department, course number) tuples
+    """
+    course_ids = []
+    for index in range(course_count):
+        department_index, course_index = divmod(index, 900)
+        department = "B" + chr(ord('A') + department_index // 26) + chr(ord('A') + department_index % 26)
+        course_ids.append((department, str(100 + course_index)))
+    return course_ids
+
+
+def build_fixture(fixture_path, output_path, course_ids, full_checks):
+    """
+    Writes a fixture where every course of course_ids gets a copy of the exchanges of the fixture's course
+
+    :param fixture_path: the fixture recorded with ExchangeRecorder
+    :param output_path: the file the fixture for the benchmark is written to
+    :param course_ids: a list of (department, course number) tuples
+    :param full_checks: number of times the first response of a page recorded more than once is replayed, which is how
+    many checks every course stays full for before its seats open
+    """
+    department, course_number = FIXTURE_COURSE_ID
+    url_markers = ["dept={0}&course={1}".format(department, course_number),
+                   "wldel={0}|{1}|".format(department, course_number)]
+
+    exchanges_by_key = {}
+    keys = []
+    with open(fixture_path) as fixture_file:
+        for line in fixture_file:
+            if line.strip():
+                exchange = json.loads(line)
+                key = (exchange['method'], exchange['url'])
+                if key not in exchanges_by_key:
+                    exchanges_by_key[key] = []
+                    keys.append(key)
+                exchanges_by_key[key].append(exchange)
+
+    with open(output_path, 'w') as output_file:
+        for key in keys:
+            exchanges = exchanges_by_key[key]
+            if len(exchanges) > 1:
+                exchanges = [exchanges[0]] * full_checks + exchanges[1:]
+
+            if not any(marker in key[1] for marker in url_markers):
+                for exchange in exchanges:
+                    output_file.write(json.dumps(exchange) + '\n')
+                continue
+
+            for clone_department, clone_course_number in course_ids:
+                for exchange in exchanges:
+                    clone = dict(exchange)
+                    for marker in url_markers:
+                        clone['url'] = clone['url'].replace(
+                            marker, marker.replace(department, clone_department).replace(course_number,
+                                                                                         clone_course_number))
+                    clone['body'] = clone['body'].replace("{0} {1}".format(department, course_number),
+                                                          "{0} {1}".format(clone_department, clone_course_number))
+                    output_file.write(json.dumps(clone) + '\n')
+
+
+def write_watch_list(path, course_ids):
+    """
+    Writes a watch list registering into section 101 and switching from section 103 into section 102 of every course
+    """
+    with open(path, 'w') as watch_list_file:
+        for department, course_number in course_ids:
+            watch_list_file.write("{0} {1} 101, T, F\n".format(department, course_number))
+            watch_list_file.write("{0} {1} 102, T, F, {0} {1} 103\n".format(department, course_number))
+
+
+def get_closed_port():
+    """
+    :return: a local port nothing listens on, so emails fail right away instead of reaching the network
+    """
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def configure(fixture_path, watch_list_path, history_path, args):
+    """
+    Points CONFIGS at the replayed session and takes every wait out of the checks, so the benchmark measures the
+    program rather than its politeness to the server; must run before any other module of the program is imported
+    """
+    CONFIGS.REPLAY_FILE = fixture_path
+    CONFIGS.REPLAY_LATENCY = args.latency
+    CONFIGS.RECORD_FILE = None
+    CONFIGS.SESSION_FILE = None
+    CONFIGS.SEAT_HISTORY_FILE = history_path
+    CONFIGS.METRICS_PORT = None
+    CONFIGS.METRICS_LOG_INTERVAL = None
+    CONFIGS.SHARD_COORDINATOR_ADDRESS = None
+    CONFIGS.SEMESTER_YEAR = '2015'
+    CONFIGS.SEMESTER_SEASON = 'W'
+
+    CONFIGS.MAX_CONCURRENT_CHECKS = args.concurrency
+    CONFIGS.MIN_CHECK_INTERVAL = 0.001
+    CONFIGS.MIN_DELAY_BW_CHECKS = CONFIGS.MAX_DELAY_BW_CHECKS = 0.001
+    CONFIGS.MAX_CHECKS_PER_HOUR = 10 ** 9
+    CONFIGS.MAX_REQUESTS_PER_SECOND = CONFIGS.ACTION_REQUESTS_PER_SECOND = 10 ** 6
+
+    CONFIGS.FROM_EMAIL_HOST = '127.0.0.1'
+    CONFIGS.FROM_EMAIL_PORT = get_closed_port()
+    CONFIGS.EMAIL_MAX_ATTEMPTS = 1
+
+
+def run_main(watch_list_path, timeout, verbose):
+    """
+    Runs main.py like 'python main.py --account ... --watch-list watch_list_path' until every course has been acted on
+
+    :return: True if main.py finished within timeout seconds
+    """
+    os.environ['CWL_PASSWORD'] = 'replay'
+    sys.argv = [os.path.join(SOURCE_DIR, 'main.py'), '--account', 'replay', '--email', 'replay@example.com',
+                '--watch-list', watch_list_path]
+    # answers the 'Press enter to exit' prompt at the end
+    sys.stdin = StringIO('\n')
+    console = sys.stdout
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+    finished = []
+
+    def run():
+        try:
+            runpy.run_path(sys.argv[0], run_name='__main__')
+            finished.append(True)
+        except SystemExit:
+            pass
+
+    main_thread = threading.Thread(target=run)
+    main_thread.daemon = True
+    main_thread.start()
+    main_thread.join(timeout)
+
+    if verbose:
+        # the prompt at the end is left without a new line
+        print
+    sys.stdout = console
+    return bool(finished)
+
+
+def print_report(course_count, elapsed):
+    # imported late so they pick up the configuration
+    import courses_manager
+    import metrics
+
+    replayed = courses_manager.replay_handler.replayed
+    print "{0} courses ({1} sections) acted on in {2:.2f} seconds".format(course_count, course_count * 2, elapsed)
+    print "throughput: {0} requests, {1:.0f} requests/s, {2:.0f} sections/s".format(
+        replayed, replayed / elapsed, course_count * 2 / elapsed)
+
+    print "stage latency (upper bound of the histogram bucket):"
+    for name, (count, percentiles) in sorted(metrics.registry.get_percentiles(REPORTED_PERCENTILES).items()):
+        print "  {0}: {1} times, {2}".format(name, count, ", ".join(
+            "p{0} <= {1:.1f} ms".format(percentile, value * 1000)
+            for percentile, value in zip(REPORTED_PERCENTILES, percentiles)))
+
+    # ru_maxrss is in KB on Linux
+    print "peak RSS: {0:.1f} MB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Runs main.py end to end against a replayed session with "
+                                                          "the UBC site, without any network, and reports the "
+                                                          "throughput, the latency of every stage and the peak memory.")
+    argument_parser.add_argument('--courses', type=int, default=50,
+                                 help="number of courses watched, each with a section to register into and one to "
+                                      "switch into")
+    argument_parser.add_argument('--latency', type=float, default=0,
+                                 help="seconds every replayed response is delayed by")
+    argument_parser.add_argument('--full-checks', type=int, default=3,
+                                 help="number of checks every course stays full for before its seats open")
+    argument_parser.add_argument('--concurrency', type=int, default=CONFIGS.MAX_CONCURRENT_CHECKS,
+                                 help="max number of pages fetched at the same time")
+    argument_parser.add_argument('--fixture', default=FIXTURE_FILE, help="fixture recorded with ExchangeRecorder")
+    argument_parser.add_argument('--timeout', type=float, default=600,
+                                 help="seconds after which the benchmark is considered stuck")
+    argument_parser.add_argument('--verbose', action='store_true', help="show the output of main.py")
+    args = argument_parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_replay')
+    try:
+        course_ids = get_course_ids(args.courses)
+        fixture_path = os.path.join(work_dir, 'fixture.jsonl')
+        watch_list_path = os.path.join(work_dir, 'watch_list.txt')
+        build_fixture(args.fixture, fixture_path, course_ids, args.full_checks)
+        write_watch_list(watch_list_path, course_ids)
+        configure(fixture_path, watch_list_path, os.path.join(work_dir, 'seat_history.dat'), args)
+
+        started_at = time.time()
+        is_finished = run_main(watch_list_path, args.timeout, args.verbose)
+        elapsed = time.time() - started_at
+
+        if not is_finished:
+            print "main.py didn't act on every course within {0:.0f} seconds".format(args.timeout)
+            os._exit(1)
+        print_report(args.courses, elapsed)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import urllib2
+import urlparse
+import CONFIGS
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+# the section listings and section pages of this fixture make up the pages every rotation checks
+FIXTURE_FILE = os.path.join(SOURCE_DIR, 'fixtures', 'ubc_session.jsonl')
+# markup outside the seat summary and the section table, to bring the recorded pages to the size of real ones
+PADDING_HTML = "<tr><td class='nav'><a href=/cs/main?pname=subjarea&amp;tname=subjareas&amp;req=0>Browse</a></td>" \
+               "<td>Term 1</td><td>Mon Wed Fri</td><td>10:00</td><td>11:00</td><td>DMP 310</td></tr>\n" * 150
+CURRENTLY_REGISTERED_HTML = re.compile("(Currently Registered:</td><td align=left><strong>)([0-9]+)")
+
+
+def configure():
+    """
+    Takes every wait out of the requests so the benchmark measures the cache rather than the politeness to the
+    server; must run before any other module of the program is imported
+    """
+    CONFIGS.REPLAY_FILE = None
+    CONFIGS.RECORD_FILE = None
+    CONFIGS.SESSION_FILE = None
+    CONFIGS.MAX_REQUESTS_PER_SECOND = CONFIGS.ACTION_REQUESTS_PER_SECOND = 10 ** 6
+
+
+class SequenceHandler(urllib2.BaseHandler):
+    """
+    urllib2 handler answering every request from a sequence of pages per URL, one page per rotation, like a site whose
+    pages change every now and then. Only with send_validators set, every page gets an ETag and requests carrying the
+    ETag of the current page are answered 304 Not Modified without a body.
+    """
+    # runs before the keep-alive handlers so no request reaches the network
+    handler_order = 100
+
+    def __init__(self, sequences, send_validators):
+        """
+        :param sequences: a dictionary mapping urls to the list of their page in every rotation
+        :param send_validators: if set to True, conditional requests are answered like a server sending ETags
+        """
+        self.sequences = sequences
+        self.send_validators = send_validators
+        # worked out ahead so the CPU measured is the client's only
+        self.etags = dict((body, '"{0}"'.format(hashlib.sha1(body).hexdigest()))
+                          for bodies in sequences.values() for body in bodies)
+        self.rotation = 0
+        # number of body bytes sent
+        self.body_bytes = 0
+
+    def http_open(self, request):
+        # imported late so it picks up the configuration
+        from replay import _make_response
+
+        url = request.get_full_url()
+        body = self.sequences[url][self.rotation]
+        header_text = "Content-Type: text/html;charset=UTF-8\r\n"
+        if self.send_validators:
+            etag = self.etags[body]
+            header_text += "ETag: {0}\r\n".format(etag)
+            if request.get_header('If-none-match') == etag:
+                return _make_response(url, 304, "Not Modified", header_text, "")
+
+        self.body_bytes += len(body)
+        return _make_response(url, 200, "OK", header_text, body)
+
+    https_open = http_open
+
+
+def build_sequences(fixture_path, rotations, change_every, pad):
+    """
+    :param rotations: number of rotations
+    :param change_every: every this many rotations, the listing switches to its other recorded version and the
+    registration count of every section page goes up by 1
+    :param pad: if set to True, the pages are padded to about 40 KB, the size of real ones
+    :return: a tuple (a dictionary mapping the section listing urls to the list of their page in every rotation, the
+    same for the section page urls)
+    """
+    with open(fixture_path) as fixture_file:
+        exchanges = [json.loads(line) for line in fixture_file]
+
+    recorded = {}
+    for exchange in exchanges:
+        if exchange['method'] == 'GET' and 'req=' in exchange['url']:
+            body = exchange['body'].encode('latin-1')
+            if pad:
+                body = body.replace("</body>", PADDING_HTML + "</body>")
+            recorded.setdefault(str(exchange['url']), []).append(body)
+
+    listing_sequences = {}
+    page_sequences = {}
+    for url, bodies in recorded.items():
+        sequence = []
+        for rotation in range(rotations):
+            change_count = rotation // change_every
+            if 'req=3' in url:
+                sequence.append(bodies[change_count % len(bodies)])
+            else:
+                sequence.append(CURRENTLY_REGISTERED_HTML.sub(
+                    lambda match: match.group(1) + str(int(match.group(2)) + change_count), bodies[-1]))
+        (listing_sequences if 'req=3' in url else page_sequences)[url] = sequence
+    return listing_sequences, page_sequences
+
+
+def get_course_name(section_url):
+    """
+    :return: the name of the section a section page url is of (i.e 'CPSC 221 101')
+    """
+    query = urlparse.parse_qs(urlparse.urlparse(section_url).query)
+    return " ".join(query[name][0] for name in ('dept', 'course', 'section'))
+
+
+def measure(listing_sequences, page_sequences, send_validators, use_cache):
+    """
+    Checks every listing and section page once per rotation, like a Poller
+
+    :param send_validators: if set to True, the pages come with ETags, see SequenceHandler
+    :param use_cache: if set to False, the response cache is emptied before every rotation so nothing is saved
+    :return: a tuple (body bytes read per rotation, seconds of CPU per rotation, seconds spent parsing per rotation,
+    the response cache stats)
+    """
+    # imported late so they pick up the configuration
+    import courses_manager
+    import metrics
+    from response_cache import ResponseCache
+
+    sequences = dict(listing_sequences)
+    sequences.update(page_sequences)
+    rotations = len(sequences.values()[0])
+    handler = SequenceHandler(sequences, send_validators)
+    courses_manager.replay_handler = handler
+    courses_manager.default_account = courses_manager.AccountSession()
+    courses_manager.response_cache = ResponseCache()
+    courses = [courses_manager.Course(get_course_name(url)) for url in page_sequences]
+    cache_stats = {"not modified": 0, "unchanged": 0, "changed": 0}
+    # the parse timer of the listings and the section pages tells the parsing saved apart from the rest of a request
+    metrics.registry = metrics.MetricsRegistry()
+
+    cpu_start = sum(os.times()[:2])
+    for rotation in range(rotations):
+        handler.rotation = rotation
+        if not use_cache:
+            for name, count in courses_manager.response_cache.get_stats().items():
+                cache_stats[name] += count
+            courses_manager.response_cache = ResponseCache()
+        for url in listing_sequences:
+            courses_manager.get_section_statuses(url)
+        for course in courses:
+            course.get_seats_info()
+    cpu_seconds = sum(os.times()[:2]) - cpu_start
+
+    for name, count in courses_manager.response_cache.get_stats().items():
+        cache_stats[name] += count
+    parse_histogram = metrics.registry._histograms.get('parse')
+    parse_seconds = parse_histogram.total if parse_histogram is not None else 0.0
+    return float(handler.body_bytes) / rotations, cpu_seconds / rotations, parse_seconds / rotations, cache_stats
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Measures the body bytes read and the CPU spent per "
+                                                          "rotation with the response cache and without it, on the "
+                                                          "listing and section pages of the recorded fixture, for a "
+                                                          "server sending no validators like the UBC site and for "
+                                                          "one sending ETags.")
+    argument_parser.add_argument('--rotations', type=int, default=5000, help="number of rotations")
+    argument_parser.add_argument('--change-every', type=int, default=20,
+                                 help="rotations between changes of the listing and the section pages")
+    argument_parser.add_argument('--pad', action='store_true',
+                                 help="pad the recorded pages to the about 40 KB of real ones")
+    argument_parser.add_argument('--fixture', default=FIXTURE_FILE, help="fixture recorded with ExchangeRecorder")
+    args = argument_parser.parse_args()
+
+    configure()
+    listing_sequences, page_sequences = build_sequences(args.fixture, args.rotations, args.change_every, args.pad)
+    print "{0} rotations of {1} listing(s) and {2} section page(s), changing every {3} rotations".format(
+        args.rotations, len(listing_sequences), len(page_sequences), args.change_every)
+
+    for name, send_validators, use_cache in [("no cache", False, False),
+                                             ("cache, no validators", False, True),
+                                             ("cache, ETags", True, True)]:
+        bytes_per_rotation, cpu_per_rotation, parse_per_rotation, cache_stats = measure(
+            listing_sequences, page_sequences, send_validators, use_cache)
+        print "{0}: {1:.1f} KB read, {2:.3f} ms CPU of which {3:.3f} ms parsing per rotation ({4})".format(
+            name, bytes_per_rotation / 1024, cpu_per_rotation * 1000, parse_per_rotation * 1000,
+            ", ".join("{0} {1}".format(stat, count) for stat, count in sorted(cache_stats.items())))
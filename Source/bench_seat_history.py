@@ -0,0 +1,75 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from seat_history import SeatHistory
+from seat_parser import SeatsInfo
+
+
+def measure_writes(seat_history, section_names, record_count):
+    """
+    Appends record_count observations spread over section_names, one every 10 seconds
+
+    :return: seconds spent appending
+    """
+    seats_infos = [SeatsInfo(random.randint(0, 5), random.randint(0, 300), random.randint(0, 5), 0)
+                   for _ in range(1000)]
+    start = time.time()
+    for index in xrange(record_count):
+        seat_history.append(section_names[index % len(section_names)], index * 10.0, seats_infos[index % 1000])
+    return time.time() - start
+
+
+def measure_query(query, repeat):
+    """
+    :return: milliseconds per call of query, the best of 3
+    """
+    best = None
+    for _ in range(3):
+        start = time.time()
+        for _ in range(repeat):
+            query()
+        elapsed = (time.time() - start) / repeat * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Measures how fast SeatHistory appends observations and "
+                                                          "answers queries as it grows.")
+    argument_parser.add_argument('--records', type=int, default=1000000, help="number of observations appended")
+    argument_parser.add_argument('--sections', type=int, default=1000, help="number of sections observed")
+    argument_parser.add_argument('--repeat', type=int, default=20, help="calls of every query measured")
+    args = argument_parser.parse_args()
+
+    random.seed(0)
+    section_names = ["D{0:03d} {1} 101".format(index // 100, 100 + index % 100) for index in range(args.sections)]
+    work_dir = tempfile.mkdtemp(prefix='bench_seat_history')
+    try:
+        path = os.path.join(work_dir, 'seat_history.dat')
+        seat_history = SeatHistory(path)
+        elapsed = measure_writes(seat_history, section_names, args.records)
+        seat_history.close()
+        print "append: {0} records in {1:.2f} s, {2:.0f} records/s, {3:.2f} us per record, {4:.1f} MB on disk".format(
+            args.records, elapsed, args.records / elapsed, elapsed / args.records * 10 ** 6,
+            os.path.getsize(path) / 1024.0 ** 2)
+
+        start = time.time()
+        seat_history = SeatHistory(path)
+        print "reopen and index: {0:.2f} s".format(time.time() - start)
+
+        section_name = section_names[len(section_names) // 2]
+        end = args.records * 10.0
+        records_per_section = args.records // args.sections
+        for name, query in [
+                ("timeline ({0} records)".format(records_per_section),
+                 lambda: seat_history.get_timeline(section_name)),
+                ("last hour of timeline", lambda: seat_history.get_timeline(section_name, end - 60 * 60, end)),
+                ("changes", lambda: seat_history.get_changes(section_name))]:
+            print "{0}: {1:.3f} ms".format(name, measure_query(query, args.repeat))
+        print "churn rates of every section: {0:.0f} ms".format(measure_query(seat_history.get_churn_rates, 1))
+        seat_history.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
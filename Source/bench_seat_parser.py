@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import re
+import timeit
+from seat_parser import SeatSummaryParser, SeatsInfo, parse_seats_info
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2 has no tracemalloc, the allocations are only measured when run with python 3.9 or later
+    tracemalloc = None
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+# the section pages recorded in this fixture are used as they are and padded to the size of a real section page
+FIXTURE_FILE = os.path.join(SOURCE_DIR, 'fixtures', 'ubc_session.jsonl')
+# markup a real section page has around the seat summary: the header and navigation before it, the schedule and the
+# textbook tables after it; about 40 KB in all
+PAGE_HEAD_HTML = "<tr><td class='nav'><a href=/cs/main?pname=subjarea&amp;tname=subjareas&amp;req=0>Browse</a></td>" \
+                 "<td>Term 1</td><td>Mon Wed Fri</td><td>10:00</td><td>11:00</td><td>DMP 310</td></tr>\n" * 150
+PAGE_TAIL_HTML = PAGE_HEAD_HTML[:len(PAGE_HEAD_HTML) // 2]
+# the part of a section page the seat summary is in
+SEAT_SUMMARY_HTML = re.compile("<table class='table'><tr><td width=200px>Total Seats Remaining.*?</table>", re.DOTALL)
+# size of the chunks a section page is read in, see courses_manager.READ_CHUNK_SIZE
+READ_CHUNK_SIZE = 8192
+
+# the patterns seat counts were found with before SeatSummaryParser, one search of the whole page each
+TOTAL_SEAT_KEY = re.compile("Total Seats Remaining:</td><td align=left><strong>([0-9]+)</strong>")
+CURRENTLY_REGISTERED_KEY = re.compile("Currently Registered:</td><td align=left><strong>([0-9]+)</strong>")
+GENERAL_SEAT_KEY = re.compile("General Seats Remaining:</td><td align=left><strong>([0-9]+)</strong>")
+RESTRICTED_SEAT_KEY = re.compile("Restricted Seats Remaining\*:</td><td align=left><strong>([0-9]+)</strong>")
+
+
+def parse_with_four_regexes(page_html):
+    """
+    Finds the seat counts like Course.get_seats_info did before SeatSummaryParser, with the dictionary it returned
+    turned into a SeatsInfo so the results can be compared
+
+    :return: a SeatsInfo or None if any 1 of the seat counts is not found
+    """
+    tot_seat_match = re.search(TOTAL_SEAT_KEY, page_html)
+    cur_reg_match = re.search(CURRENTLY_REGISTERED_KEY, page_html)
+    gen_seat_match = re.search(GENERAL_SEAT_KEY, page_html)
+    res_seat_match = re.search(RESTRICTED_SEAT_KEY, page_html)
+
+    if tot_seat_match and cur_reg_match and gen_seat_match and res_seat_match:
+        seats_info = {
+            "total seats": int(tot_seat_match.group(1)),
+            "current registered": int(cur_reg_match.group(1)),
+            "general seats": int(gen_seat_match.group(1)),
+            "restricted seats": int(res_seat_match.group(1))
+        }
+        return SeatsInfo(seats_info["total seats"], seats_info["current registered"], seats_info["general seats"],
+                         seats_info["restricted seats"])
+    else:
+        return None
+
+
+def parse_streamed(page_html):
+    """
+    Feeds the page to a SeatSummaryParser in the chunks it is read in, stopping once the seat summary is found like
+    Course.get_seats_info
+
+    :return: a SeatsInfo or None if any 1 of the seat counts is not found
+    """
+    parser = SeatSummaryParser()
+    for start in range(0, len(page_html), READ_CHUNK_SIZE):
+        if parser.feed(page_html[start:start + READ_CHUNK_SIZE]):
+            break
+    return parser.result()
+
+
+def build_pages(fixture_path=FIXTURE_FILE):
+    """
+    :return: a list of (name, page html, expected SeatsInfo) tuples of the recorded section page, the same page at the
+    size of a real one, a full size page whose last seat count is cut off and a full size page without any section,
+    like the one shown for a section that is no longer offered
+    """
+    with open(fixture_path) as fixture_file:
+        exchanges = [json.loads(line) for line in fixture_file]
+    recorded_html = str(next(exchange['body'] for exchange in exchanges if 'req=5' in exchange['url']))
+    recorded_seats_info = parse_with_four_regexes(recorded_html)
+
+    summary_start = SEAT_SUMMARY_HTML.search(recorded_html).start()
+    full_size_html = recorded_html[:summary_start] + PAGE_HEAD_HTML + recorded_html[summary_start:]
+    full_size_html = full_size_html.replace("</body>", PAGE_TAIL_HTML + "</body>")
+    malformed_html = re.sub("(Restricted Seats Remaining\*:</td><td align=left><strong>)[0-9]+", r"\1</strong>",
+                            full_size_html)
+    no_section_html = SEAT_SUMMARY_HTML.sub("<p>The requested section is either no longer offered at UBC Vancouver or "
+                                            "is not being offered this session.</p>", full_size_html)
+
+    return [("recorded", recorded_html, recorded_seats_info),
+            ("full size", full_size_html, recorded_seats_info),
+            ("malformed", malformed_html, None),
+            ("no section", no_section_html, None)]
+
+
+def measure_allocated_bytes(parse, page_html):
+    """
+    :return: the most bytes held at once by the objects parse allocates while parsing page_html, or None if tracemalloc
+    is missing
+    """
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return None
+
+    tracemalloc.start()
+    try:
+        # the first parse compiles and caches whatever parse needs for good
+        parse(page_html)
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        parse(page_html)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def measure(pages, repeat):
+    """
+    :param pages: a list returned by build_pages
+    :param repeat: number of parses every time is measured over
+    :return: a list of (page name, page bytes, parser name, microseconds per parse, bytes allocated per parse or None)
+    tuples for every page and parser
+    :raise ValueError: if a parser gets a page wrong
+    """
+    parsers = [("four regexes", parse_with_four_regexes),
+               ("single pass", parse_seats_info),
+               ("streamed", parse_streamed)]
+    results = []
+    for page_name, page_html, expected_seats_info in pages:
+        for parser_name, parse in parsers:
+            if parse(page_html) != expected_seats_info:
+                raise ValueError("{0} parsed the {1} page as {2}".format(parser_name, page_name, parse(page_html)))
+            seconds = min(timeit.repeat(lambda: parse(page_html), number=repeat, repeat=3)) / repeat
+            results.append((page_name, len(page_html), parser_name, seconds * 10 ** 6,
+                            measure_allocated_bytes(parse, page_html)))
+    return results
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Compares finding the seat counts of a section page with the "
+                                                          "four searches used before SeatSummaryParser against the "
+                                                          "single pass of SeatSummaryParser, on the whole page and "
+                                                          "streamed in chunks. The allocations are only measured with "
+                                                          "python 3.9 or later.")
+    argument_parser.add_argument('--repeat', type=int, default=2000, help="parses every time is measured over")
+    args = argument_parser.parse_args()
+
+    # prints a single value at a time so the output is the same with python 3
+    for page_name, page_bytes, parser_name, microseconds, allocated_bytes in measure(build_pages(), args.repeat):
+        allocated = "" if allocated_bytes is None else ", {0:.1f} KB allocated".format(allocated_bytes / 1024.0)
+        print("{0} page ({1:.1f} KB), {2}: {3:.1f} us{4}".format(page_name, page_bytes / 1024.0, parser_name,
+                                                                 microseconds, allocated))
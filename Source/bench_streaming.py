@@ -0,0 +1,198 @@
+import argparse
+import BaseHTTPServer
+import socket
+import SocketServer
+import threading
+import time
+import CONFIGS
+from bench_seat_parser import build_pages
+from seat_parser import parse_seats_info
+
+# size of the writes a page is sent in
+SEND_CHUNK_SIZE = 8192
+
+
+def configure():
+    """
+    Takes every wait out of the requests so the benchmark measures the reads rather than the politeness to the
+    server; must run before any other module of the program is imported
+    """
+    CONFIGS.REPLAY_FILE = None
+    CONFIGS.RECORD_FILE = None
+    CONFIGS.SESSION_FILE = None
+    CONFIGS.MAX_REQUESTS_PER_SECOND = CONFIGS.ACTION_REQUESTS_PER_SECOND = 10 ** 6
+
+
+class _PageRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers go out with the first chunk of the body
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        # like a real server, the last small write of a page isn't held back for the ack of the one before
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        page_server = self.server.page_server
+        page_html = page_server.page_html
+        self.send_response(200)
+        self.send_header('Content-Type', "text/html;charset=UTF-8")
+        self.send_header('Content-Length', str(len(page_html)))
+        self.end_headers()
+        try:
+            for start in range(0, len(page_html), SEND_CHUNK_SIZE):
+                chunk = page_html[start:start + SEND_CHUNK_SIZE]
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                page_server.count_sent(len(chunk))
+                if page_server.bytes_per_second:
+                    time.sleep(float(len(chunk)) / page_server.bytes_per_second)
+        except socket.error:
+            # the client hung up once it had what it needed
+            self.close_connection = 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        self.page_server.count_connection()
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class PageServer(object):
+    """
+    A local keep-alive HTTP server answering every GET with the same page, sent at bytes_per_second like over a link of
+    that speed. Counts the body bytes it got to send before the client hung up and the connections it accepted.
+    """
+    def __init__(self, page_html, bytes_per_second=None):
+        """
+        :param page_html: the page every request is answered with
+        :param bytes_per_second: the speed the page is sent at, None to send it as fast as possible
+        """
+        self.page_html = page_html
+        self.bytes_per_second = bytes_per_second
+        self.bytes_sent = 0
+        self.connections_accepted = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _PageRequestHandler)
+        self._server.page_server = self
+        self.base_url = "http://127.0.0.1:{0}".format(self._server.server_address[1])
+
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def count_sent(self, byte_count):
+        with self._lock:
+            self.bytes_sent += byte_count
+
+    def count_connection(self):
+        with self._lock:
+            self.connections_accepted += 1
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def check_with_full_read(course):
+    """
+    Checks course like Course.get_seats_info did before the checks were streamed: the whole page is read before it is
+    parsed
+
+    :return: a SeatsInfo or None if any 1 of the seat counts is not found
+    """
+    # imported late so it picks up the configuration
+    import courses_manager
+
+    response = courses_manager._open_url(course.course_url)
+    if response is None:
+        return None
+    try:
+        return parse_seats_info(response.read())
+    finally:
+        response.close()
+
+
+def check_streamed(course):
+    """
+    Checks course with Course.get_seats_info, which stops reading the page once the seat summary is found
+
+    :return: a SeatsInfo or None if any 1 of the seat counts is not found
+    """
+    return course.get_seats_info()
+
+
+def measure(check, page_html, expected_seats_info, checks, bytes_per_second=None):
+    """
+    Checks a course checks times against a PageServer answering with page_html
+
+    :param check: check_with_full_read or check_streamed
+    :param bytes_per_second: the speed of the link to the PageServer, None for as fast as possible
+    :return: a tuple (body bytes read per check, body bytes sent by the server per check, connections opened per
+    check, median seconds per check, mean seconds per check)
+    :raise ValueError: if a check gets the page wrong
+    """
+    # imported late so they pick up the configuration
+    import courses_manager
+    from connection_pool import ConnectionPool
+    from response_cache import ResponseCache
+
+    server = PageServer(page_html, bytes_per_second)
+    try:
+        courses_manager.COURSE_URL_TEMPLATE = server.base_url + "/cs/main?req=5&dept={0}&course={1}&section={2}"
+        courses_manager.http_pool = ConnectionPool(CONFIGS.CONNECTION_POOL_SIZE)
+        courses_manager.default_account = courses_manager.AccountSession()
+        courses_manager.response_cache = ResponseCache()
+        course = courses_manager.Course("CPSC 221 101")
+
+        seconds = []
+        for _ in range(checks):
+            started_at = time.time()
+            seats_info = check(course)
+            seconds.append(time.time() - started_at)
+            if seats_info != expected_seats_info:
+                raise ValueError("{0} found {1}".format(check.__name__, seats_info))
+        # the server may still be sending the rest of the last page
+        time.sleep(0.05)
+
+        stats = courses_manager.http_pool.get_stats()
+        return (float(stats["bytes read"]) / checks, float(server.bytes_sent) / checks,
+                float(stats["connections opened"]) / checks, sorted(seconds)[checks // 2], sum(seconds) / checks)
+    finally:
+        # the idle connections would keep threads of the server waiting for requests
+        courses_manager.http_pool.clear()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Compares the body bytes and the wall time of a seat check "
+                                                          "that reads the whole section page against one that stops "
+                                                          "reading once the seat summary is found, against a local "
+                                                          "server sending a section page of the size of real ones.")
+    argument_parser.add_argument('--checks', type=int, default=200, help="checks per measurement")
+    argument_parser.add_argument('--speeds', type=int, nargs='+', default=[0, 10000, 1000],
+                                 help="speeds of the link to the server in KB/s, 0 for as fast as possible")
+    args = argument_parser.parse_args()
+
+    configure()
+    _, page_html, expected_seats_info = [page for page in build_pages() if page[0] == "full size"][0]
+    print "{0:.1f} KB section page, seat summary ends {1:.1f} KB in".format(
+        len(page_html) / 1024.0, (page_html.index("Restricted Seats Remaining") + 100) / 1024.0)
+
+    for speed in args.speeds:
+        for name, check in [("full read", check_with_full_read), ("streamed", check_streamed)]:
+            bytes_read, bytes_sent, connections, median_seconds, mean_seconds = measure(
+                check, page_html, expected_seats_info, args.checks, speed * 1024 or None)
+            print "{0}, {1}: {2:.1f} KB read, {3:.1f} KB sent, {4:.2f} connections, {5:.2f} ms median, " \
+                  "{6:.2f} ms mean per check".format(speed and "{0} KB/s".format(speed) or "unthrottled", name,
+                                                     bytes_read / 1024, bytes_sent / 1024, connections,
+                                                     median_seconds * 1000, mean_seconds * 1000)
@@ -0,0 +1,47 @@
+import argparse
+import timeit
+from courses_manager import Course, WatchList
+
+
+def build_courses(course_count):
+    """
+    :return: a list of course_count Course objects of distinct sections spread over departments of 1000 sections
+    """
+    return [Course("D{0:03d} {1} {2:03d}".format(index // 1000, 100 + index % 1000 // 10, index % 10),
+                   monitor_only=index % 3 == 0)
+            for index in range(course_count)]
+
+
+def measure(course_count, repeat):
+    """
+    :return: a dictionary mapping every operation to its microseconds per call on a watch list of course_count
+    courses
+    """
+    courses = build_courses(course_count)
+    watch_list = WatchList()
+    for course in courses:
+        watch_list.add(course)
+    # a course in the middle of the list, where a linear scan would spend the most time on average
+    course = courses[course_count // 2]
+    operations = [
+        ("add existing", lambda: watch_list.add(course)),
+        ("lookup", lambda: watch_list.get(course.name)),
+        ("contains", lambda: course in watch_list),
+        ("remove and add", lambda: (watch_list.remove(course), watch_list.add(course))),
+        ("by department", lambda: watch_list.get_by_department("D000")),
+    ]
+    return [(name, min(timeit.repeat(operation, number=repeat, repeat=3)) / repeat * 10 ** 6)
+            for name, operation in operations]
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Measures the time per WatchList operation as the number "
+                                                          "of watched courses grows.")
+    argument_parser.add_argument('--courses', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000],
+                                 help="sizes of the watch lists measured")
+    argument_parser.add_argument('--repeat', type=int, default=10000, help="calls of every operation measured")
+    args = argument_parser.parse_args()
+
+    for course_count in args.courses:
+        print "{0} courses: {1}".format(course_count, ", ".join(
+            "{0} {1:.2f} us".format(name, microseconds) for name, microseconds in measure(course_count, args.repeat)))
@@ -0,0 +1,282 @@
+import httplib
+import socket
+import threading
+import time
+import urllib
+import urllib2
+import metrics
+
+# an unread response body has to be drained before its connection can be reused; bodies larger than this
+# are cheaper to throw away together with the connection
+MAX_DRAIN_BYTES = 256 * 1024
+DRAIN_CHUNK_SIZE = 16 * 1024
+
+# requests that can be sent a second time without doing anything twice on the server
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+def _open_socket(connection):
+    """
+    Opens the TCP connection of an httplib connection with the DNS lookup and the connect timed separately
+
+    :return: the connected socket
+    """
+    with metrics.timer('dns'):
+        addresses = socket.getaddrinfo(connection.host, connection.port, 0, socket.SOCK_STREAM)
+
+    with metrics.timer('connect'):
+        for index, address_info in enumerate(addresses):
+            try:
+                return socket.create_connection(address_info[4][:2], connection.timeout, connection.source_address)
+            except socket.error:
+                if index == len(addresses) - 1:
+                    raise
+
+
+def _is_stale_connection_error(error, request_sent):
+    """
+    :param error: the error raised while sending a request on an idle connection or waiting for its response
+    :param request_sent: True if the request had been written to the connection when error was raised
+    :return: True if the error shows the server had closed the idle connection before any of the response arrived,
+    so the request can't have been acted on; a timeout never does since the server may still be working on the request
+    """
+    if isinstance(error, socket.timeout):
+        return False
+    if not request_sent:
+        return isinstance(error, socket.error)
+    # httplib raises BadStatusLine when the connection closes before the status line, with no line to show
+    return isinstance(error, httplib.BadStatusLine) and (
+        error.line in ('', "''") or error.line.startswith("No status line received"))
+
+
+class _PooledHTTPConnection(httplib.HTTPConnection):
+    pool = None
+
+    def connect(self):
+        self.sock = _open_socket(self)
+        self.pool.connection_opened()
+
+
+class _PooledHTTPSConnection(httplib.HTTPSConnection):
+    pool = None
+
+    def connect(self):
+        sock = _open_socket(self)
+        with metrics.timer('tls'):
+            self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+        self.pool.connection_opened()
+
+
+class ConnectionPool(object):
+    """
+    Keeps idle keep-alive connections around per host so consecutive requests to the same host can skip the
+    TCP and TLS handshakes
+    """
+    def __init__(self, pool_size, ssl_context=None):
+        """
+        :param pool_size: max number of idle connections kept per host
+        :param ssl_context: the ssl.SSLContext https connections are made with, the default one that verifies the
+        server's certificate if not set
+        """
+        self.pool_size = pool_size
+        self.ssl_context = ssl_context
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self.bytes_read = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def connection_opened(self):
+        metrics.increment('connections opened')
+        with self._lock:
+            self.connections_opened += 1
+
+    def body_bytes_read(self, byte_count):
+        with self._lock:
+            self.bytes_read += byte_count
+
+    def get(self, scheme, host, timeout):
+        """
+        :param scheme: 'http' or 'https'
+        :param host: the host (and port) to connect to
+        :param timeout: socket timeout of a newly created connection
+        :return: a tuple (connection, reused) where reused is True if the connection was taken from the pool
+        """
+        with self._lock:
+            self.requests_sent += 1
+            idle_connections = self._idle.get((scheme, host))
+            if idle_connections:
+                return idle_connections.pop(), True
+
+        if scheme == 'https':
+            connection = _PooledHTTPSConnection(host, timeout=timeout, context=self.ssl_context)
+        else:
+            connection = _PooledHTTPConnection(host, timeout=timeout)
+        connection.pool = self
+        return connection, False
+
+    def put(self, scheme, host, connection):
+        """
+        Returns a connection whose last response has been fully read back to the pool
+
+        :param scheme: 'http' or 'https'
+        :param host: the host the connection is connected to
+        :param connection: the connection
+        """
+        with self._lock:
+            idle_connections = self._idle.setdefault((scheme, host), [])
+            if len(idle_connections) < self.pool_size:
+                idle_connections.append(connection)
+                return
+
+        connection.close()
+
+    def clear(self):
+        """
+        Closes every idle connection in the pool
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+
+        for idle_connections in idle.values():
+            for connection in idle_connections:
+                connection.close()
+
+    def get_stats(self):
+        """
+        :return: a dictionary with the number of requests sent, the number of connections (handshakes) opened and
+        the number of response body bytes read
+        """
+        with self._lock:
+            return {
+                "requests sent": self.requests_sent,
+                "connections opened": self.connections_opened,
+                "bytes read": self.bytes_read
+            }
+
+
+class _PooledResponseFile(object):
+    """
+    File like wrapper of a httplib response that hands its connection back to the pool once the body is consumed
+    """
+    def __init__(self, pool, response, release_connection):
+        self._pool = pool
+        self._response = response
+        self._release_connection = release_connection
+        self._read_time = 0.0
+
+    def read(self, amt=None):
+        read_start = time.time()
+        data = self._response.read(amt)
+        self._read_time += time.time() - read_start
+        self._pool.body_bytes_read(len(data))
+        if self._response.isclosed():
+            self._finish()
+        return data
+
+    def readline(self):
+        line = []
+        while True:
+            char = self.read(1)
+            line.append(char)
+            if not char or char == '\n':
+                return ''.join(line)
+
+    def discard(self):
+        """
+        Closes the connection without reading the rest of the body
+        """
+        if self._release_connection is not None:
+            release_connection = self._release_connection
+            self._release_connection = None
+            metrics.observe('body', self._read_time)
+            release_connection(False)
+
+    def close(self):
+        if self._release_connection is None:
+            return
+
+        drain_start = time.time()
+        try:
+            drained = 0
+            while not self._response.isclosed() and drained < MAX_DRAIN_BYTES:
+                chunk = self._response.read(DRAIN_CHUNK_SIZE)
+                if not chunk:
+                    break
+                drained += len(chunk)
+            self._pool.body_bytes_read(drained)
+        except (socket.error, httplib.HTTPException):
+            pass
+        self._read_time += time.time() - drain_start
+
+        self._finish()
+
+    def _finish(self):
+        if self._release_connection is not None:
+            release_connection = self._release_connection
+            self._release_connection = None
+            metrics.observe('body', self._read_time)
+            release_connection(self._response.isclosed() and not self._response.will_close)
+
+
+class _KeepAliveHandlerMixin:
+    def _open_pooled(self, req, scheme):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((name, val) for name, val in req.headers.items() if name not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        while True:
+            connection, reused = self.pool.get(scheme, host, req.timeout)
+            metrics.increment('requests')
+            request_sent = False
+            try:
+                request_start = time.time()
+                connection.request(req.get_method(), req.get_selector(), req.data, headers)
+                request_sent = True
+                response = connection.getresponse()
+                # includes the handshakes when the connection is new, which are also timed on their own
+                metrics.observe('first byte', time.time() - request_start)
+                break
+            except (socket.error, httplib.HTTPException) as e:
+                connection.close()
+                # the server may have closed an idle connection on its side, in which case the request is sent again
+                # on a fresh one; anything else, and any request that isn't safe to send twice, is left to the caller
+                if not (reused and req.get_method() in IDEMPOTENT_METHODS and
+                        _is_stale_connection_error(e, request_sent)):
+                    raise urllib2.URLError(e)
+
+        def release_connection(reusable):
+            if reusable:
+                self.pool.put(scheme, host, connection)
+            else:
+                connection.close()
+
+        response_file = _PooledResponseFile(self.pool, response, release_connection)
+        pooled_response = urllib.addinfourl(response_file, response.msg, req.get_full_url())
+        pooled_response.code = response.status
+        pooled_response.msg = response.reason
+        return pooled_response
+
+
+class KeepAliveHTTPHandler(_KeepAliveHandlerMixin, urllib2.HTTPHandler):
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self._open_pooled(req, 'http')
+
+
+class KeepAliveHTTPSHandler(_KeepAliveHandlerMixin, urllib2.HTTPSHandler):
+    def __init__(self, pool):
+        urllib2.HTTPSHandler.__init__(self)
+        self.pool = pool
+
+    def https_open(self, req):
+        return self._open_pooled(req, 'https')
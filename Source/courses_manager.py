@@ -1,21 +1,35 @@
+from collections import OrderedDict
 from urllib import urlencode
 import urllib2
 import cookielib
+import hashlib
+import httplib
+import multiprocessing
+import os
 import re
+import socket
+import threading
 import time
+import CONFIGS
+import metrics
+from rate_limiter import AdaptiveRateLimiter
+from connection_pool import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+from replay import ExchangeRecorder, ReplayHandler
+from response_cache import ResponseCache
+from retry_policy import CircuitBreakers, RetryPolicy
+from seat_parser import SeatsInfo, SeatSummaryParser
 
 # region String Constants
-# html patterns seat summary
-TOTAL_SEAT_PATTERN = "Total Seats Remaining:</td><td align=left><strong>([0-9]+)</strong>"
-CURRENTLY_REGISTERED_PATTERN = "Currently Registered:</td><td align=left><strong>([0-9]+)</strong>"
-GENERAL_SEAT_PATTERN = "General Seats Remaining:</td><td align=left><strong>([0-9]+)</strong>"
-RESTRICTED_SEAT_PATTERN = "Restricted Seats Remaining\*:</td><td align=left><strong>([0-9]+)</strong>"
-
-# since the above HTML pattern will be used extensively, it makes sense to compile them into keys for better performance
-TOTAL_SEAT_KEY = re.compile(TOTAL_SEAT_PATTERN)
-CURRENTLY_REGISTERED_KEY = re.compile(CURRENTLY_REGISTERED_PATTERN)
-GENERAL_SEAT_KEY = re.compile(GENERAL_SEAT_PATTERN)
-RESTRICTED_SEAT_KEY = re.compile(RESTRICTED_SEAT_PATTERN)
+# html pattern of a section row in a course's section listing; captures the status (Full, Blocked, Restricted, etc. or
+# empty) and the section name
+SECTION_ROW_PATTERN = "<tr class=section[0-9]+><td>(.*?)</td><td[^>]*><a href=[^>]*>(.*?)</a>"
+SECTION_ROW_KEY = re.compile(SECTION_ROW_PATTERN)
+
+# size of the chunks a streamed response body is read in
+READ_CHUNK_SIZE = 8192
+
+# the only listing status that tells the seat counts without the section page: every seat is taken
+FULL_SECTION_STATUS = "Full"
 
 # This program is designed based on Chrome's version of html output so User-Agent is set for Chrome
 REQUEST_USER_AGENT = "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/41.0.2228.0 Safari/537.36"
@@ -24,6 +38,13 @@ REQUEST_USER_AGENT = "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, li
 LOGOUT_BUTTON_HTML = "<input type='submit' name='logout' class='btn btn-danger' value='Logout'/>"
 LOGIN_STATUS_URL = "https://courses.students.ubc.ca/cs/main?submit=Login&IMGSUBMIT.x=50&IMGSUBMIT.y=13&IMGSUBMIT=IMGSUBMIT"
 
+# title of the page shown instead of the requested one when the server suspects scripted traffic; the whole title is
+# matched so pages that merely mention a captcha (i.e in a script or a form widget) aren't taken for it
+BLOCKED_PAGE_HTML = "<title>Access Denied</title>"
+
+# requests that need a login get redirected here once the session has expired
+CAS_LOGIN_URL = "https://cas.id.ubc.ca/ubc-cas/login"
+
 # HTML template for the hidden login fields
 TICKET_HTML_PATTERN = '<input type="hidden" name="lt" value="(.*?)" />'
 IDP_SERVICE_HTML_PATTERN = '<input type="hidden" name="IdP Service" value="(.*?)" />'
@@ -33,65 +54,136 @@ SERVER_HTML_PATTERN = '<input type="hidden" name="Server" value="(.*?)" />'
 # url template for setting school year and season
 SEMESTER_URL_TEMPLATE = "https://courses.students.ubc.ca/cs/main?sessyr={}&sesscd={}"
 
+# format of a course name: department, course number and section i.e CPSC 221 101, EOSC 114 L1A or CPSC 110A 101
+COURSE_NAME_PATTERN = "^[A-Z]{2,4} [0-9]{3}[A-Z]? [A-Z0-9]{3}$"
+COURSE_NAME_KEY = re.compile(COURSE_NAME_PATTERN)
+
 # url template for retrieving the HTML of a course page
 COURSE_URL_TEMPLATE = "https://courses.students.ubc.ca/cs/main?pname=subjarea&tname=subjareas&req=5&dept={0}&course={1}&section={2}"
 
+# url template for retrieving the HTML of a course's section listing (every section of the course in one page)
+COURSE_SECTIONS_URL_TEMPLATE = "https://courses.students.ubc.ca/cs/main?pname=subjarea&tname=subjareas&req=3&dept={0}&course={1}"
+
 # url template for registering into a course
 COURSE_REGISTRATION_URL_TEMPLATE = "https://courses.students.ubc.ca/cs/main?pname=subjarea&tname=subjareas&submit=Register%20Selected&wldel={0}|{1}|{2}"
+
+# urls of the 2 requests for switching sections
+COURSE_SWITCH_URL = "https://courses.students.ubc.ca/cs/main?pname=regi_sections&tname=regi_sections"
+COURSE_SWITCH_CONFIRM_URL = "https://courses.students.ubc.ca/cs/main"
 # endregion
 
-# tracks that list of courses that needs to be monitored
-courses_list = []
+# keep-alive connections shared by every request of every account so the TCP and TLS handshakes are only paid once
+# per connection
+http_pool = ConnectionPool(CONFIGS.CONNECTION_POOL_SIZE)
+
+# request rate to every host; seat checks back off when the server struggles while logins, registrations and switches
+# keep a budget of their own
+rate_limiter = AdaptiveRateLimiter(CONFIGS.MAX_REQUESTS_PER_SECOND, CONFIGS.MIN_REQUESTS_PER_SECOND,
+                                   CONFIGS.RATE_INCREASE, CONFIGS.SLOW_RESPONSE_SECONDS,
+                                   CONFIGS.ACTION_REQUESTS_PER_SECOND)
+
+# how failed requests are retried and which endpoints are skipped for failing too often
+retry_policy = RetryPolicy()
+circuit_breakers = CircuitBreakers()
+
+# last response of every course page and section listing, so unchanged pages are neither downloaded nor parsed again
+response_cache = ResponseCache()
+
+# exchanges with the UBC site are recorded to or replayed from fixture files when set in CONFIGS
+exchange_recorder = ExchangeRecorder(CONFIGS.RECORD_FILE) if CONFIGS.RECORD_FILE else None
+replay_handler = ReplayHandler(CONFIGS.REPLAY_FILE, CONFIGS.REPLAY_LATENCY) if CONFIGS.REPLAY_FILE else None
+
+# processes large section listings are parsed in, see start_parsing_pool
+parsing_pool = None
 
 
 class Course:
-    def __init__(self, name, allow_restricted_seats=True, monitor_only=False, current_registered_section=None):
+    def __init__(self, name, allow_restricted_seats=True, monitor_only=False, current_registered_section=None,
+                 priority=0):
         """
         :param name: the course name in string (i.e 'CPSC 221 101')
         :param allow_restricted_seats: set it to False if doesn't have access to restricted seats
         :param monitor_only: if set to True, will not perform any registering for this course, instead print course status to console
         :param current_registered_section: if already registered in a section or waitlist, set this to that section's name so a switch can be perform
+        :param priority: when seats open for several courses at once, courses with a higher priority are registered first
         """
         self.name = name
         self.course_url = COURSE_URL_TEMPLATE.format(*(url_parameter for url_parameter in name.split()))
+        self.sections_url = COURSE_SECTIONS_URL_TEMPLATE.format(*name.split()[:2])
         self.allow_restricted_seats = allow_restricted_seats
         self.monitor_only = monitor_only
         self.current_registered_section = current_registered_section
+        self.priority = priority
+        # the SectionGroup the course is a candidate section of, if any
+        self.group = None
+
+        # the registration and switch requests are built up front so they can be sent the moment a seat is found
+        self.registration_url = COURSE_REGISTRATION_URL_TEMPLATE.format(*name.split())
+        if current_registered_section is None:
+            self.switch_form_data = None
+        else:
+            self.switch_form_data = build_switch_form_data(current_registered_section, name)
+
+        # result of the last check and whether it differs from the one before
+        self.last_seats_info = None
+        self.seats_changed = True
+        # when the section page was last fetched by a check batched through the listing, see scheduler.Poller
+        self.page_checked_at = None
 
-    def get_seats_info(self):
+    def record_seats_info(self, seats_info):
         """
-        :return: a dictionary with course info in the form:
-            {
-                "total seats": int,
-                "current registered": int,
-                "general seats": int,
-                "restricted seats": int
-            }
-                or returns None if any 1 of the seat info is not found
+        Remembers the result of a check so unchanged results can skip the work done on them
+
+        :param seats_info: the SeatsInfo of the check or None if the check failed
+        """
+        self.seats_changed = seats_info is None or seats_info != self.last_seats_info
+        self.last_seats_info = seats_info
+
+    @metrics.timed('seat check')
+    def get_seats_info(self, account=None):
+        """
+        :param account: the AccountSession to fetch the page with, the default account if not set
+        :return: a SeatsInfo(total_seats, currently_registered, general_seats, restricted_seats) or None if any 1
+        of the seat info is not found
         """
-        response = _URL_request_helper(self.course_url, ["read", "getcode"])
-        if response["getcode"] != 200:
+        parser = SeatSummaryParser()
+        logout_button_finder = _MarkerFinder(LOGOUT_BUTTON_HTML)
+        blocked_page_finder = _MarkerFinder(BLOCKED_PAGE_HTML)
+        parse_times = []
+
+        def consume_chunk(chunk):
+            parse_start = time.time()
+            logout_button_finder.feed(chunk)
+            blocked_page_finder.feed(chunk)
+            is_done = parser.feed(chunk)
+            parse_times.append(time.time() - parse_start)
+            return is_done
+
+        account = account or default_account
+        response_code = _URL_stream_helper(self.course_url, consume_chunk, response_cache, account)
+        if parse_times:
+            metrics.observe('parse', sum(parse_times))
+        if response_code is None:
+            return None
+        if response_code == 304:
+            return response_cache.get_not_modified_result(self.course_url)
+        if response_code != 200:
             print "The course url does not link to a proper course page"
             return None
-
-        page_html = response["read"]
-
-        tot_seat_match = re.search(TOTAL_SEAT_KEY, page_html)
-        cur_reg_match = re.search(CURRENTLY_REGISTERED_KEY, page_html)
-        gen_seat_match = re.search(GENERAL_SEAT_KEY, page_html)
-        res_seat_match = re.search(RESTRICTED_SEAT_KEY, page_html)
-
-        if tot_seat_match and cur_reg_match and gen_seat_match and res_seat_match:
-            seats_info = {
-                "total seats": int(tot_seat_match.group(1)),
-                "current registered": int(cur_reg_match.group(1)),
-                "general seats": int(gen_seat_match.group(1)),
-                "restricted seats": int(res_seat_match.group(1))
-            }
-            return seats_info
-        else:
+        if blocked_page_finder.found:
+            print "The server refused to show {0}, slowing down".format(self.name)
+            rate_limiter.record_response(self.course_url, 0, is_blocked=True)
             return None
 
+        # pages only show the logout button while logged in, so seat checks double as free login status checks
+        if logout_button_finder.found:
+            account.session_state.mark_valid()
+
+        # the seat counts are all that matter in the page so they are their own digest
+        seats_info = parser.result()
+        response_cache.store(self.course_url, seats_info, seats_info)
+        return seats_info
+
     def get_availability_status(self):
         """
         Return the availability status in text. Would like to do this with enums but Python 2.7
@@ -104,96 +196,565 @@ class Course:
             Restricted seat found -> "Restricted Seats"
             None of the above -> "Inconsistent seating info detected"
         """
-        seats_info = self.get_seats_info()
-
-        if not seats_info:
-            return "Failed to get seating info"
-        # no seats available
-        if seats_info["total seats"] == 0:
-            return "No Seats"
-        # general seats available
-        elif seats_info["general seats"] != 0:
-            return "General Seats"
-        # restricted seats available
-        elif seats_info["restricted seats"] != 0:
-            return "Restricted Seats"
-        # error while attempting to get seat info
-        else:
-            return "Inconsistent seating info detected"
+        return get_availability_status(self.get_seats_info())
 
-    def register_course(self, username, password):
+    @metrics.timed('registration')
+    def register_course(self, username, password, detected_at=None, account=None):
         """
         :param username: CWL account name
         :param password: CWL account password
+        :param detected_at: time.time() of when the open seat was detected, used to report how long it took to send
+        the registration request
+        :param account: the AccountSession to register with, the default account if not set
         :return: True if registration was successful, false othterwise
         """
-        if not is_logged_in():
-            send_login_request(username, password)
+        account = account or default_account
+        account.session_state.ensure_logged_in(username, password)
 
-        # need to fix below
-        course_info = self.name.split()
-        register_url = COURSE_REGISTRATION_URL_TEMPLATE.format(course_info[0], course_info[1], course_info[2])
+        _print_time_since_detection(self.name, detected_at)
 
-        response = _URL_request_helper(register_url, ["getcode"])
+        response = _URL_request_helper(self.registration_url, ["getcode"], account=account)
 
-        if response['getcode'] == 200:
+        if response is not None and response['getcode'] == 200:
             return True
         else:
             return False
 
+    def switch_section(self, username, password, detected_at=None, account=None):
+        """
+        Switch from current_registered_section into this section
+
+        :param username: CWL account name
+        :param password: CWL account password
+        :param detected_at: time.time() of when the open seat was detected, used to report how long it took to send
+        the switch requests
+        :param account: the AccountSession to switch with, the default account if not set
+        :return: True if the switch was successful, false otherwise
+        """
+        return switch_course_section(self.current_registered_section, self.name, username, password, detected_at,
+                                     self.switch_form_data, account)
+
+
+class SectionGroup(object):
+    """
+    Candidate sections of a course where any one of them will do, i.e a choice of labs. Each section is watched as
+    its own Course, and since they share the course's section listing they are checked together with a single
+    request. The first section with a seat that can be taken wins and the other sections are dropped.
+    """
+    def __init__(self, section_names, allow_restricted_seats=True, monitor_only=False,
+                 current_registered_section=None, priority=0):
+        """
+        :param section_names: the names of the candidate sections (i.e ['CPSC 221 L1A', 'CPSC 221 L1B']), all of the
+        same course
+        :param allow_restricted_seats: set it to False if doesn't have access to restricted seats
+        :param monitor_only: if set to True, will not perform any registering for these sections, instead print their
+        status to console
+        :param current_registered_section: if already registered in a section of the course, set this to that section's
+        name so the winning section is switched into
+        :param priority: the priority of every section, see Course
+        """
+        self.name = section_names[0] + "".join("|" + name.split()[2] for name in section_names[1:])
+        self.courses = [Course(name, allow_restricted_seats, monitor_only, current_registered_section, priority)
+                        for name in section_names]
+        for course in self.courses:
+            course.group = self
+
+
+class SessionState(object):
+    """
+    Remembers when the login session was last known to be valid so registering and switching don't need an extra
+    is_logged_in request first. A session is trusted for ttl seconds after it was last seen valid (on login, on a
+    login status check or on any page showing the logout button) and is refreshed in the background shortly before
+    that runs out. Being redirected to the CAS login page marks the session as expired right away.
+    """
+    def __init__(self, account, ttl=CONFIGS.SESSION_TTL, refresh_margin=CONFIGS.SESSION_REFRESH_MARGIN):
+        """
+        :param account: the AccountSession whose login session is tracked
+        :param ttl: number of seconds a session is trusted after it was last seen valid
+        :param refresh_margin: number of seconds before the ttl runs out that the session is refreshed in the background
+        """
+        self.account = account
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._verified_at = None
+        self._credentials = None
+        self._refresh_timer = None
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+
+    def set_credentials(self, user_id, password):
+        """
+        :param user_id: CWL account user ID used to refresh the session in the background
+        :param password: CWL account password
+        """
+        with self._lock:
+            self._credentials = (user_id, password)
+
+    def is_valid(self):
+        """
+        :return: True if the session was seen valid less than ttl seconds ago
+        """
+        with self._lock:
+            return self._verified_at is not None and time.time() - self._verified_at < self.ttl
+
+    def mark_valid(self):
+        with self._lock:
+            self._verified_at = time.time()
+            self._schedule_refresh()
+
+    def mark_invalid(self):
+        with self._lock:
+            self._verified_at = None
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+
+    def _schedule_refresh(self, delay=None):
+        # a single timer is kept; it checks when it fires whether traffic has kept the session fresh in the meantime
+        if self._credentials is None or self._refresh_timer is not None:
+            return
+
+        if delay is None:
+            delay = max(self.ttl - self.refresh_margin, 0)
+        self._refresh_timer = threading.Timer(delay, self._refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh(self):
+        with self._lock:
+            self._refresh_timer = None
+            credentials = self._credentials
+            if self._verified_at is None:
+                return
+
+            time_left = self._verified_at + self.ttl - time.time()
+            if time_left > self.refresh_margin:
+                self._schedule_refresh(time_left - self.refresh_margin)
+                return
+
+        self.ensure_logged_in(*credentials, check_first=True)
+
+    def ensure_logged_in(self, user_id, password, check_first=False):
+        """
+        Logs in if the session isn't known to be valid; no request is made while it is
+
+        :param user_id: CWL account user ID
+        :param password: CWL account password
+        :param check_first: if set to True, the session is checked with is_logged_in even when it is trusted
+        """
+        if self.is_valid() and not check_first:
+            return
+
+        with self._login_lock:
+            if self.is_valid() and not check_first:
+                return
+            if not is_logged_in(self.account):
+                send_login_request(user_id, password, self.account)
+
+
+class WatchList(object):
+    """
+    The courses watched by an account, indexed by their normalized (dept, course, section) so adding, removing and
+    looking up a course takes the same time no matter how many courses are watched. Courses are also indexed by
+    department and by the action taken when a seat is found. Iterating goes over a snapshot, so courses can be
+    removed while a rotation is going through them.
+    """
+    # actions taken when a seat is found
+    MONITOR = "monitor"
+    REGISTER = "register"
+    SWITCH = "switch"
+
+    def __init__(self):
+        self._courses = OrderedDict()
+        self._by_department = {}
+        self._by_action = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(course_name):
+        """
+        :param course_name: the course name in string (i.e 'CPSC 221 101')
+        :return: the normalized (dept, course, section) tuple of the course
+        """
+        return tuple(course_name.upper().split())
+
+    @staticmethod
+    def get_action(course):
+        """
+        :param course: a Course object
+        :return: the action taken when a seat is found for course: MONITOR, REGISTER or SWITCH
+        """
+        if course.monitor_only:
+            return WatchList.MONITOR
+        elif course.current_registered_section is not None:
+            return WatchList.SWITCH
+        else:
+            return WatchList.REGISTER
+
+    def add(self, course):
+        """
+        :param course: a Course object
+        :return: True if course was added, False if a course for the same section is already watched
+        """
+        key = self.get_key(course.name)
+        with self._lock:
+            if key in self._courses:
+                return False
+            self._courses[key] = course
+            self._by_department.setdefault(key[0], {})[key] = course
+            self._by_action.setdefault(self.get_action(course), {})[key] = course
+            return True
+
+    def remove(self, course):
+        """
+        :param course: a Course object or the name of the course
+        :return: True if the course was removed, False if it isn't watched
+        """
+        key = self.get_key(course if isinstance(course, basestring) else course.name)
+        with self._lock:
+            watched_course = self._courses.pop(key, None)
+            if watched_course is None:
+                return False
+            del self._by_department[key[0]][key]
+            del self._by_action[self.get_action(watched_course)][key]
+            return True
+
+    def get(self, course_name):
+        """
+        :param course_name: the course name in string (i.e 'CPSC 221 101')
+        :return: the watched Course object for the section or None if it isn't watched
+        """
+        return self._courses.get(self.get_key(course_name))
+
+    def get_by_department(self, department):
+        """
+        :param department: the department code i.e CPSC
+        :return: a list of the watched courses of the department
+        """
+        with self._lock:
+            return self._by_department.get(department.upper(), {}).values()
+
+    def get_by_action(self, action):
+        """
+        :param action: MONITOR, REGISTER or SWITCH
+        :return: a list of the watched courses with that action
+        """
+        with self._lock:
+            return self._by_action.get(action, {}).values()
+
+    def __contains__(self, course):
+        return self.get_key(course if isinstance(course, basestring) else course.name) in self._courses
+
+    def __len__(self):
+        return len(self._courses)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(self._courses.values())
+
+
+class AccountSession(object):
+    """
+    Everything that belongs to one CWL account: its cookies, its login session and its course watch list. Accounts
+    only differ in their cookies so the keep-alive connections of http_pool and the response cache are shared by all
+    of them, which lets one process serve many accounts.
+    """
+    def __init__(self, user_id=None, password=None, notify_email_addr=None, cookie_file=None):
+        """
+        :param user_id: CWL account user ID
+        :param password: CWL account password
+        :param notify_email_addr: email to receive notification for this account's courses
+        :param cookie_file: file the cookies are saved to by save_session so the login session survives a restart,
+        None to keep them in memory only; the account's user ID is added to the file name, see get_session_file
+        """
+        self.user_id = user_id
+        self.password = password
+        self.notify_email_addr = notify_email_addr
+        self.watch_list = WatchList()
+        self.session_state = SessionState(self)
+
+        # cookie handler is required for all activities that requires authentication; the jar has no file until the
+        # account it belongs to is known, so a session saved for one account is never resumed for another
+        self.session_file = cookie_file
+        self.cookie_jar = cookielib.LWPCookieJar() if cookie_file else cookielib.CookieJar()
+        if user_id is not None:
+            self.use_session_file_of(user_id)
+        handlers = [urllib2.HTTPCookieProcessor(self.cookie_jar),
+                    KeepAliveHTTPHandler(http_pool),
+                    KeepAliveHTTPSHandler(http_pool)]
+        handlers.extend(handler for handler in (exchange_recorder, replay_handler) if handler is not None)
+        self.opener = urllib2.build_opener(*handlers)
+        self.opener.addheaders = [('User-agent', REQUEST_USER_AGENT)]
+
+    def use_session_file_of(self, user_id):
+        """
+        Saves and loads the cookies with the cookie file of user_id, if the account has a cookie file
+
+        :param user_id: CWL account user ID the session is logged into
+        """
+        if self.session_file is not None:
+            self.cookie_jar.filename = get_session_file(self.session_file, user_id)
+
+
+# the account used when no account is given, which is the only one when a single account is used
+default_account = AccountSession(cookie_file=CONFIGS.SESSION_FILE)
+
+
+def _print_time_since_detection(course_name, detected_at):
+    """
+    :param course_name: name of the course being registered or switched into
+    :param detected_at: time.time() of when the open seat was detected or None
+    """
+    if detected_at is not None:
+        metrics.observe('detection to request', time.time() - detected_at)
+        print "Sending request for {0} {1:.1f} ms after detecting the seat".format(course_name,
+                                                                                  (time.time() - detected_at) * 1000)
+
+
+class _MarkerFinder(object):
+    """
+    Looks for a marker string in a body that is fed in chunks, including markers split across 2 chunks
+    """
+    def __init__(self, marker):
+        self.marker = marker
+        self.found = False
+        self._tail = ''
+
+    def feed(self, chunk):
+        """
+        :param chunk: the next chunk of the body
+        :return: True once the marker has been found
+        """
+        if not self.found:
+            text = self._tail + chunk
+            self.found = text.find(self.marker) != -1
+            self._tail = text[-(len(self.marker) - 1):]
+        return self.found
+
+
+def get_section_statuses(sections_url):
+    """
+    Fetches a course's section listing and extracts the listing status of every section in it
+
+    :param sections_url: the url of the section listing, see Course.sections_url
+    :return: a dictionary mapping section names (i.e 'CPSC 221 101') to their status text ('Full', 'Blocked',
+    'Restricted', '' etc.) or None if the listing couldn't be retrieved
+    """
+    response = _URL_request_helper(sections_url, ["read", "getcode"], cache=response_cache)
+    if response is None:
+        return None
+    if response["getcode"] == 304:
+        return response_cache.get_not_modified_result(sections_url)
+    if response["getcode"] != 200:
+        print "The url does not link to a proper section listing"
+        return None
+
+    page_html = response["read"]
+    if BLOCKED_PAGE_HTML in page_html:
+        print "The server refused to show the section listing, slowing down"
+        rate_limiter.record_response(sections_url, 0, is_blocked=True)
+        return None
+
+    # only the section table is hashed since the rest of the page can change without the sections changing
+    table_start = page_html.find("<tr class=section")
+    table_end = page_html.find("</table>", table_start)
+    table_html = page_html[table_start:table_end]
+    digest = hashlib.sha1(table_html).digest()
+
+    section_statuses = response_cache.lookup(sections_url, digest)
+    if section_statuses is not None:
+        return section_statuses
+
+    with metrics.timer('parse'):
+        section_statuses = dict(parse_section_rows(table_html))
+
+    response_cache.store(sections_url, digest, section_statuses)
+    return section_statuses
+
+
+def _parse_section_rows(table_html):
+    return [(" ".join(section_name.split()), status.strip())
+            for status, section_name in SECTION_ROW_KEY.findall(table_html)]
+
 
-def add_course_to_watch(course):
+def start_parsing_pool(processes=CONFIGS.PARSER_PROCESSES):
     """
-    Add a course to watch list if there doesn't already exist in the list
+    Starts the processes large section listings are parsed in. Forking while other threads hold locks can leave the
+    children stuck on them, so this must be called before any other thread is started.
+
+    :param processes: number of processes, 0 to parse every listing in this process
+    """
+    global parsing_pool
+    if processes and parsing_pool is None:
+        parsing_pool = multiprocessing.Pool(processes)
+
+
+def parse_section_rows(table_html):
+    """
+    Parses the section table of a section listing. Once start_parsing_pool has been called, tables of at least
+    CONFIGS.PROCESS_PARSE_MIN_BYTES are parsed in the parsing pool so the regex doesn't hold the GIL while the other
+    checks' threads wait; bench_parsing.py measures where that starts to pay off.
+
+    :param table_html: the section rows of a section listing
+    :return: a list of (section name, status) tuples of every section in the table
+    """
+    if parsing_pool is not None and len(table_html) >= CONFIGS.PROCESS_PARSE_MIN_BYTES:
+        try:
+            return parsing_pool.apply(_parse_section_rows, (table_html,))
+        except Exception as e:
+            print "Parsing in the parsing pool failed, parsing here instead: {0}".format(e)
+
+    return _parse_section_rows(table_html)
+
+
+def get_seats_info_from_section_status(section_status):
+    """
+    Derives the seating info from a section's listing status when the listing alone is enough
+
+    :param section_status: the status text of the section in the section listing
+    :return: a SeatsInfo with currently_registered set to None since the listing doesn't show it, or None if the
+    section page is needed to know the seat counts
+    """
+    if section_status != FULL_SECTION_STATUS:
+        return None
+
+    return SeatsInfo(total_seats=0, currently_registered=None, general_seats=0, restricted_seats=0)
+
+
+def get_availability_status(seats_info):
+    """
+    Return the availability status in text for seating info that has already been retrieved
+
+    :param seats_info: a SeatsInfo returned by Course.get_seats_info or None
+    :return: a string representing a course's status, see Course.get_availability_status
+    """
+    if not seats_info:
+        return "Failed to get seating info"
+    # no seats available
+    if seats_info.total_seats == 0:
+        return "No Seats"
+    # general seats available
+    elif seats_info.general_seats != 0:
+        return "General Seats"
+    # restricted seats available
+    elif seats_info.restricted_seats != 0:
+        return "Restricted Seats"
+    # error while attempting to get seat info
+    else:
+        return "Inconsistent seating info detected"
+
+
+def add_course_to_watch(course, account=None):
+    """
+    Add a course to watch list if its section isn't already in the list
     :param course: a Course object
+    :param account: the AccountSession whose watch list is used, the default account if not set
     """
-    if course not in courses_list:
-        courses_list.append(course)
+    if not (account or default_account).watch_list.add(course):
+        print "{0} is already being watched".format(course.name)
 
-def remove_course_from_watch(course):
+def remove_course_from_watch(course, account=None):
     """
-    Remove a course to watch list and catch exception if its not found
+    Remove a course from watch list and print a message if its not found
     :param course: a Course object
+    :param account: the AccountSession whose watch list is used, the default account if not set
     """
-    if course not in courses_list:
-        try:
-            courses_list.remove(course)
-        except ValueError:
-            print "Course doesn't exist in watch list. Check for logic errors in adding course to watch list."
+    if not (account or default_account).watch_list.remove(course):
+        print "Course doesn't exist in watch list. Check for logic errors in adding course to watch list."
+
 
+def get_courses_watch_list(account=None):
+    """
+    :param account: the AccountSession whose watch list is returned, the default account if not set
+    :return: The course watch list, a WatchList
+    """
+    return (account or default_account).watch_list
 
-def get_courses_watch_list():
+
+def is_valid_course_name(course_name):
     """
-    :return: The course watch list
+    :param course_name: the course name in string (i.e 'CPSC 221 101')
+    :return: True if course_name has a department, a course number and a section
     """
-    return courses_list
+    return COURSE_NAME_KEY.match(" ".join(course_name.upper().split())) is not None
 
 
-def _install_cookie_opener():
+def get_session_file(session_file, user_id):
     """
-    Installs cookie opener for cookie handling, which is required for the login procedure
+    :param session_file: the cookie file given to AccountSession, i.e session_cookies.lwp
+    :param user_id: CWL account user ID
+    :return: the file the cookies of user_id are saved to, i.e session_cookies_bob.lwp
     """
-    cookie_jar = cookielib.CookieJar()
-    opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cookie_jar))
-    opener.addheaders = [('User-agent', REQUEST_USER_AGENT)]
-    urllib2.install_opener(opener)
+    root, extension = os.path.splitext(session_file)
+    return "{0}_{1}{2}".format(root, re.sub("[^a-z0-9]", "_", user_id.lower()), extension)
 
 
-def send_login_request(user_id, password):
+def save_session(account=None):
+    """
+    Saves the cookies of the account, which hold its login session, if it has a cookie file and is known to belong to a
+    user ID
+
+    :param account: the AccountSession to save, the default account if not set
+    """
+    cookie_jar = (account or default_account).cookie_jar
+    if not isinstance(cookie_jar, cookielib.FileCookieJar) or cookie_jar.filename is None:
+        return
+
+    # the cookies log into the account so only the user may read them; the file is made private before anything is
+    # written to it, including a file left readable by an older run
+    os.close(os.open(cookie_jar.filename, os.O_WRONLY | os.O_CREAT, 0600))
+    # os.fchmod is missing on Windows, where the mode only sets the file read-only or not
+    os.chmod(cookie_jar.filename, 0600)
+
+    # the login session cookies are session cookies, which the jar would otherwise leave out
+    cookie_jar.save(ignore_discard=True, ignore_expires=True)
+
+
+def resume_session(user_id, password, account=None):
+    """
+    Loads the cookies saved by save_session and checks whether their login session is still valid, which saves a
+    full login after a restart
+
+    :param user_id: CWL account user ID used to log in again once the session expires
+    :param password: CWL account password
+    :param account: the AccountSession to resume, the default account if not set
+    :return: True if the saved session is still logged in, False if a login is needed
+    """
+    account = account or default_account
+    account.session_state.set_credentials(user_id, password)
+    account.use_session_file_of(user_id)
+
+    cookie_jar = account.cookie_jar
+    if not isinstance(cookie_jar, cookielib.FileCookieJar) or not os.path.exists(cookie_jar.filename):
+        return False
+    try:
+        cookie_jar.load(ignore_discard=True, ignore_expires=True)
+    except (cookielib.LoadError, IOError) as e:
+        print "Unable to load the saved session: {0}".format(e)
+        return False
+
+    return is_logged_in(account)
+
+
+@metrics.timed('login')
+def send_login_request(user_id, password, account=None):
     """
     Sends a post request with the required authentication fields to login user so tasks like course registration and
     section switching can be perform
 
     :param user_id: CWL account user ID
     :param password: CWL account password
+    :param account: the AccountSession to log in, the default account if not set
     """
-    login_url1 = "https://cas.id.ubc.ca/ubc-cas/login/"
-
-    # cookie handler is required for all activities that requires authentication
-    if urllib2._opener is None:
-        _install_cookie_opener()
-
-    response = _URL_request_helper(login_url1, ["read", "info"])
+    account = account or default_account
+    login_url1 = CAS_LOGIN_URL + "/"
+    account.session_state.set_credentials(user_id, password)
+    account.use_session_file_of(user_id)
+
+    response = _URL_request_helper(login_url1, ["read", "info"], account=account)
+    if response is None:
+        print "Unable to reach the login page"
+        return
     resp_html = response["read"]
     resp_info = response["info"]
 
@@ -220,48 +781,53 @@ def send_login_request(user_id, password):
     }
 
     # login URL with JSESSIONID
-    login_url2 = "https://cas.id.ubc.ca/ubc-cas/login;jsessionid=" + jsession_val.group(1)
+    login_url2 = CAS_LOGIN_URL + ";jsessionid=" + jsession_val.group(1)
 
-    _URL_request_helper(login_url2, [], login_form_data)
+    if _URL_request_helper(login_url2, [], login_form_data, account=account) is None:
+        print "Unable to send the login request"
+        return
 
     # log into the course section of Student Service; courses can be added or switched after this process
     course_service_login_url = "https://courses.students.ubc.ca/cs/secure/login"
-    urllib2.urlopen(course_service_login_url)
+    logout_button_finder = _MarkerFinder(LOGOUT_BUTTON_HTML)
+    if _URL_stream_helper(course_service_login_url, logout_button_finder.feed, account=account) is None:
+        return
+
+    if logout_button_finder.found:
+        account.session_state.mark_valid()
+        save_session(account)
+    else:
+        account.session_state.mark_invalid()
 
 
-def go_to_semester(year, season):
+def go_to_semester(year, season, account=None):
     """
     Sets the proper semester so the correct course directory is in effect. Should be done after login.
 
     :param year: the school year as a string i.e 2015
     :param season: the season (W or S)
+    :param account: the AccountSession to set the semester of, the default account if not set
     """
     target_semester_url = SEMESTER_URL_TEMPLATE.format(year, season)
 
-    response = _URL_request_helper(target_semester_url, ["getcode"])
+    response = _URL_request_helper(target_semester_url, ["getcode"], account=account)
 
-    if response["getcode"] == 200:
+    if response is not None and response["getcode"] == 200:
         print "Active semester: {} {}".format(year, season)
     else:
         print "Invalid semester year or season. Will use default semester instead"
 
 
-def switch_course_section(original_section, new_section, CWL_acc, CWL_pass):
+def build_switch_form_data(original_section, new_section):
     """
-    Switch a currently registered course into a new section
+    Builds the urlencoded form data of the 2 requests of a section switch so they can be prepared ahead of time
 
-    :param original_section: a string of the section currently registered in (i.e CPSC221 L1A)
-    :param new_section: a string of the section to be switch into (i.e CPSC221 L1B)
-    :return: True if the switch was successful, false otherwise
+    :param original_section: a string of the section currently registered in (i.e CPSC 221 L1A)
+    :param new_section: a string of the section to be switch into (i.e CPSC 221 L1B)
+    :return: a tuple (initial_form_data, final_form_data)
     """
-    if not is_logged_in():
-        send_login_request(CWL_acc, CWL_pass)
-
-    original_section_id = original_section.name.split()
-    new_section_id = new_section.name.split()
-
-    course_switch_url = "https://courses.students.ubc.ca/cs/main?pname=regi_sections&tname=regi_sections"
-    course_switch_url2 = "https://courses.students.ubc.ca/cs/main"
+    original_section_id = original_section.split()
+    new_section_id = new_section.split()
 
     initial_form_data = {
         'pname': 'switch',
@@ -270,9 +836,6 @@ def switch_course_section(original_section, new_section, CWL_acc, CWL_pass):
         'submit': 'Switch Selected Section'
     }
 
-    # initialize switch request
-    _URL_request_helper(course_switch_url, [], initial_form_data)
-
     final_form_data = {
         'pname': 'regi_sections',
         'tname': 'regi_sections',
@@ -282,64 +845,216 @@ def switch_course_section(original_section, new_section, CWL_acc, CWL_pass):
         'submit': 'Switch Sections'
     }
 
-    finalize_switch_request = _URL_request_helper(course_switch_url2, ['getcode'], final_form_data)
+    return urlencode(initial_form_data), urlencode(final_form_data)
+
+
+@metrics.timed('switch')
+def switch_course_section(original_section, new_section, CWL_acc, CWL_pass, detected_at=None, switch_form_data=None,
+                          account=None):
+    """
+    Switch a currently registered course into a new section
+
+    :param original_section: a string of the section currently registered in (i.e CPSC 221 L1A)
+    :param new_section: a string of the section to be switch into (i.e CPSC 221 L1B)
+    :param detected_at: time.time() of when the open seat was detected, used to report how long it took to send
+    the switch requests
+    :param switch_form_data: the form data built by build_switch_form_data for these sections; built here if not set
+    :param account: the AccountSession to switch with, the default account if not set
+    :return: True if the switch was successful, false otherwise
+    """
+    if switch_form_data is None:
+        switch_form_data = build_switch_form_data(original_section, new_section)
+    initial_form_data, final_form_data = switch_form_data
+
+    account = account or default_account
+    account.session_state.ensure_logged_in(CWL_acc, CWL_pass)
+
+    _print_time_since_detection(new_section, detected_at)
 
-    if finalize_switch_request['getcode'] == 200:
+    # initialize switch request; the server needs it before the final request so the 2 can't be pipelined, but the
+    # final request goes out right after on the same keep-alive connection
+    if _URL_request_helper(COURSE_SWITCH_URL, [], initial_form_data, account=account) is None:
+        return False
+
+    finalize_switch_request = _URL_request_helper(COURSE_SWITCH_CONFIRM_URL, ['getcode'], final_form_data,
+                                                  account=account)
+
+    if finalize_switch_request is not None and finalize_switch_request['getcode'] == 200:
         return True
     else:
         return False
 
 
-def is_logged_in():
+@metrics.timed('login check')
+def is_logged_in(account=None):
     """
     Checks whether the user is log in or not. Current implementation relies on detecting whether the logout button exists
-    in the response html.
+    in the response html; the rest of the page is not downloaded once the button is found.
 
+    :param account: the AccountSession to check, the default account if not set
     :return: true if user is already logged in, false otherwise
     """
-    page_html = _URL_request_helper(LOGIN_STATUS_URL, ['read'])['read']
+    account = account or default_account
+    logout_button_finder = _MarkerFinder(LOGOUT_BUTTON_HTML)
+    # an unreachable page says nothing about the session so it's left as it is
+    if _URL_stream_helper(LOGIN_STATUS_URL, logout_button_finder.feed, account=account) is None:
+        return False
 
-    if page_html.find(LOGOUT_BUTTON_HTML) != -1:
-        return True
+    if logout_button_finder.found:
+        account.session_state.mark_valid()
     else:
-        return False
+        account.session_state.mark_invalid()
+
+    return logout_button_finder.found
+
+
+def _open_url(request_url, form_data=None, cache=None, account=None):
+    """
+    Makes GET or POST request depending on whether form_data is set and returns the response object;
+    If a network error or a server error occurs, the request is retried according to retry_policy. Endpoints that
+    keep failing are skipped for a while by their circuit breaker so other requests aren't held up by them. Requests
+    wait for rate_limiter first: conditional requests are seat checks and use the budget of seat checks, every other
+    request uses the budget of logins, registrations and switches.
+
+    :param request_url: the URL to send the request
+    :param form_data: an unencoded dictionary or an urlencoded string of form data if making a POST request
+    :param cache: a ResponseCache to make a conditional request with; the response code is 304 if the page hasn't
+    changed since the response cached for request_url
+    :param account: the AccountSession whose cookies are used, the default account if not set
+    :return: the response object, which must be closed by the caller, or None if the request failed
+    """
+    account = account or default_account
+    circuit_breaker = circuit_breakers.get(request_url)
 
+    if form_data is not None and not isinstance(form_data, basestring):
+        form_data = urlencode(form_data)
 
-def _URL_request_helper(request_url, attributes=[], form_data=None):
+    attempt = 0
+    while True:
+        if not circuit_breaker.allow_request():
+            metrics.increment('circuit open skips')
+            print "Skipping {} since it has been failing".format(request_url)
+            return None
+
+        attempt += 1
+        rate_limiter.acquire(request_url, is_action=cache is None)
+        retry_policy.request_sent()
+        request_start = time.time()
+        try:
+            headers = cache.get_request_headers(request_url) if cache is not None else {}
+            request = urllib2.Request(request_url, form_data, headers)
+            response = account.opener.open(request, timeout=retry_policy.timeout)
+            rate_limiter.record_response(request_url, time.time() - request_start, response.getcode())
+            circuit_breaker.record_success()
+
+            if cache is not None:
+                cache.update_validators(request_url, response.info())
+
+            # requests needing a login are redirected to the CAS login page once the session has expired
+            if response.geturl().startswith(CAS_LOGIN_URL) and not request_url.startswith(CAS_LOGIN_URL):
+                account.session_state.mark_invalid()
+            return response
+
+        except urllib2.HTTPError as e:
+            rate_limiter.record_response(request_url, time.time() - request_start, e.code)
+            # urllib2 treats 304 Not Modified as an error but it's the expected answer to a conditional request
+            if e.code == 304 and cache is not None:
+                circuit_breaker.record_success()
+                return e
+            e.close()
+            print "The server couldn't fulfill the request for {}".format(request_url)
+            print "Error code: ", e.code
+
+            # client errors won't go away by retrying and don't mean the endpoint is unhealthy
+            if e.code < 500:
+                circuit_breaker.record_success()
+                return None
+            circuit_breaker.record_failure()
+
+        except (urllib2.URLError, socket.error, httplib.HTTPException) as e:
+            rate_limiter.record_response(request_url, time.time() - request_start)
+            print "Unable to reach {}".format(request_url)
+            print "Reason: ", getattr(e, 'reason', e)
+            circuit_breaker.record_failure()
+
+        except Exception:
+            # anything unexpected (i.e ssl.CertificateError) still ends a trial request, or the circuit would never
+            # let another request through
+            circuit_breaker.record_failure()
+            raise
+
+        metrics.increment('failed requests')
+        retry_delay = retry_policy.get_retry_delay(attempt)
+        if retry_delay is None:
+            print "Giving up on {}".format(request_url)
+            return None
+
+        metrics.increment('retries')
+        print "Retrying in {:.1f} seconds".format(retry_delay)
+        time.sleep(retry_delay)
+
+
+def _URL_request_helper(request_url, attributes=[], form_data=None, cache=None, account=None):
     """
     Makes GET or POST request depending on whether form_data is set and returns a dictionary of
     attributes with their corresponding data return by the request or None if an error has occurred;
-    If a network error occur either at the client or server side, this function will retry with the request
-    until it succeeds
+    Failed requests are retried as described in _open_url
 
     :param request_url: the URL to send the request
     :param attributes: a list of attributes to obtain from the response object (read, info, geturl or getcode)
-    :param form_data: an unencoded dictionary of form data if making a POST request
+    :param form_data: an unencoded dictionary or an urlencoded string of form data if making a POST request
+    :param cache: a ResponseCache to make a conditional request with, see _open_url
+    :param account: the AccountSession whose cookies are used, the default account if not set
     :return: a dictionary of with all the attributes specified by the attributes parameter or empty dict if no attributes
-    was specified
+    was specified, or None if the request failed
     """
-    while True:
-        try:
-            if form_data is None:
-                response = urllib2.urlopen(request_url)
-            else:
-                request = urllib2.Request(request_url, urlencode(form_data))
-                response = urllib2.urlopen(request)
-
-            response_data = {}
-            for attribute in attributes:
-                response_data[attribute] = getattr(response, attribute)()
-            return response_data
-
-        except urllib2.URLError as e:
-            if hasattr(e, 'reason'):
-                print "Unable to reach {}".format(request_url)
-                print "Reason: ", e.reason
-            elif hasattr(e, 'code'):
-                print "The server couldn't fulfill the request for {}".format(request_url)
-                print "Error code: ", e.code
-
-            print "Retrying in 60 seconds"
-            time.sleep(60)
-            continue
+    response = _open_url(request_url, form_data, cache, account)
+    if response is None:
+        return None
+
+    try:
+        response_data = {}
+        for attribute in attributes:
+            response_data[attribute] = getattr(response, attribute)()
+        return response_data
+    except (socket.error, httplib.HTTPException) as e:
+        print "Unable to read the response of {}".format(request_url)
+        print "Reason: ", e
+        return None
+    finally:
+        # hands the connection back to the pool
+        response.close()
+
+
+def _URL_stream_helper(request_url, consume_chunk, cache=None, account=None):
+    """
+    Makes a GET request and feeds the response body to consume_chunk chunk by chunk as it arrives. The rest of the
+    body is not downloaded once consume_chunk has everything it needs.
 
+    :param request_url: the URL to send the request
+    :param consume_chunk: a function taking the next chunk of the body and returning True when no more chunks are needed
+    :param cache: a ResponseCache to make a conditional request with, see _open_url
+    :param account: the AccountSession whose cookies are used, the default account if not set
+    :return: the response code or None if the request failed
+    """
+    response = _open_url(request_url, cache=cache, account=account)
+    if response is None:
+        return None
+
+    try:
+        while True:
+            chunk = response.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if consume_chunk(chunk):
+                # the unread part of the body would have to be downloaded for the connection to be reused
+                if hasattr(response.fp, 'discard'):
+                    response.fp.discard()
+                break
+        return response.getcode()
+    except (socket.error, httplib.HTTPException) as e:
+        print "Unable to read the response of {}".format(request_url)
+        print "Reason: ", e
+        return None
+    finally:
+        response.close()
@@ -1,150 +1,379 @@
+import accounts
+import actions
 import notifications
 import courses_manager
+import metrics
+import scheduler
+import seat_history
+import sharding
 import time
-import random
 import CONFIGS
+import argparse
 import getpass
+import os
+import random
 
 
-def go_on_standby(min_delay, max_delay, print_delay=True):
+def go_on_standby(delay, print_delay=True, wake_up_event=None):
     """
     Put program to sleep for until next check; use to prevent sending too many requests
     and clogging the UBC server
 
-    :param min_delay: delay will be greater than or equal to this in seconds
-    :param max_delay: delay will be less than or equal to this in seconds
+    :param delay: number of seconds to sleep
     :param print_delay: set to True to print how long till next check
+    :param wake_up_event: a threading.Event that ends the sleep early when set
     """
-    rand_delay = random.randint(min_delay, max_delay)
-
     if print_delay:
-        print "Putting program to sleep for {0} seconds".format(rand_delay)
+        print "Putting program to sleep for {0:.0f} seconds".format(delay)
+
+    if wake_up_event is not None:
+        wake_up_event.wait(delay)
+    else:
+        time.sleep(delay)
+
+
+def publish_found_seat(course, seats_info, checked_at):
+    """
+    Hands a seat found by a check to the action pipeline; called from the thread that did the check as soon as it is
+    done so a seat isn't held up by the other checks
+
+    :param course: the Course object that was checked
+    :param seats_info: the SeatsInfo of the check or None if the check failed
+    :param checked_at: time.time() of when the check finished
+    """
+    if not course.monitor_only:
+        action_pipeline.publish(course, courses_manager.get_availability_status(seats_info), checked_at)
+
+
+def print_check_result(course, seats_info):
+    """
+    Prints the seat counts of a monitor only course, or why a check didn't find a seat to take
+
+    :param course: the Course object that was checked
+    :param seats_info: the SeatsInfo of the check or None if the check failed
+    """
+    if course.monitor_only:
+        if seats_info is None:
+            print "Error occurred when checking for seats for {0}!".format(course.name)
+            return
+        print "{0} : Total - {1}  Registered - {2} General - {3}  Restricted - {4}".format(course.name, *seats_info)
+        return
+
+    status = courses_manager.get_availability_status(seats_info)
+    if actions.get_seat_type(course, status) is not None:
+        # already handed to the action pipeline
+        return
+
+    if status in ("No Seats", "Restricted Seats"):
+        # nothing to report again if the seats haven't changed since the last check
+        if course.seats_changed:
+            print "Couldn't find a seat for ", course.name
+    else:
+        print "Error occurred when checking for seats for {0}! Double check the course name is correct!".format(course.name)
+
+
+def parse_course_info(raw_course_info, priority=0):
+    """
+    :param raw_course_info: a line in the format 'NAME, ALLOW_RESTRICTED_SEATS (T/F), MONITOR_ONLY (T/F),
+    TO_BE_SWITCH SECTION' where the last field is left out if not switching, i.e CPSC 221 101, T, F; NAME can list
+    other sections of the course separated by '|' when any of them will do, i.e CPSC 221 L1A|L1B|L1C, T, F
+    :param priority: the priority of the course, see Course
+    :return: a list of the Course objects described by the line, one for every section, or None if the line is
+    invalid
+    """
+    course_info = [field.strip() for field in raw_course_info.upper().split(',')]
+
+    if len(course_info) not in (3, 4):
+        print "'" + raw_course_info + "'" + " is invalid"
+        return None
+
+    # alternative sections can be given by their section alone
+    section_names = [" ".join(section_name.split()) for section_name in course_info[0].split('|')]
+    course_id = section_names[0].split()[:2]
+    section_names = [" ".join(course_id + section_name.split()) if len(section_name.split()) == 1 else section_name
+                     for section_name in section_names]
+    current_registered_section = " ".join(course_info[3].split()) if len(course_info) == 4 else None
+
+    for course_name in section_names + ([current_registered_section] if current_registered_section else []):
+        if not courses_manager.is_valid_course_name(course_name):
+            print "'" + course_name + "'" + " is not a course name in the format 'DEPT COURSE SECTION' i.e CPSC 221 101"
+            return None
+
+    if len(section_names) == 1:
+        return [courses_manager.Course(section_names[0], course_info[1] == 'T', course_info[2] == 'T',
+                                       current_registered_section, priority)]
+
+    if any(section_name.split()[:2] != course_id for section_name in section_names):
+        print "'" + course_info[0] + "'" + " lists sections of different courses"
+        return None
+    return courses_manager.SectionGroup(section_names, course_info[1] == 'T', course_info[2] == 'T',
+                                        current_registered_section, priority).courses
+
+
+def read_watch_list_file(path):
+    """
+    :param path: a file with one course per line in the format of parse_course_info; empty lines and lines starting
+    with '#' are skipped
+    :return: a list of the lines describing courses, or None if any of them is invalid
+    """
+    with open(path) as watch_list_file:
+        lines = [line.strip() for line in watch_list_file]
+    lines = [line for line in lines if line and not line.startswith('#')]
+
+    if not all(parse_course_info(line) is not None for line in lines):
+        return None
+    return lines
+
+
+def add_courses_to_watch(courses_for_watch, account=None):
+    """
+    :param courses_for_watch: a list of lines in the format of parse_course_info; courses listed first are registered
+    first when seats open for several of them at once
+    :param account: the AccountSession whose watch list the courses are added to, the default account if not set
+    """
+    for index, course_info in enumerate(courses_for_watch):
+        for course in parse_course_info(course_info, len(courses_for_watch) - index) or []:
+            courses_manager.add_course_to_watch(course, account)
+
+
+def read_accounts_file(path):
+    """
+    :param path: a file with one account per line in the format 'CWL_NAME, EMAIL, WATCH_LIST_FILE' where the watch list
+    file is in the format of read_watch_list_file, relative to path; empty lines and lines starting with '#' are
+    skipped. The password of every account is read from the CWL_PASSWORD_<CWL_NAME> environment variable if set and
+    asked for otherwise.
+    :return: a list of AccountSession objects with their watch lists filled, or None if any line is invalid
+    """
+    with open(path) as accounts_file:
+        lines = [line.strip() for line in accounts_file]
+    lines = [line for line in lines if line and not line.startswith('#')]
 
-    time.sleep(rand_delay)
+    account_sessions = []
+    for line in lines:
+        account_info = [field.strip() for field in line.split(',')]
+        if len(account_info) != 3:
+            print "'" + line + "'" + " is invalid"
+            return None
+        user_id, notify_email_addr, watch_list_path = account_info
+
+        watch_list_path = os.path.join(os.path.dirname(path), watch_list_path)
+        courses_for_watch = read_watch_list_file(watch_list_path)
+        if courses_for_watch is None:
+            return None
+
+        password = (os.environ.get('CWL_PASSWORD_' + user_id.upper()) or
+                    getpass.getpass("Enter CWL password for {0}: ".format(user_id)))
+        account = courses_manager.AccountSession(user_id, password, notify_email_addr)
+        add_courses_to_watch(courses_for_watch, account)
+        account_sessions.append(account)
+    return account_sessions
+
+
+def watch_accounts(account_sessions, poller, notification_dispatcher):
+    """
+    Checks the courses of every account through one AccountPool, so a section watched by several accounts is fetched
+    once per rotation, and registers each account into the seats found with its own ActionPipeline until every
+    account's watch list is empty
+
+    :param account_sessions: a list of AccountSession objects with their credentials and watch lists set
+    :param poller: the Poller doing the requests of all the accounts
+    :param notification_dispatcher: the NotificationDispatcher the results are emailed with
+    """
+    account_pool = accounts.AccountPool(poller)
+    for account in account_sessions:
+        account_pool.add_account(account)
+
+    for account in account_pool.login_all(CONFIGS.SEMESTER_YEAR, CONFIGS.SEMESTER_SEASON):
+        print "Unable to login {0}. Make sure CWL ID and password is correct.".format(account.user_id)
+        account_pool.remove_account(account)
+
+    action_pipelines = dict((account, actions.ActionPipeline(account.user_id, account.password,
+                                                             notification_dispatcher, account.notify_email_addr,
+                                                             account=account))
+                            for account in account_pool.accounts)
+
+    def publish_found_account_seat(account, course, seats_info, checked_at):
+        # called as soon as the check is done, see publish_found_seat
+        if not course.monitor_only:
+            action_pipelines[account].publish(course, courses_manager.get_availability_status(seats_info), checked_at)
+
+    while any(courses_manager.get_courses_watch_list(account) for account in account_pool.accounts):
+        for account, course, seats_info in account_pool.poll(publish_found_account_seat):
+            print_check_result(course, seats_info)
+
+        if any(courses_manager.get_courses_watch_list(account) for account in account_pool.accounts):
+            go_on_standby(random.randint(CONFIGS.MIN_DELAY_BW_CHECKS, CONFIGS.MAX_DELAY_BW_CHECKS))
 
 
 if __name__ == "__main__":
-    # login to account
-    CWL_acc_name = raw_input("Enter CWL account name: ")
-    CWL_password = getpass.getpass("Enter CWL password: ")
+    started_at = time.time()
+
+    argument_parser = argparse.ArgumentParser(description="Watches UBC courses and registers into them once a seat is "
+                                                          "found. Anything not given as an argument is asked for.")
+    argument_parser.add_argument('--account', help="CWL account name; the password is read from the CWL_PASSWORD "
+                                                   "environment variable if set")
+    argument_parser.add_argument('--email', help="email to receive notification")
+    argument_parser.add_argument('--watch-list', help="file with one course per line in the same format as the "
+                                                      "interactive input")
+    argument_parser.add_argument('--accounts', help="file with one account per line in the format 'CWL_NAME, EMAIL, "
+                                                    "WATCH_LIST_FILE' to watch the courses of several accounts at "
+                                                    "once; passwords are read from the CWL_PASSWORD_<CWL_NAME> "
+                                                    "environment variables if set")
+    args = argument_parser.parse_args()
 
-    courses_manager.send_login_request(CWL_acc_name, CWL_password)
+    # the parsing processes are forked before any thread is started
+    courses_manager.start_parsing_pool()
 
-    if not courses_manager.is_logged_in():
-        print "Unable to login. Make sure CWL ID and password is correct."
+    # timings and counts of the checks are served locally and summarized in the console every now and then
+    if CONFIGS.METRICS_PORT is not None:
+        metrics.start_metrics_server(CONFIGS.METRICS_PORT)
+    if CONFIGS.METRICS_LOG_INTERVAL is not None:
+        metrics.start_summary_log(CONFIGS.METRICS_LOG_INTERVAL)
+
+    # every seat count observed is kept to look back at how the courses fill up
+    try:
+        history = seat_history.SeatHistory(CONFIGS.SEAT_HISTORY_FILE) if CONFIGS.SEAT_HISTORY_FILE else None
+    except IOError as e:
+        print "Unable to open the seat history: {0}".format(e)
         exit()
 
+    if args.accounts is not None:
+        account_sessions = read_accounts_file(args.accounts)
+        if account_sessions is None:
+            print "Fix the invalid lines in {0} or its watch lists and start again.".format(args.accounts)
+            exit()
+
+        notification_dispatcher = notifications.NotificationDispatcher()
+        watch_accounts(account_sessions, scheduler.Poller(CONFIGS.MAX_CONCURRENT_CHECKS, seat_history=history),
+                       notification_dispatcher)
+
+        notification_dispatcher.flush()
+        if history is not None:
+            history.close()
+        raw_input("Seats for all courses has been found. Press enter to exit.")
+        exit()
+
+    # the watch list file is checked first so a typo doesn't cost a login
+    courses_for_watch = None
+    if args.watch_list is not None:
+        courses_for_watch = read_watch_list_file(args.watch_list)
+        if courses_for_watch is None:
+            print "Fix the invalid lines in {0} and start again.".format(args.watch_list)
+            exit()
+
+    # login to account, unless the session saved by the last run is still logged in
+    CWL_acc_name = args.account or raw_input("Enter CWL account name: ")
+    CWL_password = os.environ.get('CWL_PASSWORD') or getpass.getpass("Enter CWL password: ")
+
+    if courses_manager.resume_session(CWL_acc_name, CWL_password):
+        print "Resumed the saved login session"
+    else:
+        courses_manager.send_login_request(CWL_acc_name, CWL_password)
+
+        if not courses_manager.is_logged_in():
+            print "Unable to login. Make sure CWL ID and password is correct."
+            exit()
+
     # email address to provide status update
-    notify_email_addr = raw_input("Enter email to receive notification: ")
+    notify_email_addr = args.email or raw_input("Enter email to receive notification: ")
 
     # go to proper semester
     courses_manager.go_to_semester(CONFIGS.SEMESTER_YEAR, CONFIGS.SEMESTER_SEASON)
+    courses_manager.save_session()
 
-    # add the list of course to watch
-    raw_course_info = raw_input("Enter course info in the format: 'NAME, ALLOW_RESTRICTED_SEATS (T/F), MONITOR_ONLY (T/F), TO_BE_SWITCH SECTION " +
-              "(empty if not switching) \n i.e CPSC 221 101, T, F or EOSC 114 101, T, F, EOSC 114 102 \n" +
-              "Enter 'DONE' to finalize course list, 'REMOVE' to delete previous course from watch in case typo, VIEW to list current queue  \n").upper()
+    if courses_for_watch is None:
+        # add the list of course to watch
+        raw_course_info = raw_input("Enter course info in the format: 'NAME, ALLOW_RESTRICTED_SEATS (T/F), MONITOR_ONLY (T/F), TO_BE_SWITCH SECTION " +
+                  "(empty if not switching) \n i.e CPSC 221 101, T, F or EOSC 114 101, T, F, EOSC 114 102 \n" +
+                  "NAME can list other sections separated by '|' when any of them will do, i.e CPSC 221 L1A|L1B|L1C, T, F \n" +
+                  "Enter 'DONE' to finalize course list, 'REMOVE' to delete previous course from watch in case typo, VIEW to list current queue  \n").upper()
 
-    # a buffer that will contain raw course info
-    courses_for_watch = []
+        # a buffer that will contain raw course info
+        courses_for_watch = []
 
-    # perform user command until DONE is entered
-    while raw_course_info != 'DONE':
-        if raw_course_info == 'REMOVE':
-            if len(courses_for_watch) > 0:
-                print "'" + courses_for_watch.pop() + "'" + " has been removed from queue"
+        # perform user command until DONE is entered
+        while raw_course_info != 'DONE':
+            if raw_course_info == 'REMOVE':
+                if len(courses_for_watch) > 0:
+                    print "'" + courses_for_watch.pop() + "'" + " has been removed from queue"
 
-        elif raw_course_info == 'VIEW':
-            print "Current queue list:"
-            if len(courses_for_watch) == 0:
-                print "None"
-            else:
-                for course in courses_for_watch:
-                    print course
-        else:
-            if raw_course_info.count(',') in (2, 3):
-                courses_for_watch.append(raw_course_info)
+            elif raw_course_info == 'VIEW':
+                print "Current queue list:"
+                if len(courses_for_watch) == 0:
+                    print "None"
+                else:
+                    for course in courses_for_watch:
+                        print course
             else:
-                print "Invalid input!"
+                if raw_course_info.count(',') in (2, 3):
+                    courses_for_watch.append(raw_course_info)
+                else:
+                    print "Invalid input!"
 
-        raw_course_info = raw_input().upper()
+            raw_course_info = raw_input().upper()
 
     # convert the string in course buffer into Course objects and add them to the final course watch list
-    for course in courses_for_watch:
-        course_info = course.split(',')
-
-        if len(course_info) == 3:
-            courses_manager.add_course_to_watch(courses_manager.Course(course_info[0].strip(),
-                                                                       course_info[1].strip() == 'T',
-                                                                       course_info[2].strip() == 'T'))
-        elif len(course_info) == 4:
-            courses_manager.add_course_to_watch(courses_manager.Course(course_info[0].strip(),
-                                                                       course_info[1].strip() == 'T',
-                                                                       course_info[2].strip() == 'T',
-                                                                       course_info[3].strip()))
-        else:
-            print "'" + course + "'" + " is invalid"
+    add_courses_to_watch(courses_for_watch)
 
     courses_to_watch = courses_manager.get_courses_watch_list()
 
-    # check seating status for each course in the list and perform action based on their setup
+    # emails are sent in the background so checks never wait on the email host
+    notification_dispatcher = notifications.NotificationDispatcher()
+
+    poller = scheduler.Poller(CONFIGS.MAX_CONCURRENT_CHECKS, seat_history=history)
+
+    # every course gets its own check schedule based on how active it is; in sharded mode the courses are checked by
+    # the workers connected to the coordinator instead
+    poll_scheduler = scheduler.AdaptivePollScheduler()
+    coordinator = None
+    if CONFIGS.SHARD_COORDINATOR_ADDRESS is not None:
+        try:
+            coordinator = sharding.Coordinator(CONFIGS.SHARD_COORDINATOR_ADDRESS, CONFIGS.SHARD_AUTHKEY,
+                                               on_checked=publish_found_seat)
+        except ValueError as e:
+            print "Unable to start sharded mode: {0}".format(e)
+            exit()
+
+    # seats found are registered into from a separate thread so checks never wait on a registration
+    action_pipeline = actions.ActionPipeline(CWL_acc_name, CWL_password, notification_dispatcher, notify_email_addr,
+                                             coordinator)
+
+    if coordinator is not None:
+        coordinator.set_account(CWL_acc_name, CWL_password, CONFIGS.SEMESTER_YEAR, CONFIGS.SEMESTER_SEASON)
+    for course in courses_to_watch:
+        if coordinator is not None:
+            coordinator.add_course(course)
+        else:
+            poll_scheduler.add(course)
+
+    # check seating status of the courses that are due concurrently; the seats found are handed to the action pipeline
+    # by publish_found_seat as each check is done
     while courses_to_watch:
-        for course in courses_to_watch:
-            if course.monitor_only:
-                seats_info = course.get_seats_info()
-                print "{0} : Total - {1}  Registered - {2} General - {3}  Restricted - {4}".format(course.name,
-                                                                                                   *(seats_info[seat_type] for
-                                                                                                     seat_type in
-                                                                                                     seats_info)
-                                                                                                   )
-                continue
-
-            status = course.get_availability_status()
-
-            # perform action based on current seating status of course
-            if status == 'No Seats':  # no seats available
-                print "Couldn't find a seat for ", course.name
-
-            elif status == "General Seats":  # general seat available
-                notification_msg = "A general seat for " + course.name + " has been found!"
-
-                # try register or switch into course
-                if course.current_registered_section is None:  # register case
-                    is_success = course.register_course(CWL_acc_name, CWL_password)
-                    notification_msg = notifications.generate_notification_message(notification_msg, course, False, is_success)
-                else:  # switch section case
-                    is_success = courses_manager.switch_course_section(course.current_registered_section, course.name, CWL_acc_name, CWL_password)
-                    notification_msg = notifications.generate_notification_message(notification_msg, course, True, is_success)
-
-                courses_to_watch.remove(course)
-                notifications.notify_email(notify_email_addr, notification_msg, "UBC Course Bot: " + course.name)
-                print notification_msg
-
-            elif status == "Restricted Seats":  # restricted seat available
-                if course.allow_restricted_seats:
-                    notification_msg = "A restricted seat for " + course.name + " has been found!"
-
-                    # try register or switch into course
-                    if course.current_registered_section is None:  # register case
-                        is_success = course.register_course(CWL_acc_name, CWL_password)
-                        notification_msg = notifications.generate_notification_message(notification_msg, course, False, is_success)
-                    else:  # switch section case
-                        is_success = courses_manager.switch_course_section(course.current_registered_section, course.name, CWL_acc_name, CWL_password)
-                        notification_msg = notifications.generate_notification_message(notification_msg, course, True, is_success)
-
-                    courses_to_watch.remove(course)
-                    notifications.notify_email(notify_email_addr, notification_msg, "UBC Course Bot: " + course.name)
-                    print notification_msg
-                else:
-                    print "Couldn't find a seat for ", course.name
+        if coordinator is not None:
+            checked_courses = coordinator.get_observations(CONFIGS.MIN_CHECK_INTERVAL)
+        else:
+            checked_courses = poller.poll(poll_scheduler.pop_due(), publish_found_seat)
 
-            else:
-                print "Error occurred when checking for seats for {0}! Double check the course name is correct!".format(course.name)
-            go_on_standby(1, 10, False)
+        # how long a restart leaves the courses unwatched
+        if started_at is not None and checked_courses:
+            print "First seat check done {0:.1f} seconds after starting".format(time.time() - started_at)
+            started_at = None
+
+        for course, seats_info in checked_courses:
+            poll_scheduler.record(course, seats_info)
+            print_check_result(course, seats_info)
+
+        # courses that have been acted on are no longer checked
+        for course in action_pipeline.get_completed():
+            poll_scheduler.remove(course)
 
-        # perform delays to avoid clogging UBC's server and avoid being flag for scripting just in case
-        if courses_to_watch:
-            go_on_standby(CONFIGS.MIN_DELAY_BW_CHECKS, CONFIGS.MAX_DELAY_BW_CHECKS, True)
-            random.shuffle(courses_to_watch)
+        # sleep until the next course is due to avoid clogging UBC's server and avoid being flag for scripting just in
+        # case, waking up early when a course has been acted on in case it was the last one
+        if courses_to_watch and coordinator is None:
+            go_on_standby(poll_scheduler.time_until_next_check(), True, action_pipeline.completed_event)
 
+    notification_dispatcher.flush()
+    courses_manager.save_session()
+    if history is not None:
+        history.close()
     raw_input("Seats for all courses has been found. Press enter to exit.")
@@ -0,0 +1,221 @@
+import BaseHTTPServer
+import bisect
+import functools
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds in seconds of the histogram buckets, doubling from 1 ms to about 65 s; anything slower goes in a last
+# unbounded bucket
+BUCKET_BOUNDS = [0.001 * 2 ** i for i in range(17)]
+
+
+class Histogram(object):
+    """
+    Counts durations in fixed buckets so recording one is a binary search and an increment no matter how many were
+    recorded; percentiles are approximated by the upper bound of the bucket they fall in
+    """
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_percentile(self, percentile):
+        """
+        :param percentile: the percentile between 0 and 100
+        :return: the upper bound in seconds of the bucket of the percentile, the max for the last bucket, or None if
+        nothing was recorded
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * percentile / 100.0
+        seen = 0
+        for bound, bucket_count in zip(BUCKET_BOUNDS, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry(object):
+    """
+    Keeps the counters and duration histograms of the program by name
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def get_percentiles(self, percentiles):
+        """
+        :param percentiles: a list of percentiles between 0 and 100
+        :return: a dictionary mapping the name of every histogram to a (count, list of percentiles in seconds) tuple,
+        see Histogram.get_percentile
+        """
+        with self._lock:
+            return dict((name, (histogram.count, [histogram.get_percentile(percentile) for percentile in percentiles]))
+                        for name, histogram in self._histograms.items())
+
+    def format_text(self):
+        """
+        :return: every counter and histogram in the Prometheus text format
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric_name = _get_metric_name(name) + "_total"
+                lines.append("# TYPE {0} counter".format(metric_name))
+                lines.append("{0} {1}".format(metric_name, value))
+
+            for name, histogram in sorted(self._histograms.items()):
+                metric_name = _get_metric_name(name) + "_seconds"
+                lines.append("# TYPE {0} histogram".format(metric_name))
+                cumulative_count = 0
+                for bound, bucket_count in zip(BUCKET_BOUNDS, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    lines.append('{0}_bucket{{le="{1:g}"}} {2}'.format(metric_name, bound, cumulative_count))
+                lines.append('{0}_bucket{{le="+Inf"}} {1}'.format(metric_name, histogram.count))
+                lines.append("{0}_sum {1:f}".format(metric_name, histogram.total))
+                lines.append("{0}_count {1}".format(metric_name, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """
+        :return: a few human readable lines with every counter and the count, mean, p50, p95 and max of every
+        histogram
+        """
+        with self._lock:
+            lines = ["Metrics over the last {0:.0f} minutes:".format((time.time() - self.started_at) / 60)]
+            if self._counters:
+                lines.append("  " + ", ".join("{0}: {1}".format(name, value)
+                                              for name, value in sorted(self._counters.items())))
+            for name, histogram in sorted(self._histograms.items()):
+                lines.append("  {0}: {1} times, mean {2:.1f} ms, p50 {3:.1f} ms, p95 {4:.1f} ms, max {5:.1f} ms".format(
+                    name, histogram.count, histogram.total / histogram.count * 1000,
+                    histogram.get_percentile(50) * 1000, histogram.get_percentile(95) * 1000, histogram.max * 1000))
+        return "\n".join(lines)
+
+
+def _get_metric_name(name):
+    return "ubc_course_bot_" + "_".join(name.lower().split())
+
+
+# the registry everything in the program records to
+registry = MetricsRegistry()
+
+
+def increment(name, amount=1):
+    """
+    :param name: the name of the counter i.e 'retries'
+    :param amount: how much to add to the counter
+    """
+    registry.increment(name, amount)
+
+
+def observe(name, seconds):
+    """
+    :param name: the name of the histogram i.e 'connect'
+    :param seconds: the duration to record
+    """
+    registry.observe(name, seconds)
+
+
+@contextmanager
+def timer(name):
+    """
+    Records how long the with block takes in the histogram name
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.time() - start)
+
+
+def timed(name):
+    """
+    Decorator recording how long every call of the function takes in the histogram name
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with timer(name):
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+
+class _MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = registry.format_text()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes would otherwise flood the console
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    Serves the metrics at http://host:port/metrics from a background thread
+
+    :param port: the port to listen on
+    :param host: the address to listen on, only the local machine by default
+    :return: the server, call its shutdown method to stop it, or None if the port couldn't be listened on
+    """
+    try:
+        server = BaseHTTPServer.HTTPServer((host, port), _MetricsRequestHandler)
+    except socket.error as e:
+        # most likely another bot already serves its metrics on this port; the metrics are only for looking at, so
+        # this one keeps running without them
+        print "Unable to serve the metrics on port {0}: {1}".format(port, e)
+        return None
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def start_summary_log(interval):
+    """
+    Prints a summary of the metrics every interval seconds from a background thread
+
+    :param interval: number of seconds between summaries
+    """
+    def log_summaries():
+        while True:
+            time.sleep(interval)
+            print registry.format_summary()
+
+    summary_thread = threading.Thread(target=log_summaries)
+    summary_thread.daemon = True
+    summary_thread.start()
@@ -1,8 +1,29 @@
 import smtplib
+import socket
+import threading
+import time
+import Queue
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import CONFIGS
+import metrics
 
+
+def _build_email(from_addr, to_addr, message, subject):
+    """
+    :return: the email as a string ready to be sent
+    """
+    msg = MIMEMultipart()
+    msg['From'] = from_addr
+    msg['To'] = to_addr
+    msg['Subject'] = subject
+
+    body = message
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+
+@metrics.timed('email')
 def notify_email(receiver_address, message, subject):
     """
     Sends an email from a preset address from the config file to receiver_address
@@ -14,19 +35,13 @@ def notify_email(receiver_address, message, subject):
 
     from_addr = CONFIGS.FROM_EMAIL_ADDRESS
     to_addr = receiver_address
-    msg = MIMEMultipart()
-    msg['From'] = from_addr
-    msg['To'] = to_addr
-    msg['Subject'] = subject
-
-    body = message
-    msg.attach(MIMEText(body, 'plain'))
+    text = _build_email(from_addr, to_addr, message, subject)
 
+    server = None
     try:
         server = smtplib.SMTP(CONFIGS.FROM_EMAIL_HOST, CONFIGS.FROM_EMAIL_PORT)
         server.starttls()
         server.login(from_addr, CONFIGS.FROM_EMAIL_PASS)
-        text = msg.as_string()
         server.sendmail(from_addr, to_addr, text)
     except smtplib.SMTPAuthenticationError as e:
         print "Unable to login to email host. Check email setting and account information."
@@ -35,6 +50,126 @@ def notify_email(receiver_address, message, subject):
             server.quit()
 
 
+class NotificationDispatcher(object):
+    """
+    Sends email notifications from a background thread so checking courses never waits on the email host. One
+    authenticated SMTP connection is kept open between emails, notifications queued for the same address while an
+    email is being sent are combined into a single email, and failed sends are retried with exponential backoff.
+    """
+    def __init__(self, host=CONFIGS.FROM_EMAIL_HOST, port=CONFIGS.FROM_EMAIL_PORT, from_addr=CONFIGS.FROM_EMAIL_ADDRESS,
+                 password=CONFIGS.FROM_EMAIL_PASS, max_attempts=CONFIGS.EMAIL_MAX_ATTEMPTS,
+                 retry_delay=CONFIGS.EMAIL_RETRY_DELAY):
+        """
+        :param host: the email host
+        :param port: the email host's port
+        :param from_addr: the address sending the emails
+        :param password: the password of from_addr
+        :param max_attempts: number of times an email is tried before it is dropped
+        :param retry_delay: seconds to wait before the first retry, doubled on every retry after
+        """
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+        self.password = password
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._server = None
+        self._queue = Queue.Queue()
+
+        sender = threading.Thread(target=self._run)
+        sender.daemon = True
+        sender.start()
+
+    def notify(self, receiver_address, message, subject):
+        """
+        Queues an email to receiver_address and returns right away
+
+        :param receiver_address: the address that will receive email
+        :param message: the message of the email
+        :param subject: the subject of the email
+        """
+        self._queue.put((receiver_address, message, subject))
+
+    def flush(self):
+        """
+        Blocks until every queued email has been sent or dropped
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            notifications = [self._queue.get()]
+            while True:
+                try:
+                    notifications.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            # combines the notifications for the same address, keeping the order they were queued in
+            notifications_by_address = {}
+            addresses = []
+            for receiver_address, message, subject in notifications:
+                if receiver_address not in notifications_by_address:
+                    notifications_by_address[receiver_address] = []
+                    addresses.append(receiver_address)
+                notifications_by_address[receiver_address].append((message, subject))
+
+            for receiver_address in addresses:
+                address_notifications = notifications_by_address[receiver_address]
+                if len(address_notifications) == 1:
+                    message, subject = address_notifications[0]
+                else:
+                    message = "\n\n".join(message for message, _ in address_notifications)
+                    subject = "UBC Course Bot: {0} updates".format(len(address_notifications))
+                self._send_with_retries(receiver_address, message, subject)
+
+            for _ in notifications:
+                self._queue.task_done()
+
+    def _send_with_retries(self, receiver_address, message, subject):
+        text = _build_email(self.from_addr, receiver_address, message, subject)
+
+        for attempt in range(self.max_attempts):
+            try:
+                self._send(receiver_address, text)
+                return
+            except smtplib.SMTPAuthenticationError:
+                print "Unable to login to email host. Check email setting and account information."
+                self._disconnect()
+                return
+            except (smtplib.SMTPException, socket.error) as e:
+                print "Unable to send email to {0}: {1}".format(receiver_address, e)
+                metrics.increment('email failures')
+                self._disconnect()
+                if attempt + 1 < self.max_attempts:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+
+        print "Giving up on email to {0}".format(receiver_address)
+
+    @metrics.timed('email')
+    def _send(self, to_addr, text):
+        if self._server is not None:
+            try:
+                self._server.sendmail(self.from_addr, to_addr, text)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # the host closes idle connections, so a dropped connection is expected and reopened right away
+                self._server = None
+
+        self._server = smtplib.SMTP(self.host, self.port)
+        self._server.starttls()
+        self._server.login(self.from_addr, self.password)
+        self._server.sendmail(self.from_addr, to_addr, text)
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, socket.error):
+                pass
+            self._server = None
+
+
 def generate_notification_message(pre_message, course, is_switching, is_success):
     """
     Generate a message by adding details onto pre_messaage
@@ -0,0 +1,149 @@
+import threading
+import time
+import urlparse
+
+
+class TokenBucket(object):
+    """
+    A thread safe token bucket; each request takes one token and tokens are refilled at a constant rate
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: number of tokens added per second
+        :param capacity: max number of tokens the bucket can hold, defaults to rate (a burst of at most 1 second)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    A token bucket whose rate adapts to how the server copes (AIMD): every response that comes back fine raises the
+    rate a little, and every sign of trouble cuts it by decrease_factor, so the rate settles just under what the
+    server tolerates
+    """
+    def __init__(self, max_rate, min_rate, increase, decrease_factor=0.5):
+        """
+        :param max_rate: the highest and starting rate in tokens per second
+        :param min_rate: the lowest rate in tokens per second
+        :param increase: tokens per second the rate grows by for every second of responses that came back fine
+        :param decrease_factor: what the rate is multiplied by on a sign of trouble
+        """
+        TokenBucket.__init__(self, max_rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.increase = float(increase)
+        self.decrease_factor = decrease_factor
+        self._last_decrease = 0
+
+    def record_success(self):
+        with self._lock:
+            self._refill()
+            # there are about rate responses per second so each one adds its share of the increase
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def record_throttled(self):
+        with self._lock:
+            now = time.time()
+            # the other requests that were in flight when the server struggled say the same thing, so they don't
+            # cut the rate again
+            if now - self._last_decrease < max(1 / self.rate, 1):
+                return
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._last_decrease = now
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Limits the requests sent to every host with 2 separate budgets: seat checks share an AdaptiveTokenBucket that
+    backs off when the host responds slowly, with a throttling or server error or with a blocked page, while logins,
+    registrations and switches have a fixed budget of their own so checks can never starve them
+    """
+    # status codes telling the client to slow down, on top of every 5xx
+    THROTTLING_STATUSES = (429,)
+
+    def __init__(self, max_requests_per_second, min_requests_per_second, rate_increase, slow_response_seconds,
+                 action_requests_per_second):
+        """
+        :param max_requests_per_second: the highest and starting rate of seat checks sent to a single host
+        :param min_requests_per_second: the lowest rate of seat checks sent to a single host
+        :param rate_increase: requests per second the rate of seat checks grows by every second it goes fine
+        :param slow_response_seconds: responses taking longer than this are taken as a sign of trouble
+        :param action_requests_per_second: max number of other requests per second sent to a single host
+        """
+        self.max_requests_per_second = max_requests_per_second
+        self.min_requests_per_second = min_requests_per_second
+        self.rate_increase = rate_increase
+        self.slow_response_seconds = slow_response_seconds
+        self.action_requests_per_second = action_requests_per_second
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_buckets(self, url):
+        host = urlparse.urlparse(url).netloc
+
+        with self._lock:
+            buckets = self._buckets.get(host)
+            if buckets is None:
+                buckets = self._buckets[host] = (
+                    AdaptiveTokenBucket(self.max_requests_per_second, self.min_requests_per_second, self.rate_increase),
+                    TokenBucket(self.action_requests_per_second))
+            return buckets
+
+    def acquire(self, url, is_action=False):
+        """
+        Blocks until a request to the host of url is allowed
+
+        :param url: the URL about to be requested
+        :param is_action: True for logins, registrations and switches, False for seat checks
+        """
+        check_bucket, action_bucket = self._get_buckets(url)
+        if is_action:
+            action_bucket.acquire()
+        else:
+            check_bucket.acquire()
+
+    def record_response(self, url, latency, status=None, is_blocked=False):
+        """
+        Adapts the rate of seat checks to the host of url to how a request to it went
+
+        :param url: the URL that was requested
+        :param latency: seconds the response took
+        :param status: the status code of the response or None if no response came back
+        :param is_blocked: True if the server answered with a page refusing the request
+        """
+        check_bucket, _ = self._get_buckets(url)
+        if (is_blocked or status is None or status >= 500 or status in self.THROTTLING_STATUSES or
+                latency > self.slow_response_seconds):
+            check_bucket.record_throttled()
+        else:
+            check_bucket.record_success()
+
+    def get_rates(self):
+        """
+        :return: a dictionary mapping every host to its current rate of seat checks in requests per second
+        """
+        with self._lock:
+            return dict((host, buckets[0].rate) for host, buckets in self._buckets.items())
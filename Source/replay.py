@@ -0,0 +1,105 @@
+import httplib
+import json
+import threading
+import time
+import urllib
+import urllib2
+from StringIO import StringIO
+
+
+def _make_response(url, status, reason, header_text, body):
+    response = urllib.addinfourl(StringIO(body), httplib.HTTPMessage(StringIO(header_text)), url)
+    response.code = status
+    response.msg = reason
+    return response
+
+
+class ExchangeRecorder(urllib2.BaseHandler):
+    """
+    urllib2 processor appending every request/response exchange of the openers it is added to to a fixture file,
+    one JSON object per line, so the exchanges can be replayed offline with ReplayHandler. Only the method and URL of
+    a request are kept, never its body, so passwords sent in login forms don't end up in the fixtures; response headers
+    are kept as they are, so the fixtures do hold the session cookies of the recording.
+    """
+    # runs before HTTPErrorProcessor so error responses and redirects are recorded too
+    handler_order = 900
+
+    def __init__(self, fixture_path):
+        """
+        :param fixture_path: the file the exchanges are appended to
+        """
+        self._fixture_file = open(fixture_path, 'a')
+        self._lock = threading.Lock()
+
+    def http_response(self, request, response):
+        header_text = "".join(response.info().headers)
+        body = response.read()
+        response.close()
+
+        exchange = {
+            'method': request.get_method(),
+            'url': request.get_full_url(),
+            'status': response.code,
+            'reason': response.msg,
+            # latin-1 maps every byte to a character so any header or body survives the round trip through JSON
+            'headers': header_text.decode('latin-1'),
+            'body': body.decode('latin-1')
+        }
+        with self._lock:
+            self._fixture_file.write(json.dumps(exchange) + '\n')
+            self._fixture_file.flush()
+
+        return _make_response(response.geturl(), response.code, response.msg, header_text, body)
+
+    https_response = http_response
+
+    def close(self):
+        with self._lock:
+            self._fixture_file.close()
+
+
+class ReplayHandler(urllib2.BaseHandler):
+    """
+    urllib2 handler answering every request from the exchanges recorded by ExchangeRecorder instead of the network.
+    Requests are matched by method and URL; a request made more often than it was recorded gets the last recorded
+    response again, so a recording of a few checks can drive any number of checks.
+    """
+    # runs before the keep-alive handlers so no request reaches the network
+    handler_order = 100
+
+    def __init__(self, fixture_path, latency=0):
+        """
+        :param fixture_path: the file the exchanges were recorded to
+        :param latency: seconds every response is delayed by to simulate the network
+        """
+        self.latency = latency
+        # number of requests answered so far
+        self.replayed = 0
+        self._exchanges = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+        with open(fixture_path) as fixture_file:
+            for line in fixture_file:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self._exchanges.setdefault((exchange['method'], exchange['url']), []).append(exchange)
+
+    def http_open(self, request):
+        key = (request.get_method(), request.get_full_url())
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if exchanges is None:
+                raise urllib2.URLError("no recorded response for {0} {1}".format(*key))
+            position = self._positions.get(key, 0)
+            self._positions[key] = min(position + 1, len(exchanges) - 1)
+            self.replayed += 1
+        exchange = exchanges[position]
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        return _make_response(request.get_full_url(), exchange['status'], exchange['reason'],
+                              exchange['headers'].encode('latin-1'), exchange['body'].encode('latin-1'))
+
+    https_open = http_open
@@ -0,0 +1,99 @@
+import threading
+
+
+class _CacheEntry(object):
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.result = None
+
+
+class ResponseCache(object):
+    """
+    Remembers the last response of each url so unchanged pages cost as little as possible: the validators
+    (ETag and Last-Modified) are sent back as a conditional GET so the server can answer 304 Not Modified without
+    a body, and servers without validators still save the parsing when the digest of the relevant part of the
+    page matches the last one.
+    """
+    def __init__(self):
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_request_headers(self, url):
+        """
+        :param url: the URL about to be requested
+        :return: a dictionary of the conditional request headers for url, empty if there are no validators for it
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            headers = {}
+            # the validators only matter if the result of the page they validate is still around
+            if entry is not None and entry.digest is not None:
+                if entry.etag is not None:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified is not None:
+                    headers['If-Modified-Since'] = entry.last_modified
+            return headers
+
+    def update_validators(self, url, response_info):
+        """
+        :param url: the URL that was requested
+        :param response_info: the headers of the response (the return value of response.info())
+        """
+        with self._lock:
+            entry = self._entries.setdefault(url, _CacheEntry())
+            entry.etag = response_info.getheader('ETag')
+            entry.last_modified = response_info.getheader('Last-Modified')
+
+    def get_not_modified_result(self, url):
+        """
+        Called when the server answered 304 Not Modified for url
+
+        :return: the result stored for url's last response
+        """
+        with self._lock:
+            self.not_modified += 1
+            return self._entries[url].result
+
+    def lookup(self, url, digest):
+        """
+        :param url: the URL that was requested
+        :param digest: a digest of the relevant part of the response
+        :return: the result stored for url if the digest matches the last response's, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry.digest is not None and entry.digest == digest:
+                self.unchanged += 1
+                return entry.result
+            return None
+
+    def store(self, url, digest, result):
+        """
+        :param url: the URL that was requested
+        :param digest: a digest of the relevant part of the response
+        :param result: the result parsed from the response
+        """
+        with self._lock:
+            entry = self._entries.setdefault(url, _CacheEntry())
+            if entry.digest is not None and entry.digest == digest:
+                self.unchanged += 1
+            else:
+                self.changed += 1
+            entry.digest = digest
+            entry.result = result
+
+    def get_stats(self):
+        """
+        :return: a dictionary with the number of responses that were not modified (304), unchanged and changed
+        """
+        with self._lock:
+            return {
+                "not modified": self.not_modified,
+                "unchanged": self.unchanged,
+                "changed": self.changed
+            }
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+import CONFIGS
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed request is retried. Delays grow exponentially with full jitter so clients
+    retrying at the same time spread out, and a retry budget caps retries to a fraction of all requests so an outage
+    can't multiply the load on the server.
+    """
+    def __init__(self, timeout=CONFIGS.REQUEST_TIMEOUT, max_attempts=CONFIGS.MAX_REQUEST_ATTEMPTS,
+                 base_delay=CONFIGS.RETRY_BASE_DELAY, max_delay=CONFIGS.RETRY_MAX_DELAY,
+                 budget_ratio=CONFIGS.RETRY_BUDGET_RATIO, min_budget=CONFIGS.RETRY_MIN_BUDGET):
+        """
+        :param timeout: seconds a request may take before it is considered failed
+        :param max_attempts: max number of times a request is sent, including the first time
+        :param base_delay: max seconds to wait before the first retry, doubled on every retry after
+        :param max_delay: max seconds to wait before any retry
+        :param budget_ratio: number of retries earned by every request sent
+        :param min_budget: number of retries that are always allowed, no matter how few requests were sent
+        """
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self._budget = float(min_budget)
+        self._lock = threading.Lock()
+
+    def request_sent(self):
+        with self._lock:
+            # unused retries only carry over from the last 100 requests
+            self._budget = min(self._budget + self.budget_ratio, self.min_budget + 100 * self.budget_ratio)
+
+    def get_retry_delay(self, attempt):
+        """
+        :param attempt: number of times the request has been sent so far
+        :return: seconds to wait before retrying or None if the request shouldn't be retried
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        with self._lock:
+            if self._budget < 1:
+                return None
+            self._budget -= 1
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests to an endpoint that keeps failing so they fail right away instead of tying up a worker. After
+    failure_threshold failures in a row the circuit opens for cooldown seconds, then a single trial request is let
+    through: the circuit closes again if it succeeds and stays open for another cooldown if it fails.
+    """
+    def __init__(self, failure_threshold=CONFIGS.CIRCUIT_FAILURE_THRESHOLD, cooldown=CONFIGS.CIRCUIT_COOLDOWN):
+        """
+        :param failure_threshold: number of failures in a row that opens the circuit
+        :param cooldown: seconds the circuit stays open before a trial request is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        :return: True if a request to the endpoint may be sent
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_progress or time.time() - self._opened_at < self.cooldown:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+            self._trial_in_progress = False
+
+
+class CircuitBreakers(object):
+    """
+    Keeps a separate CircuitBreaker for every endpoint
+    """
+    def __init__(self, failure_threshold=CONFIGS.CIRCUIT_FAILURE_THRESHOLD, cooldown=CONFIGS.CIRCUIT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint):
+        """
+        :param endpoint: the URL of the endpoint
+        :return: the endpoint's CircuitBreaker
+        """
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return breaker
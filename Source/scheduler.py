@@ -0,0 +1,360 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+import Queue
+import CONFIGS
+import courses_manager
+
+
+class Poller(object):
+    """
+    Fetches the seating info of many courses concurrently using a fixed number of worker threads.
+    Python 2.7 has no asyncio so the blocking urllib2 requests are spread across threads instead; the
+    worker count caps how many requests are in flight and the rate limiter of courses_manager keeps the
+    request rate to the UBC server bounded no matter how many courses are being watched.
+    """
+    def __init__(self, max_concurrent_checks=CONFIGS.MAX_CONCURRENT_CHECKS,
+                 batch_section_checks=CONFIGS.BATCH_SECTION_CHECKS, seat_history=None,
+                 page_check_interval=CONFIGS.SECTION_PAGE_CHECK_INTERVAL):
+        """
+        :param max_concurrent_checks: max number of pages being fetched at the same time
+        :param batch_section_checks: if set to True, sections of the same course are first checked together
+        through the course's section listing and only sections that aren't full are fetched individually
+        :param seat_history: the SeatHistory every seating info retrieved is appended to, None to keep no history
+        :param page_check_interval: seconds after which the page of a section settled by the listing is fetched
+        anyway for its registration count, counted from the first time the listing settled it; None to never
+        """
+        self.batch_section_checks = batch_section_checks
+        self.page_check_interval = page_check_interval
+        self.seat_history = seat_history
+        self._tasks = Queue.Queue()
+
+        for _ in range(max_concurrent_checks):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+
+    def _work(self):
+        while True:
+            url, fetch, on_fetched, batch = self._tasks.get()
+            result = None
+            try:
+                result = fetch()
+            except Exception as e:
+                print "Unexpected error while requesting {0}: {1}".format(url, e)
+            try:
+                on_fetched(result)
+            except Exception as e:
+                print "Unexpected error while handling the response of {0}: {1}".format(url, e)
+            finally:
+                batch.finish()
+
+    def _submit(self, batch, url, fetch, on_fetched):
+        """
+        :param batch: the _FetchBatch the fetch is counted in
+        :param url: the URL fetch requests
+        :param fetch: a function without parameters requesting url
+        :param on_fetched: a function taking the return value of fetch, None if it failed, called from the worker
+        thread as soon as fetch is done
+        """
+        batch.add()
+        self._tasks.put((url, fetch, on_fetched, batch))
+
+    def fetch_all(self, fetches):
+        """
+        Runs every fetch concurrently and waits for all of them to finish
+
+        :param fetches: a list of (url, fetch) tuples where fetch is a function without parameters requesting url
+        :return: a list of the return values of the fetches in the same order, None for fetches that failed
+        """
+        results = [None] * len(fetches)
+        batch = _FetchBatch()
+
+        for index, (url, fetch) in enumerate(fetches):
+            self._submit(batch, url, fetch, lambda result, index=index: results.__setitem__(index, result))
+
+        batch.wait()
+        return results
+
+    def poll(self, courses, on_checked=None):
+        """
+        Fetches the seating info of every course in courses concurrently and waits for all of them to finish. When
+        batch_section_checks is set, sections of the same course are first checked together through the course's
+        section listing and only the sections it doesn't settle are fetched individually, right as their listing
+        comes back.
+
+        :param courses: a list of Course objects
+        :param on_checked: a function taking (course, seats_info, checked_at) called from the worker thread as soon as
+        each course's check is done, so a seat found isn't held up by slower checks
+        :return: a list of (course, seats_info) tuples in the same order as courses, seats_info is None if
+        the seating info couldn't be retrieved
+        """
+        seats_infos = {}
+        batch = _FetchBatch()
+
+        def finish_check(course, seats_info):
+            checked_at = time.time()
+            course.record_seats_info(seats_info)
+            seats_infos[course] = seats_info
+            if self.seat_history is not None and seats_info is not None:
+                self.seat_history.append(course.name, checked_at, seats_info)
+            if on_checked is not None:
+                on_checked(course, seats_info, checked_at)
+
+        def fetch_section_pages(page_courses):
+            for course in page_courses:
+                self._submit(batch, course.course_url, course.get_seats_info,
+                             lambda seats_info, course=course: finish_check(course, seats_info))
+
+        def on_listed(section_statuses, listed_courses):
+            unsettled_courses = []
+            listed_at = time.time()
+            for course in listed_courses:
+                seats_info = None
+                if section_statuses is not None:
+                    section_status = section_statuses.get(" ".join(course.name.split()))
+                    seats_info = courses_manager.get_seats_info_from_section_status(section_status)
+                if seats_info is not None and not self._is_page_check_due(course, listed_at):
+                    finish_check(course, seats_info)
+                else:
+                    unsettled_courses.append(course)
+            fetch_section_pages(unsettled_courses)
+
+        courses_by_listing = self._group_by_listing(courses) if self.batch_section_checks else {}
+        for sections_url, listed_courses in courses_by_listing.items():
+            self._submit(batch, sections_url, lambda url=sections_url: courses_manager.get_section_statuses(url),
+                         lambda section_statuses, listed_courses=listed_courses: on_listed(section_statuses,
+                                                                                           listed_courses))
+
+        listed = set(course for listed_courses in courses_by_listing.values() for course in listed_courses)
+        fetch_section_pages([course for course in courses if course not in listed])
+
+        batch.wait()
+        return [(course, seats_infos.get(course)) for course in courses]
+
+    def _is_page_check_due(self, course, now):
+        """
+        :return: True if the page of course, which the listing settled, should be fetched anyway so changes in its
+        registration count are still seen
+        """
+        if self.page_check_interval is None:
+            return False
+        if course.page_checked_at is None:
+            course.page_checked_at = now
+        if now - course.page_checked_at < self.page_check_interval:
+            return False
+        course.page_checked_at = now
+        return True
+
+    @staticmethod
+    def _group_by_listing(courses):
+        """
+        :param courses: a list of Course objects
+        :return: a dictionary mapping the section listing urls worth fetching to the courses they cover
+        """
+        courses_by_listing = {}
+        for course in courses:
+            # monitor only courses print every seat count so they always need their own page
+            if not course.monitor_only:
+                courses_by_listing.setdefault(course.sections_url, []).append(course)
+
+        # a listing only saves requests if it replaces more than one section page
+        return dict((url, listed_courses) for url, listed_courses in courses_by_listing.items()
+                    if len(listed_courses) > 1)
+
+
+class _FetchBatch(object):
+    """
+    Counts the fetches of a poll that haven't finished, including the fetches added while handling the others
+    """
+    def __init__(self):
+        self._pending = 0
+        self._condition = threading.Condition()
+
+    def add(self):
+        with self._condition:
+            self._pending += 1
+
+    def finish(self):
+        with self._condition:
+            self._pending -= 1
+            if self._pending == 0:
+                self._condition.notify_all()
+
+    def wait(self):
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+
+
+def _seats_changed(old_seats_info, new_seats_info):
+    """
+    :return: True if the seat counts differ, ignoring counts that are missing from either SeatsInfo
+    """
+    if old_seats_info is None or new_seats_info is None:
+        return False
+    return any(old_count != new_count for old_count, new_count in zip(old_seats_info, new_seats_info)
+               if old_count is not None and new_count is not None)
+
+
+class _CourseSchedule(object):
+    def __init__(self):
+        self.heat = 0.0
+        self.checked_at = None
+        self.interval = None
+        self.last_seats_info = None
+        self.entry_id = None
+
+
+class AdaptivePollScheduler(object):
+    """
+    Gives every watched course its own next check time so hot courses are checked more often than quiet ones.
+    A course heats up every time its seat counts change, when it has only a few seats left and during the add/drop
+    windows; heat halves every HEAT_HALF_LIFE seconds, so a course that changes hands often stays warm between changes.
+    The check intervals run from quiet_interval for a cold course down to min_interval for the hottest ones and are
+    stretched evenly when the total would exceed the hourly budget.
+    """
+    # heat a course gains every time its seat counts change, up to 1, and seconds it takes a course to lose half its
+    # heat; a course has to change hands a few times within hours to be checked as often as min_interval
+    CHANGE_HEAT = 0.5
+    HEAT_HALF_LIFE = 4 * 60 * 60.0
+    # minimum heat of a course with 1 to this many seats left, as it's likely to fill up soon; a full course only
+    # heats up when its registration count changes
+    NEAR_FULL_SEATS = 2
+    NEAR_FULL_HEAT = 0.5
+    # minimum heat of every course during an add/drop window
+    WINDOW_HEAT = 0.75
+    # random spread of the intervals so checks don't look scripted
+    JITTER = 0.1
+
+    def __init__(self, checks_per_hour=CONFIGS.MAX_CHECKS_PER_HOUR, min_interval=CONFIGS.MIN_CHECK_INTERVAL,
+                 quiet_interval=(CONFIGS.MIN_DELAY_BW_CHECKS, CONFIGS.MAX_DELAY_BW_CHECKS),
+                 hot_windows=CONFIGS.ADD_DROP_WINDOWS):
+        """
+        :param checks_per_hour: max number of checks per hour for all courses together
+        :param min_interval: seconds between checks of the hottest courses
+        :param quiet_interval: (min, max) seconds between checks of a course without any activity
+        :param hot_windows: a list of (start, end) dates in the form 'YYYY-MM-DD' where every course is considered hot
+        """
+        self.checks_per_hour = checks_per_hour
+        self.min_interval = min_interval
+        self.quiet_interval = quiet_interval
+        self.hot_windows = [(time.mktime(time.strptime(start, '%Y-%m-%d')),
+                             time.mktime(time.strptime(end, '%Y-%m-%d')) + 24 * 60 * 60)
+                            for start, end in hot_windows]
+        self._schedules = {}
+        self._queue = []
+        self._entry_ids = itertools.count()
+        self._checks_per_second = 0.0
+
+    def _in_hot_window(self, now):
+        return any(start <= now < end for start, end in self.hot_windows)
+
+    def _push(self, course, check_time):
+        schedule = self._schedules[course]
+        schedule.entry_id = next(self._entry_ids)
+        heapq.heappush(self._queue, (check_time, schedule.entry_id, course))
+
+    def _set_interval(self, schedule, interval):
+        if schedule.interval is not None:
+            self._checks_per_second -= 1.0 / schedule.interval
+        schedule.interval = interval
+        if interval is not None:
+            self._checks_per_second += 1.0 / interval
+
+    def add(self, course, now=None):
+        """
+        Starts watching course; it's due for a check right away
+
+        :param course: a Course object
+        """
+        if course in self._schedules:
+            return
+        self._schedules[course] = _CourseSchedule()
+        self._push(course, now if now is not None else time.time())
+
+    def remove(self, course):
+        """
+        Stops watching course
+
+        :param course: a Course object
+        """
+        schedule = self._schedules.pop(course, None)
+        if schedule is not None:
+            self._set_interval(schedule, None)
+
+    def record(self, course, seats_info, now=None):
+        """
+        Updates the heat of course with the result of its check and schedules its next check
+
+        :param course: a Course object that was returned by pop_due
+        :param seats_info: the SeatsInfo of the check or None if the check failed
+        """
+        schedule = self._schedules.get(course)
+        if schedule is None:
+            return
+        if now is None:
+            now = time.time()
+
+        if schedule.checked_at is not None:
+            schedule.heat *= 0.5 ** ((now - schedule.checked_at) / self.HEAT_HALF_LIFE)
+        if _seats_changed(schedule.last_seats_info, seats_info):
+            schedule.heat = min(1.0, schedule.heat + self.CHANGE_HEAT)
+        schedule.checked_at = now
+        if seats_info is not None:
+            last_seats_info = schedule.last_seats_info
+            if seats_info.currently_registered is None and last_seats_info is not None:
+                # a check through the section listing doesn't see the registration count, so the next check of the
+                # section page is compared with the last one
+                seats_info = seats_info._replace(currently_registered=last_seats_info.currently_registered)
+            schedule.last_seats_info = seats_info
+
+        heat = schedule.heat
+        last_seats_info = schedule.last_seats_info
+        if last_seats_info is not None and 0 < last_seats_info.total_seats <= self.NEAR_FULL_SEATS:
+            heat = max(heat, self.NEAR_FULL_HEAT)
+        if self._in_hot_window(now):
+            heat = max(heat, self.WINDOW_HEAT)
+
+        # interpolates geometrically so each step in heat shortens the interval by the same factor
+        quiet_interval = random.uniform(*self.quiet_interval)
+        interval = quiet_interval * (float(self.min_interval) / quiet_interval) ** heat
+        self._set_interval(schedule, interval)
+
+        # stretches every interval evenly when the courses together would go over the budget
+        budget_stretch = max(1.0, self._checks_per_second * 60 * 60 / self.checks_per_hour)
+        jitter = random.uniform(1 - self.JITTER, 1 + self.JITTER)
+        self._push(course, now + interval * budget_stretch * jitter)
+
+    def pop_due(self, now=None):
+        """
+        :return: a list of the courses that are due for a check; each must be passed to record after its check
+        """
+        if now is None:
+            now = time.time()
+
+        due_courses = []
+        while self._queue and self._queue[0][0] <= now:
+            _, entry_id, course = heapq.heappop(self._queue)
+            schedule = self._schedules.get(course)
+            # entries of removed courses are dropped lazily
+            if schedule is not None and schedule.entry_id == entry_id:
+                due_courses.append(course)
+        return due_courses
+
+    def time_until_next_check(self, now=None):
+        """
+        :return: number of seconds until the next course is due or None if no course is being watched
+        """
+        if now is None:
+            now = time.time()
+
+        while self._queue:
+            check_time, entry_id, course = self._queue[0]
+            schedule = self._schedules.get(course)
+            if schedule is not None and schedule.entry_id == entry_id:
+                return max(check_time - now, 0)
+            heapq.heappop(self._queue)
+        return None
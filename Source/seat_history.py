@@ -0,0 +1,208 @@
+from array import array
+import bisect
+import mmap
+import os
+import struct
+import threading
+from seat_parser import SeatsInfo
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+# file header: magic and number of records written
+HEADER = struct.Struct('<8sQ')
+MAGIC = 'SEATHIS1'
+# a record: section id, timestamp and the four seat counts, a missing count is stored as -1
+RECORD = struct.Struct('<Id4h')
+MISSING_COUNT = -1
+# number of records the log file has room for when it is created, doubled every time it fills up
+INITIAL_CAPACITY = 4096
+
+
+def _lock_file(locked_file):
+    """
+    Takes an exclusive lock on locked_file without waiting, released when the file is closed
+
+    :raise IOError: if another open file holds the lock
+    """
+    if fcntl is not None:
+        fcntl.flock(locked_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(locked_file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+class SeatHistory(object):
+    """
+    Append only log of every seat count observation. Records are fixed width and written straight into a memory
+    mapped file so an observation costs a struct pack and no system call; section names are kept in a side file and
+    records refer to them by id. The timestamps and record numbers of each section are indexed in memory, so queries
+    of a section only read that section's records.
+    """
+    def __init__(self, path):
+        """
+        :param path: the path of the log file, the section names are kept in path + '.sections'
+        :raise IOError: if another SeatHistory, most likely of another running bot, has the log file open
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._section_ids = {}
+        self._section_names = []
+        self._timestamps = []
+        self._record_numbers = []
+
+        # two processes appending to the same files would write over each other's records, so the log file is locked
+        # for as long as it is open
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+b')
+        try:
+            _lock_file(self._file)
+        except IOError:
+            self._file.close()
+            raise IOError("{0} is used by another running bot, give every bot a SEAT_HISTORY_FILE of its own".format(
+                path))
+
+        sections_path = path + '.sections'
+        if os.path.exists(sections_path):
+            with open(sections_path) as sections_file:
+                for line in sections_file:
+                    self._add_section(line.rstrip('\n'))
+        self._sections_file = open(sections_path, 'a')
+
+        is_new = os.fstat(self._file.fileno()).st_size < HEADER.size
+        if is_new:
+            self._file.truncate(0)
+            self._file.truncate(HEADER.size + INITIAL_CAPACITY * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        if is_new:
+            self.record_count = 0
+            HEADER.pack_into(self._map, 0, MAGIC, 0)
+        else:
+            magic, self.record_count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                self.close()
+                raise ValueError("{0} is not a seat history file".format(path))
+            self._build_index()
+
+    def _add_section(self, section_name):
+        self._section_ids[section_name] = len(self._section_names)
+        self._section_names.append(section_name)
+        self._timestamps.append(array('d'))
+        self._record_numbers.append(array('L'))
+
+    def _build_index(self):
+        for record_number in xrange(self.record_count):
+            section_id, timestamp = RECORD.unpack_from(self._map, HEADER.size + record_number * RECORD.size)[:2]
+            self._timestamps[section_id].append(timestamp)
+            self._record_numbers[section_id].append(record_number)
+
+    def _grow(self):
+        capacity = (len(self._map) - HEADER.size) // RECORD.size
+        self._map.close()
+        self._file.truncate(HEADER.size + 2 * capacity * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def append(self, section_name, timestamp, seats_info):
+        """
+        :param section_name: the course name of the section in string (i.e 'CPSC 221 101')
+        :param timestamp: the time of the observation in seconds since the epoch
+        :param seats_info: the SeatsInfo observed
+        """
+        section_name = " ".join(section_name.upper().split())
+        seat_counts = [MISSING_COUNT if count is None else count for count in seats_info]
+
+        with self._lock:
+            section_id = self._section_ids.get(section_name)
+            if section_id is None:
+                self._sections_file.write(section_name + '\n')
+                self._sections_file.flush()
+                self._add_section(section_name)
+                section_id = self._section_ids[section_name]
+
+            offset = HEADER.size + self.record_count * RECORD.size
+            if offset + RECORD.size > len(self._map):
+                self._grow()
+            RECORD.pack_into(self._map, offset, section_id, timestamp, *seat_counts)
+            # the count goes in last so a record is never counted before it is complete
+            self._timestamps[section_id].append(timestamp)
+            self._record_numbers[section_id].append(self.record_count)
+            self.record_count += 1
+            HEADER.pack_into(self._map, 0, MAGIC, self.record_count)
+
+    def get_sections(self):
+        """
+        :return: a list of the names of every section with records
+        """
+        with self._lock:
+            return list(self._section_names)
+
+    def get_timeline(self, section_name, start=None, end=None):
+        """
+        :param section_name: the course name of the section in string (i.e 'CPSC 221 101')
+        :param start: only records from this time on are returned, the first record if not set
+        :param end: only records before this time are returned, the last record if not set
+        :return: a list of (timestamp, seats_info) tuples of the section in time order
+        """
+        with self._lock:
+            section_id = self._section_ids.get(" ".join(section_name.upper().split()))
+            if section_id is None:
+                return []
+
+            timestamps = self._timestamps[section_id]
+            first = 0 if start is None else bisect.bisect_left(timestamps, start)
+            last = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+
+            timeline = []
+            for record_number in self._record_numbers[section_id][first:last]:
+                record = RECORD.unpack_from(self._map, HEADER.size + record_number * RECORD.size)
+                timeline.append((record[1], SeatsInfo(*[None if count == MISSING_COUNT else count
+                                                        for count in record[2:]])))
+            return timeline
+
+    def get_changes(self, section_name, start=None, end=None):
+        """
+        :param section_name: the course name of the section in string (i.e 'CPSC 221 101')
+        :param start: only changes from this time on are returned, the first record if not set
+        :param end: only changes before this time are returned, the last record if not set
+        :return: a list of (timestamp, old_seats_info, new_seats_info) tuples of every time the seat counts of
+        the section changed, counts that are missing from either observation are ignored
+        """
+        changes = []
+        last_seats_info = None
+        for timestamp, seats_info in self.get_timeline(section_name, start, end):
+            if last_seats_info is not None and any(
+                    old_count != new_count for old_count, new_count in zip(last_seats_info, seats_info)
+                    if old_count is not None and new_count is not None):
+                changes.append((timestamp, last_seats_info, seats_info))
+            last_seats_info = seats_info
+        return changes
+
+    def get_churn_rates(self, start=None, end=None):
+        """
+        :param start: only changes from this time on are counted, each section's first record if not set
+        :param end: only changes before this time are counted, each section's last record if not set
+        :return: a dictionary mapping every section name to the number of times its seat counts changed per hour
+        """
+        churn_rates = {}
+        for section_name in self.get_sections():
+            timeline = self.get_timeline(section_name, start, end)
+            if not timeline:
+                continue
+            hours = ((end if end is not None else timeline[-1][0]) -
+                     (start if start is not None else timeline[0][0])) / (60.0 * 60)
+            change_count = len(self.get_changes(section_name, start, end))
+            churn_rates[section_name] = change_count / hours if hours > 0 else 0.0
+        return churn_rates
+
+    def close(self):
+        """
+        Writes the records to disk and closes the files
+        """
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._sections_file.close()
@@ -0,0 +1,100 @@
+from collections import namedtuple
+import re
+
+# seating info of a section; currently_registered is None when it comes from a section listing, which doesn't show it
+SeatsInfo = namedtuple('SeatsInfo', ['total_seats', 'currently_registered', 'general_seats', 'restricted_seats'])
+
+# html pattern of a row in the seat summary table, the label tells which seat count the row holds
+SEAT_FIELD_PATTERN = "(Total Seats Remaining|Currently Registered|General Seats Remaining|Restricted Seats Remaining\*)" \
+                     ":</td><td align=left><strong>([0-9]+)</strong>"
+SEAT_FIELD_KEY = re.compile(SEAT_FIELD_PATTERN)
+
+# position of each label's seat count in SeatsInfo
+SEAT_FIELD_INDEX = {
+    "Total Seats Remaining": 0,
+    "Currently Registered": 1,
+    "General Seats Remaining": 2,
+    "Restricted Seats Remaining*": 3
+}
+
+# label of the first row of the seat summary table; nothing before it needs to be scanned by the regex
+SEAT_SUMMARY_START = "Total Seats Remaining:"
+
+# a seat field cut off at the end of a chunk is never longer than this, so only this much needs to be carried over
+MAX_SEAT_FIELD_LENGTH = 128
+
+
+class SeatSummaryParser(object):
+    """
+    Extracts the four seat counts of a section page in a single pass; the page can be fed in chunks as it is
+    being downloaded and the parser is done as soon as the seat summary table has been consumed
+    """
+    def __init__(self):
+        self.done = False
+        self._seat_counts = [None] * len(SEAT_FIELD_INDEX)
+        self._fields_found = 0
+        self._buffer = ''
+
+    def _scan(self, text, position):
+        """
+        Records every seat field in text from position on
+
+        :return: the position after the last seat field found or position if none was found
+        """
+        for match in SEAT_FIELD_KEY.finditer(text, position):
+            index = SEAT_FIELD_INDEX[match.group(1)]
+            if self._seat_counts[index] is None:
+                self._seat_counts[index] = int(match.group(2))
+                self._fields_found += 1
+                if self._fields_found == len(SEAT_FIELD_INDEX):
+                    self.done = True
+                    return match.end()
+            position = match.end()
+        return position
+
+    def feed(self, chunk):
+        """
+        :param chunk: the next chunk of the page html
+        :return: True if all the seat counts have been found and no more chunks are needed
+        """
+        if self.done:
+            return True
+
+        text = self._buffer + chunk
+        position = 0
+
+        if not self._fields_found:
+            position = text.find(SEAT_SUMMARY_START)
+            if position == -1:
+                self._buffer = text[-MAX_SEAT_FIELD_LENGTH:]
+                return False
+
+        position = self._scan(text, position)
+
+        if self.done:
+            self._buffer = ''
+        else:
+            self._buffer = text[max(position, len(text) - MAX_SEAT_FIELD_LENGTH):]
+        return self.done
+
+    def result(self):
+        """
+        :return: a SeatsInfo or None if any 1 of the seat counts hasn't been found
+        """
+        if not self.done:
+            return None
+        return SeatsInfo(*self._seat_counts)
+
+
+def parse_seats_info(page_html):
+    """
+    :param page_html: the html of a whole section page
+    :return: a SeatsInfo or None if any 1 of the seat counts is not found
+    """
+    start = page_html.find(SEAT_SUMMARY_START)
+    if start == -1:
+        return None
+
+    parser = SeatSummaryParser()
+    parser._scan(page_html, start)
+    return parser.result()
@@ -0,0 +1,413 @@
+import bisect
+import hashlib
+import itertools
+import socket
+import sys
+import threading
+import time
+import Queue
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import CONFIGS
+import courses_manager
+import metrics
+import scheduler
+from seat_parser import SeatsInfo
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys onto nodes: every node is placed on the ring at many points so keys spread evenly,
+    and a node joining or leaving only moves the keys next to its own points
+    """
+    def __init__(self, virtual_nodes=100):
+        """
+        :param virtual_nodes: number of points every node is placed at on the ring
+        """
+        self.virtual_nodes = virtual_nodes
+        self._points = []
+        self._point_nodes = {}
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+    def add_node(self, node_id):
+        for replica in range(self.virtual_nodes):
+            point = self._hash("{0}#{1}".format(node_id, replica))
+            self._point_nodes[point] = node_id
+            bisect.insort(self._points, point)
+
+    def remove_node(self, node_id):
+        self._points = [point for point in self._points if self._point_nodes[point] != node_id]
+        self._point_nodes = dict((point, self._point_nodes[point]) for point in self._points)
+
+    def get_node(self, key):
+        """
+        :param key: the key in string i.e a section name
+        :return: the id of the node holding key or None if there are no nodes
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._point_nodes[self._points[index]]
+
+
+def check_address_and_authkey(address, authkey):
+    """
+    Messages between the coordinator and the workers are pickled, so anyone able to send one can run code on the
+    receiving end, and they carry the account password in the clear. Sharding is therefore only allowed over loopback
+    with a secret authkey.
+
+    :param address: the (host, port) tuple of the coordinator
+    :param authkey: the shared secret of the coordinator and its workers
+    :raise ValueError: if authkey isn't set or the host isn't a loopback address
+    """
+    if not authkey:
+        raise ValueError("Set the SHARD_AUTHKEY environment variable to a secret shared by the coordinator and the "
+                         "workers")
+    try:
+        is_loopback = socket.gethostbyname(address[0]).startswith('127.')
+    except socket.error:
+        is_loopback = False
+    if not is_loopback:
+        raise ValueError("{0} isn't a loopback address; run workers on other machines through a tunnel (i.e ssh -L) "
+                         "to a loopback address instead".format(address[0]))
+
+
+def _get_course_spec(course):
+    return course.name, course.allow_restricted_seats, course.monitor_only, course.current_registered_section
+
+
+class _WorkerConnection(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        with self._send_lock:
+            self.connection.send(message)
+
+
+class Coordinator(object):
+    """
+    Splits the watched courses across worker processes so each one stays within a safe request rate; see
+    check_address_and_authkey for where the workers may run. Courses are assigned to workers by consistent hashing
+    of their section name and reassigned when a worker joins or leaves. Workers report every seat check back, and
+    registering and switching are sent to the worker holding the account's login session, which is itself picked by
+    hashing the account name.
+    """
+    def __init__(self, address, authkey, action_timeout=60, on_checked=None):
+        """
+        :param address: the (host, port) tuple workers connect to, on a loopback address
+        :param authkey: the shared secret workers authenticate with
+        :param action_timeout: max seconds to wait for a worker to register or switch a course
+        :param on_checked: a function taking (course, seats_info, checked_at) called as soon as a worker reports a
+        check, see Poller.poll
+        :raise ValueError: see check_address_and_authkey
+        """
+        check_address_and_authkey(address, authkey)
+        self.action_timeout = action_timeout
+        self.on_checked = on_checked
+        self._ring = HashRing()
+        self._workers = {}
+        self._courses = {}
+        self._assignments = {}
+        self._account = None
+        self._account_node = None
+        self._observations = Queue.Queue()
+        self._action_results = {}
+        self._action_ids = itertools.count()
+        self._lock = threading.Lock()
+
+        self._listener = Listener(address, authkey=authkey)
+        accept_thread = threading.Thread(target=self._accept_workers)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+    def set_account(self, user_id, password, year, season):
+        """
+        :param user_id: CWL account user ID every registration and switch is done with
+        :param password: CWL account password
+        :param year: the school year as a string i.e 2015
+        :param season: the season (W or S)
+        """
+        with self._lock:
+            self._account = (user_id, password, year, season)
+            for node_id in self._workers:
+                self._send(node_id, ('semester', year, season))
+            self._rebalance()
+
+    def add_course(self, course):
+        """
+        :param course: a Course object to have checked by a worker
+        """
+        with self._lock:
+            self._courses[course.name] = course
+            self._rebalance()
+
+    def remove_course(self, course):
+        """
+        :param course: a Course object to stop checking
+        """
+        with self._lock:
+            self._courses.pop(course.name, None)
+            self._rebalance()
+
+    def get_observations(self, timeout):
+        """
+        Waits up to timeout seconds for the workers to report seat checks
+
+        :return: a list of (course, seats_info) tuples of every check reported since the last call
+        """
+        observations = []
+        try:
+            observations.append(self._observations.get(timeout=timeout))
+            while True:
+                observations.append(self._observations.get_nowait())
+        except Queue.Empty:
+            pass
+
+        with self._lock:
+            # courses removed since their check was reported are dropped
+            return [(self._courses[name], seats_info) for name, seats_info in observations if name in self._courses]
+
+    def register_course(self, course, detected_at=None):
+        """
+        :return: True if the worker holding the login session registered course successfully, False otherwise
+        """
+        return self._run_action('register', course, detected_at)
+
+    def switch_section(self, course, detected_at=None):
+        """
+        :return: True if the worker holding the login session switched into course successfully, False otherwise
+        """
+        return self._run_action('switch', course, detected_at)
+
+    def _run_action(self, action, course, detected_at):
+        action_id = next(self._action_ids)
+        done = threading.Event()
+        with self._lock:
+            worker = self._workers.get(self._account_node)
+            if worker is None:
+                print "No worker is available to {0} {1}".format(action, course.name)
+                return False
+            self._action_results[action_id] = [done, False]
+
+        try:
+            worker.send(('action', action_id, action, _get_course_spec(course), detected_at))
+        except (IOError, EOFError):
+            pass
+        done.wait(self.action_timeout)
+
+        with self._lock:
+            return self._action_results.pop(action_id)[1]
+
+    def _accept_workers(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+                _, node_id = connection.recv()
+            except (AuthenticationError, IOError, EOFError) as e:
+                print "A worker failed to join: {0}".format(e)
+                continue
+            with self._lock:
+                self._workers[node_id] = _WorkerConnection(connection)
+                self._ring.add_node(node_id)
+                print "Worker {0} joined".format(node_id)
+                if self._account is not None:
+                    self._send(node_id, ('semester', self._account[2], self._account[3]))
+                self._rebalance()
+
+            reader_thread = threading.Thread(target=self._read_worker, args=(node_id, connection))
+            reader_thread.daemon = True
+            reader_thread.start()
+
+    def _read_worker(self, node_id, connection):
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'seats':
+                    _, course_name, seats_info, checked_at = message
+                    seats_info = SeatsInfo(*seats_info) if seats_info else None
+                    metrics.increment('shard checks')
+                    self._observations.put((course_name, seats_info))
+                    with self._lock:
+                        course = self._courses.get(course_name)
+                    if self.on_checked is not None and course is not None:
+                        self.on_checked(course, seats_info, checked_at)
+                elif message[0] == 'action result':
+                    _, action_id, is_success = message
+                    with self._lock:
+                        action_result = self._action_results.get(action_id)
+                        if action_result is not None:
+                            action_result[1] = is_success
+                            action_result[0].set()
+        except (IOError, EOFError):
+            pass
+
+        with self._lock:
+            print "Worker {0} left".format(node_id)
+            del self._workers[node_id]
+            self._ring.remove_node(node_id)
+            self._assignments = dict((name, node) for name, node in self._assignments.items() if node != node_id)
+            if self._account_node == node_id:
+                self._account_node = None
+            self._rebalance()
+
+    def _send(self, node_id, message):
+        try:
+            self._workers[node_id].send(message)
+        except (IOError, EOFError):
+            # the worker's reader thread notices it left and rebalances
+            pass
+
+    def _rebalance(self):
+        # called with self._lock held whenever the courses, the account or the workers change
+        if self._account is not None:
+            user_id, password, year, season = self._account
+            account_node = self._ring.get_node(user_id)
+            if account_node is not None and account_node != self._account_node:
+                self._account_node = account_node
+                self._send(account_node, ('login', user_id, password))
+
+        moved_courses = {}
+        for name, node_id in self._assignments.items():
+            if name not in self._courses or self._ring.get_node(name) != node_id:
+                del self._assignments[name]
+                moved_courses.setdefault(node_id, ([], []))[1].append(name)
+        for name, course in self._courses.items():
+            node_id = self._ring.get_node(name)
+            if node_id is not None and name not in self._assignments:
+                self._assignments[name] = node_id
+                moved_courses.setdefault(node_id, ([], []))[0].append(_get_course_spec(course))
+
+        for node_id, (added_courses, removed_courses) in moved_courses.items():
+            if node_id not in self._workers:
+                continue
+            if removed_courses:
+                self._send(node_id, ('unwatch', removed_courses))
+            if added_courses:
+                self._send(node_id, ('watch', added_courses))
+
+    def get_stats(self):
+        """
+        :return: a dictionary with the number of workers and courses
+        """
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "courses": len(self._courses)
+            }
+
+
+class Worker(object):
+    """
+    Checks the courses a Coordinator assigns to it with its own Poller and AdaptivePollScheduler and reports every
+    check back; registers and switches courses for the coordinator when it holds the account's login session
+    """
+    def __init__(self, address, authkey, node_id):
+        """
+        :param address: the (host, port) tuple of the coordinator, on a loopback address
+        :param authkey: the shared secret of the coordinator
+        :param node_id: the name of this worker, unique among the workers
+        :raise ValueError: see check_address_and_authkey
+        """
+        check_address_and_authkey(address, authkey)
+        self.node_id = node_id
+        self._connection = _WorkerConnection(Client(address, authkey=authkey))
+        self._courses = {}
+        self._credentials = None
+        self._semester = None
+        self._poller = scheduler.Poller()
+        self._poll_scheduler = scheduler.AdaptivePollScheduler()
+        self._lock = threading.Lock()
+
+    def run(self):
+        self._connection.send(('join', self.node_id))
+        receiver_thread = threading.Thread(target=self._receive)
+        receiver_thread.daemon = True
+        receiver_thread.start()
+
+        while receiver_thread.is_alive():
+            with self._lock:
+                due_courses = self._poll_scheduler.pop_due()
+            self._poller.poll(due_courses, self._report)
+
+            with self._lock:
+                delay = self._poll_scheduler.time_until_next_check()
+            # wakes up at least every second to pick up newly assigned courses
+            time.sleep(min(delay if delay is not None else 1, 1))
+
+    def _report(self, course, seats_info, checked_at):
+        # called from the poller's worker threads as each check is done so the coordinator gets it right away
+        with self._lock:
+            self._poll_scheduler.record(course, seats_info)
+        try:
+            self._connection.send(('seats', course.name, tuple(seats_info) if seats_info else None, checked_at))
+        except (IOError, EOFError):
+            # the receiver thread notices the coordinator is gone and the run loop ends with it
+            pass
+
+    def _receive(self):
+        try:
+            while True:
+                message = self._connection.connection.recv()
+                try:
+                    self._handle(message)
+                except Exception as e:
+                    print "Unexpected error while handling {0}: {1}".format(message[0], e)
+                    if message[0] == 'action':
+                        self._connection.send(('action result', message[1], False))
+        except (IOError, EOFError):
+            print "Lost the connection to the coordinator"
+
+    def _handle(self, message):
+        if message[0] == 'semester':
+            if self._semester != message[1:]:
+                self._semester = message[1:]
+                courses_manager.go_to_semester(*self._semester)
+
+        elif message[0] == 'login':
+            self._credentials = message[1:]
+            courses_manager.send_login_request(*self._credentials)
+            # the semester is kept in the session so it's set again for the new one
+            if self._semester is not None:
+                courses_manager.go_to_semester(*self._semester)
+
+        elif message[0] == 'watch':
+            with self._lock:
+                for name, allow_restricted_seats, monitor_only, current_registered_section in message[1]:
+                    course = courses_manager.Course(name, allow_restricted_seats, monitor_only,
+                                                    current_registered_section)
+                    self._courses[name] = course
+                    self._poll_scheduler.add(course)
+
+        elif message[0] == 'unwatch':
+            with self._lock:
+                for name in message[1]:
+                    course = self._courses.pop(name, None)
+                    if course is not None:
+                        self._poll_scheduler.remove(course)
+
+        elif message[0] == 'action':
+            _, action_id, action, course_spec, detected_at = message
+            course = courses_manager.Course(*course_spec)
+            is_success = False
+            if self._credentials is not None:
+                user_id, password = self._credentials
+                if action == 'register':
+                    is_success = course.register_course(user_id, password, detected_at)
+                else:
+                    is_success = course.switch_section(user_id, password, detected_at)
+            self._connection.send(('action result', action_id, is_success))
+
+
+if __name__ == "__main__":
+    # usage: SHARD_AUTHKEY=... python sharding.py COORDINATOR_HOST COORDINATOR_PORT WORKER_NAME
+    try:
+        worker = Worker((sys.argv[1], int(sys.argv[2])), CONFIGS.SHARD_AUTHKEY, sys.argv[3])
+    except ValueError as e:
+        print e
+        exit()
+    worker.run()
@@ -0,0 +1,203 @@
+import argparse
+import bisect
+import random
+import CONFIGS
+from scheduler import AdaptivePollScheduler
+from seat_history import SeatHistory
+from seat_parser import SeatsInfo
+
+
+class UniformPollScheduler(object):
+    """
+    Checks every course once per rotation like the loop used before AdaptivePollScheduler, with the rotation as short
+    as the hourly budget allows; has the interface of AdaptivePollScheduler so both can be simulated the same way
+    """
+    def __init__(self, checks_per_hour):
+        self.checks_per_hour = checks_per_hour
+        self._check_times = {}
+
+    def add(self, course, now):
+        self._check_times[course] = now
+
+    def record(self, course, seats_info, now):
+        self._check_times[course] = now + len(self._check_times) * 60 * 60.0 / self.checks_per_hour
+
+    def pop_due(self, now):
+        return [course for course, check_time in self._check_times.items() if check_time <= now]
+
+    def time_until_next_check(self, now):
+        return max(min(self._check_times.values()) - now, 0)
+
+
+def has_open_seat(seats_info):
+    return seats_info.general_seats > 0
+
+
+def generate_timelines(section_count, hours, seed):
+    """
+    Makes up seat histories where sections stay full except for short openings. Every section changes hands at its
+    own rate, most sections rarely and a few often, and some of those changes are drops that open a seat until the
+    next registration takes it.
+
+    :return: a dictionary mapping section names to lists of (timestamp, seats_info) tuples in time order
+    """
+    generator = random.Random(seed)
+    end = hours * 60 * 60.0
+    timelines = {}
+    for index in range(section_count):
+        registered = generator.randint(30, 200)
+        timeline = [(0.0, SeatsInfo(0, registered, 0, 0))]
+        changes_per_hour = generator.expovariate(1 / 0.5)
+        now = 0.0
+        while changes_per_hour > 0:
+            now += generator.expovariate(changes_per_hour / (60 * 60.0))
+            if now >= end:
+                break
+            if generator.random() < 0.2:
+                # a drop opens a seat that stays open until someone else registers
+                timeline.append((now, SeatsInfo(1, registered - 1, 1, 0)))
+                now += generator.expovariate(1 / (10 * 60.0))
+                timeline.append((now, SeatsInfo(0, registered, 0, 0)))
+            else:
+                registered += generator.choice([-1, 1])
+                timeline.append((now, SeatsInfo(0, registered, 0, 0)))
+        timelines["SIMU {0} 101".format(100 + index)] = timeline
+    return timelines
+
+
+def read_timelines(history_path):
+    """
+    :return: the timeline of every section in the SeatHistory at history_path, see generate_timelines
+    """
+    seat_history = SeatHistory(history_path)
+    try:
+        return dict((section_name, seat_history.get_timeline(section_name))
+                    for section_name in seat_history.get_sections())
+    finally:
+        seat_history.close()
+
+
+def get_openings(timeline):
+    """
+    :return: a list of (opened at, closed at) tuples of every time the section had an open seat, closed at is None if
+    it was still open at the end of the timeline
+    """
+    openings = []
+    opened_at = None
+    for timestamp, seats_info in timeline:
+        if has_open_seat(seats_info) and opened_at is None:
+            opened_at = timestamp
+        elif not has_open_seat(seats_info) and opened_at is not None:
+            openings.append((opened_at, timestamp))
+            opened_at = None
+    if opened_at is not None:
+        openings.append((opened_at, None))
+    return openings
+
+
+def simulate(scheduler, timelines, start, end, page_check_interval=None):
+    """
+    Checks the sections whenever scheduler says they are due, each check seeing the last seat counts of the section's
+    timeline
+
+    :param page_check_interval: if set, full sections are checked through the section listing like with
+    BATCH_SECTION_CHECKS, which hides their registration count except for a page check every this many seconds
+    :return: a dictionary mapping section names to the times they were checked at
+    """
+    timestamps = dict((section_name, [timestamp for timestamp, _ in timeline])
+                      for section_name, timeline in timelines.items())
+    check_times = dict((section_name, []) for section_name in timelines)
+    for section_name in timelines:
+        scheduler.add(section_name, start)
+
+    page_checked_at = {}
+    now = start
+    while now < end:
+        for section_name in scheduler.pop_due(now):
+            check_times[section_name].append(now)
+            index = bisect.bisect_right(timestamps[section_name], now) - 1
+            seats_info = timelines[section_name][max(index, 0)][1]
+            if page_check_interval is not None and seats_info.total_seats == 0:
+                # the same rule as scheduler.Poller, counted from the first time the listing settles the section
+                if now - page_checked_at.setdefault(section_name, now) >= page_check_interval:
+                    page_checked_at[section_name] = now
+                else:
+                    seats_info = seats_info._replace(currently_registered=None)
+            scheduler.record(section_name, seats_info, now)
+        now += max(scheduler.time_until_next_check(now), 1)
+    return check_times
+
+
+def measure_detection(timelines, check_times):
+    """
+    :return: a tuple of a list of the seconds from every opening to the first check seeing it and the number of
+    openings that closed before any check saw them
+    """
+    delays = []
+    missed = 0
+    for section_name, timeline in timelines.items():
+        section_check_times = check_times[section_name]
+        for opened_at, closed_at in get_openings(timeline):
+            index = bisect.bisect_left(section_check_times, opened_at)
+            if index < len(section_check_times) and (closed_at is None or section_check_times[index] < closed_at):
+                delays.append(section_check_times[index] - opened_at)
+            else:
+                missed += 1
+    return delays, missed
+
+
+def print_result(name, check_times, delays, missed, hours):
+    check_count = sum(len(times) for times in check_times.values())
+    delays = sorted(delays)
+    print "{0}: {1:.0f} checks/hour, {2} of {3} openings caught".format(name, check_count / hours, len(delays),
+                                                                       len(delays) + missed)
+    if delays:
+        print "  seconds from opening to detection: mean {0:.0f}, median {1:.0f}, p90 {2:.0f}".format(
+            sum(delays) / len(delays), delays[len(delays) // 2], delays[int(len(delays) * 0.9)])
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Replays seat histories against AdaptivePollScheduler, with "
+                                                          "and without checking full sections through the section "
+                                                          "listing, and against checking every course each rotation "
+                                                          "with as many checks as AdaptivePollScheduler made, and "
+                                                          "reports how soon openings are caught.")
+    argument_parser.add_argument('--history', help="a seat history recorded with SEAT_HISTORY_FILE; made up if not "
+                                                   "given")
+    argument_parser.add_argument('--sections', type=int, default=20, help="number of made up sections")
+    argument_parser.add_argument('--hours', type=float, default=48, help="hours of made up history")
+    argument_parser.add_argument('--checks-per-hour', type=int, default=CONFIGS.MAX_CHECKS_PER_HOUR,
+                                 help="hourly budget of both schedulers")
+    argument_parser.add_argument('--page-check-interval', type=float, default=CONFIGS.SECTION_PAGE_CHECK_INTERVAL,
+                                 help="seconds between page checks of full sections checked through the listing")
+    argument_parser.add_argument('--seed', type=int, default=0, help="seed of the made up history and the jitter")
+    args = argument_parser.parse_args()
+
+    if args.history:
+        timelines = read_timelines(args.history)
+    else:
+        timelines = generate_timelines(args.sections, args.hours, args.seed)
+    timelines = dict((section_name, timeline) for section_name, timeline in timelines.items() if timeline)
+    if not timelines:
+        argument_parser.error("the seat history has no records")
+
+    start = min(timeline[0][0] for timeline in timelines.values())
+    end = max(timeline[-1][0] for timeline in timelines.values())
+    hours = (end - start) / (60 * 60.0)
+    print "{0} sections over {1:.1f} hours, {2} openings".format(
+        len(timelines), hours, sum(len(get_openings(timeline)) for timeline in timelines.values()))
+
+    random.seed(args.seed)
+    adaptive_check_times = simulate(AdaptivePollScheduler(args.checks_per_hour, hot_windows=[]), timelines, start, end)
+    print_result("adaptive", adaptive_check_times, *measure_detection(timelines, adaptive_check_times), hours=hours)
+
+    batched_check_times = simulate(AdaptivePollScheduler(args.checks_per_hour, hot_windows=[]), timelines, start, end,
+                                   args.page_check_interval)
+    print_result("adaptive, full sections checked through the listing", batched_check_times,
+                 *measure_detection(timelines, batched_check_times), hours=hours)
+
+    # quiet courses are checked less often than the budget allows, so the uniform rotation gets the same checks as
+    # the adaptive scheduler made for a fair comparison
+    adaptive_checks_per_hour = sum(len(times) for times in adaptive_check_times.values()) / hours
+    uniform_check_times = simulate(UniformPollScheduler(adaptive_checks_per_hour), timelines, start, end)
+    print_result("uniform", uniform_check_times, *measure_detection(timelines, uniform_check_times), hours=hours)
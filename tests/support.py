@@ -0,0 +1,254 @@
+import BaseHTTPServer
+import os
+import socket
+import SocketServer
+import ssl
+import struct
+import sys
+import threading
+import time
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Source')
+if SOURCE_DIR not in sys.path:
+    sys.path.insert(0, SOURCE_DIR)
+
+import CONFIGS
+
+# the tests never touch the files or ports of a real run, and failed requests are retried right away
+CONFIGS.SESSION_FILE = None
+CONFIGS.SEAT_HISTORY_FILE = None
+CONFIGS.METRICS_PORT = None
+CONFIGS.METRICS_LOG_INTERVAL = None
+CONFIGS.RECORD_FILE = None
+CONFIGS.REPLAY_FILE = None
+CONFIGS.REQUEST_TIMEOUT = 0.5
+CONFIGS.RETRY_BASE_DELAY = 0.01
+CONFIGS.RETRY_MAX_DELAY = 0.05
+CONFIGS.MAX_REQUESTS_PER_SECOND = CONFIGS.ACTION_REQUESTS_PER_SECOND = 10 ** 6
+CONFIGS.CIRCUIT_FAILURE_THRESHOLD = 3
+CONFIGS.CIRCUIT_COOLDOWN = 60
+
+import courses_manager
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import ResponseCache
+from retry_policy import CircuitBreakers, RetryPolicy
+
+LOGOUT_BUTTON_HTML = courses_manager.LOGOUT_BUTTON_HTML
+
+# certificate and key of the stub server when it speaks https, valid for localhost until 2126
+STUB_CERT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'stub_server.pem')
+
+
+def seat_page(total_seats, currently_registered, general_seats, restricted_seats, padding=0):
+    """
+    :param padding: number of bytes of filler before the seat summary, to make the page span many chunks
+    :return: the html of a section page with the given seat counts
+    """
+    return ("<html><body>" + "x" * padding + LOGOUT_BUTTON_HTML + "<table>"
+            "<tr><td>Total Seats Remaining:</td><td align=left><strong>{0}</strong></td></tr>"
+            "<tr><td>Currently Registered:</td><td align=left><strong>{1}</strong></td></tr>"
+            "<tr><td>General Seats Remaining:</td><td align=left><strong>{2}</strong></td></tr>"
+            "<tr><td>Restricted Seats Remaining*:</td><td align=left><strong>{3}</strong></td></tr>"
+            "</table></body></html>").format(total_seats, currently_registered, general_seats, restricted_seats)
+
+
+def section_listing(section_statuses):
+    """
+    :param section_statuses: a list of (section name, status) tuples
+    :return: the html of a section listing with a row for every section
+    """
+    rows = "".join("<tr class=section{0}><td>{1}</td><td nowrap><a href=/cs/main?section={2}>{2}</a></td></tr>".format(
+        index % 2 + 1, status, section_name) for index, (section_name, status) in enumerate(section_statuses))
+    return "<html><body><table>" + rows + "</table></body></html>"
+
+
+class Response(object):
+    """
+    A canned answer of the StubServer
+    """
+    def __init__(self, status=200, body='', headers=None, delay=0, reset=False, close=False):
+        """
+        :param status: the status code
+        :param body: the body
+        :param headers: a dictionary of extra headers
+        :param delay: seconds to wait before answering
+        :param reset: if set to True, the connection is reset instead of answered
+        :param close: if set to True, the connection is closed after the answer without telling the client, like a
+        server dropping an idle keep-alive connection
+        """
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.delay = delay
+        self.reset = reset
+        self.close = close
+
+
+class _StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the status line, headers and body go out in one write, so the response isn't held up by delayed acks
+    wbufsize = -1
+
+    def do_GET(self):
+        self.body = None
+        self.server.stub.answer(self)
+
+    def do_POST(self):
+        self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.stub.answer(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops the connections of a full rotation checked at once
+    request_queue_size = 128
+
+    def process_request(self, request, client_address):
+        with self.stub._lock:
+            self.stub.connections_accepted += 1
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        # clients hang up on purpose in the timeout tests
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+class StubServer(object):
+    """
+    A local HTTP server standing in for the UBC site. Every URL is answered from the list of Responses set for it with
+    set_responses, in order and repeating the last one, or by the function set for it with set_handler; URLs without
+    either get a 404. Every request is logged along with the headers and the form data of the last request of each URL,
+and every connection (handshake) accepted is counted.
+    """
+    def __init__(self, tls=False):
+        """
+        :param tls: if set to True, the server speaks https with the certificate in STUB_CERT_FILE, see
+        get_stub_ssl_context
+        """
+        self.requests = []
+        self.last_headers = {}
+        self.last_bodies = {}
+        self.connections_accepted = 0
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubRequestHandler)
+        self._server.stub = self
+        if tls:
+            self._server.socket = ssl.wrap_socket(self._server.socket, certfile=STUB_CERT_FILE, server_side=True)
+        # python 2 only matches the certificate against host names
+        self.base_url = "{0}://{1}:{2}".format('https' if tls else 'http', 'localhost' if tls else '127.0.0.1',
+                                               self._server.server_address[1])
+
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def set_responses(self, url, *responses):
+        with self._lock:
+            self._responses[url] = list(responses)
+
+    def set_handler(self, url, handler):
+        """
+        :param handler: a function without parameters returning the Response to every request of url
+        """
+        with self._lock:
+            self._responses[url] = handler
+
+    def count_requests(self, url):
+        with self._lock:
+            return self.requests.count(url)
+
+    def answer(self, handler):
+        url = self.base_url + handler.path
+        with self._lock:
+            self.requests.append(url)
+            self.last_headers[url] = dict(handler.headers.items())
+            self.last_bodies[url] = handler.body
+            responses = self._responses.get(url)
+            if callable(responses):
+                response = responses()
+            elif not responses:
+                response = Response(404, "Not Found")
+            elif len(responses) > 1:
+                response = responses.pop(0)
+            else:
+                response = responses[0]
+
+        if response.delay:
+            time.sleep(response.delay)
+        if response.reset:
+            # a zero linger time makes close send a reset
+            handler.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            handler.connection.close()
+            handler.close_connection = 1
+            return
+
+        try:
+            handler.send_response(response.status)
+            for name, value in response.headers.items():
+                handler.send_header(name, value)
+            handler.send_header('Content-Length', str(len(response.body)))
+            handler.end_headers()
+            handler.wfile.write(response.body)
+        except socket.error:
+            # the client gave up waiting
+            pass
+        if response.close:
+            handler.close_connection = 1
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def get_stub_ssl_context():
+    """
+    :return: an ssl.SSLContext verifying servers like the default one, but trusting the certificate of the stub server
+    """
+    return ssl.create_default_context(cafile=STUB_CERT_FILE)
+
+
+# the urls use_stub_server points at the stub server, as they are on the UBC site
+_SITE_URLS = dict((name, getattr(courses_manager, name)) for name in (
+    'COURSE_URL_TEMPLATE', 'COURSE_SECTIONS_URL_TEMPLATE', 'COURSE_REGISTRATION_URL_TEMPLATE', 'LOGIN_STATUS_URL',
+    'CAS_LOGIN_URL', 'COURSE_SWITCH_URL', 'COURSE_SWITCH_CONFIRM_URL'))
+
+
+def _reset_request_state():
+    courses_manager.response_cache = ResponseCache()
+    courses_manager.retry_policy = RetryPolicy()
+    courses_manager.circuit_breakers = CircuitBreakers()
+    courses_manager.rate_limiter = AdaptiveRateLimiter(CONFIGS.MAX_REQUESTS_PER_SECOND,
+                                                       CONFIGS.MIN_REQUESTS_PER_SECOND, CONFIGS.RATE_INCREASE,
+                                                       CONFIGS.SLOW_RESPONSE_SECONDS,
+                                                       CONFIGS.ACTION_REQUESTS_PER_SECOND)
+
+
+def use_stub_server(stub_server):
+    """
+    Points the urls of courses_manager at stub_server and gives it a fresh cache, retry policy, circuit breakers and
+    rate limiter so tests don't affect each other
+    """
+    base_url = stub_server.base_url + "/cs/main"
+    courses_manager.COURSE_URL_TEMPLATE = base_url + "?req=5&dept={0}&course={1}&section={2}"
+    courses_manager.COURSE_SECTIONS_URL_TEMPLATE = base_url + "?req=3&dept={0}&course={1}"
+    courses_manager.COURSE_REGISTRATION_URL_TEMPLATE = base_url + "?submit=Register&wldel={0}|{1}|{2}"
+    courses_manager.LOGIN_STATUS_URL = base_url + "?submit=Login"
+    courses_manager.CAS_LOGIN_URL = stub_server.base_url + "/ubc-cas/login"
+    courses_manager.COURSE_SWITCH_URL = base_url + "?pname=regi_sections&tname=regi_sections"
+    courses_manager.COURSE_SWITCH_CONFIRM_URL = base_url
+    _reset_request_state()
+
+
+def use_site_urls():
+    """
+    Points the urls of courses_manager back at the UBC site, i.e to replay the recorded fixtures, and gives it a fresh
+    cache, retry policy, circuit breakers and rate limiter
+    """
+    for name, url in _SITE_URLS.items():
+        setattr(courses_manager, name, url)
+    _reset_request_state()
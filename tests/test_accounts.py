@@ -0,0 +1,97 @@
+import random
+import resource
+import unittest
+from support import Response, StubServer, seat_page, use_stub_server
+import accounts
+import courses_manager
+import scheduler
+from seat_parser import SeatsInfo
+
+SECTION_COUNT = 50
+COURSES_PER_ACCOUNT = 5
+
+
+def get_rss():
+    """
+    :return: the resident memory of this process in bytes, None where /proc isn't available
+    """
+    try:
+        with open('/proc/self/statm') as statm_file:
+            return int(statm_file.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        return None
+
+
+class AccountPoolTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.section_names = ["CPSC {0} 101".format(100 + index) for index in range(SECTION_COUNT)]
+        for section_name in self.section_names:
+            self.server.set_responses(courses_manager.Course(section_name).course_url,
+                                      Response(body=seat_page(3, 40, 3, 0)))
+        self.pool = accounts.AccountPool(scheduler.Poller(16, batch_section_checks=False))
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def add_accounts(self, account_count):
+        for index in range(account_count):
+            account = courses_manager.AccountSession("user{0}".format(index), "password")
+            for section_name in random.sample(self.section_names, COURSES_PER_ACCOUNT):
+                courses_manager.add_course_to_watch(courses_manager.Course(section_name), account)
+            self.pool.add_account(account)
+
+    def count_distinct_sections(self):
+        return len(set(course.name for account in self.pool.accounts
+                       for course in courses_manager.get_courses_watch_list(account)))
+
+    def test_shared_section_is_fetched_once(self):
+        watchers = []
+        for index in range(5):
+            account = courses_manager.AccountSession("user{0}".format(index), "password")
+            courses_manager.add_course_to_watch(courses_manager.Course("CPSC 100 101"), account)
+            self.pool.add_account(account)
+        monitoring_account = courses_manager.AccountSession("monitor", "password")
+        courses_manager.add_course_to_watch(courses_manager.Course("CPSC 100 101", monitor_only=True),
+                                            monitoring_account)
+        self.pool.add_account(monitoring_account)
+
+        results = self.pool.poll(lambda account, course, seats_info, checked_at: watchers.append(account))
+
+        self.assertEqual(self.server.requests, [courses_manager.Course("CPSC 100 101").course_url])
+        self.assertEqual(sorted(watchers), sorted(self.pool.accounts))
+        for account, course, seats_info in results:
+            self.assertEqual(seats_info, SeatsInfo(3, 40, 3, 0))
+            self.assertEqual(course.last_seats_info, SeatsInfo(3, 40, 3, 0))
+
+    def test_removed_account_is_not_polled(self):
+        self.add_accounts(2)
+        removed_account = self.pool.accounts[0]
+        self.pool.remove_account(removed_account)
+
+        results = self.pool.poll()
+
+        self.assertEqual(set(account for account, _, _ in results), set([self.pool.accounts[0]]))
+        self.assertEqual(len(self.server.requests), COURSES_PER_ACCOUNT)
+
+    def test_requests_per_rotation_stay_at_the_distinct_sections(self):
+        rss_before = get_rss()
+        for account_count in (10, 100, 300):
+            self.add_accounts(account_count - len(self.pool.accounts))
+            del self.server.requests[:]
+
+            results = self.pool.poll()
+
+            self.assertEqual(len(results), account_count * COURSES_PER_ACCOUNT)
+            self.assertEqual(len(self.server.requests), self.count_distinct_sections())
+            self.assertTrue(all(seats_info == SeatsInfo(3, 40, 3, 0) for _, _, seats_info in results))
+
+        if rss_before is not None:
+            # an account is its cookie jar, opener and watch list; the pages are shared by all of them
+            self.assertLess((get_rss() - rss_before) / 300, 100 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import threading
+import time
+import unittest
+from support import Response, StubServer, seat_page, use_stub_server
+import actions
+import courses_manager
+import scheduler
+from courses_manager import Course, SectionGroup
+
+
+class _RecordingDispatcher(object):
+    def __init__(self):
+        self.notifications = []
+        self.notified = threading.Condition()
+
+    def notify(self, receiver_address, message, subject):
+        with self.notified:
+            self.notifications.append((time.time(), subject))
+            self.notified.notify_all()
+
+
+class ActionPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.account = courses_manager.AccountSession()
+        # registrations go out without logging in first
+        self.account.session_state.mark_valid()
+        self.dispatcher = _RecordingDispatcher()
+        self.pipeline = actions.ActionPipeline("user", "password", self.dispatcher, "user@example.com",
+                                               account=self.account)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def watch(self, *courses):
+        for course in courses:
+            courses_manager.add_course_to_watch(course, self.account)
+            self.server.set_responses(course.registration_url, Response(body="registered"))
+
+    def wait_for_notifications(self, count, timeout=5):
+        deadline = time.time() + timeout
+        with self.dispatcher.notified:
+            while len(self.dispatcher.notifications) < count:
+                self.assertLess(time.time(), deadline, "timed out")
+                self.dispatcher.notified.wait(0.1)
+
+    def wait_for_completed(self, count, timeout=5):
+        completed_courses = []
+        deadline = time.time() + timeout
+        while len(completed_courses) < count:
+            self.assertLess(time.time(), deadline, "timed out")
+            self.pipeline.completed_event.wait(0.1)
+            completed_courses.extend(self.pipeline.get_completed())
+        return completed_courses
+
+    def count_registrations(self, courses):
+        return [self.server.count_requests(course.registration_url) for course in courses]
+
+    def test_only_seats_the_course_can_take_are_acted_on(self):
+        course = Course("CPSC 221 101", allow_restricted_seats=False)
+
+        self.assertFalse(self.pipeline.publish(course, "No Seats", time.time()))
+        self.assertFalse(self.pipeline.publish(course, "Restricted Seats", time.time()))
+        self.assertFalse(self.pipeline.publish(course, "Failed to get seating info", time.time()))
+        self.assertEqual(actions.get_seat_type(Course("CPSC 221 101"), "Restricted Seats"), "restricted")
+
+    def test_a_section_is_acted_on_once(self):
+        course = Course("CPSC 221 101")
+        self.watch(course)
+
+        self.assertTrue(self.pipeline.publish(course, "General Seats", time.time()))
+        self.assertTrue(self.pipeline.publish(Course("cpsc 221 101"), "General Seats", time.time()))
+
+        self.assertEqual(self.wait_for_completed(1), [course])
+        self.assertEqual(self.count_registrations([course]), [1])
+        self.assertNotIn(course, courses_manager.get_courses_watch_list(self.account))
+
+    def test_first_section_of_a_group_wins(self):
+        group = SectionGroup(["CPSC 221 L1A", "CPSC 221 L1B", "CPSC 221 L1C"])
+        self.watch(*group.courses)
+
+        for course in reversed(group.courses):
+            self.pipeline.publish(course, "General Seats", time.time())
+
+        self.assertEqual(sorted(course.name for course in self.wait_for_completed(3)),
+                         [course.name for course in group.courses])
+        self.assertEqual(self.count_registrations(group.courses), [0, 0, 1])
+        self.assertEqual(len(courses_manager.get_courses_watch_list(self.account)), 0)
+
+    def test_group_keeps_racing_after_a_failure(self):
+        group = SectionGroup(["CPSC 221 L1A", "CPSC 221 L1B"])
+        self.watch(*group.courses)
+        self.server.set_responses(group.courses[0].registration_url, Response(403, "Forbidden", delay=0.2))
+
+        self.pipeline.publish(group.courses[0], "General Seats", time.time())
+        # claimed by the first section while it's being registered
+        self.pipeline.publish(group.courses[1], "General Seats", time.time())
+        self.assertEqual(self.wait_for_completed(1), [group.courses[0]])
+        self.assertEqual(self.count_registrations(group.courses), [1, 0])
+
+        self.pipeline.publish(group.courses[1], "General Seats", time.time())
+        self.assertEqual(self.wait_for_completed(1), [group.courses[1]])
+        self.assertEqual(self.count_registrations(group.courses), [1, 1])
+
+    def test_switches_when_already_registered(self):
+        course = Course("CPSC 221 102", current_registered_section="CPSC 221 101")
+        self.watch(course)
+        self.server.set_responses(courses_manager.COURSE_SWITCH_URL, Response(body="switch"))
+        self.server.set_responses(courses_manager.COURSE_SWITCH_CONFIRM_URL, Response(body="switched"))
+
+        self.pipeline.publish(course, "General Seats", time.time())
+
+        self.wait_for_completed(1)
+        self.assertEqual(self.server.requests, [courses_manager.COURSE_SWITCH_URL,
+                                                courses_manager.COURSE_SWITCH_CONFIRM_URL])
+
+    def test_higher_priority_goes_first(self):
+        blocking_course = Course("MATH 200 101")
+        low_course = Course("CPSC 221 101", priority=0)
+        high_course = Course("CPSC 221 102", priority=1)
+        self.watch(blocking_course, low_course, high_course)
+        self.server.set_responses(blocking_course.registration_url, Response(body="registered", delay=0.3))
+
+        self.pipeline.publish(blocking_course, "General Seats", time.time())
+        time.sleep(0.1)
+        self.pipeline.publish(low_course, "General Seats", time.time())
+        self.pipeline.publish(high_course, "General Seats", time.time())
+        self.wait_for_completed(3)
+
+        self.assertEqual(self.server.requests, [blocking_course.registration_url, high_course.registration_url,
+                                                low_course.registration_url])
+
+    def test_detection_to_enroll_latency(self):
+        group = SectionGroup(["CPSC 221 L{0}".format(index) for index in range(6)])
+        self.watch(*group.courses)
+        latencies = []
+
+        for index in range(20):
+            course = group.courses[index % len(group.courses)]
+            detected_at = time.time()
+            self.pipeline.publish(course, "General Seats", detected_at)
+            self.wait_for_notifications(index + 1)
+            latencies.append(self.dispatcher.notifications[-1][0] - detected_at)
+            # the next simulated opening races a fresh group
+            self.wait_for_completed(len(group.courses))
+            self.pipeline = actions.ActionPipeline("user", "password", self.dispatcher, "user@example.com",
+                                                   account=self.account)
+            self.watch(*group.courses)
+
+        self.assertLess(sorted(latencies)[len(latencies) // 2], 0.1)
+
+    def test_burst_of_openings(self):
+        courses = [Course("CPSC 221 {0:03d}".format(index)) for index in range(100)]
+        self.watch(*courses)
+        for course in courses:
+            self.server.set_responses(course.course_url, Response(body=seat_page(5, 155, 4, 1)))
+            # slow enough that the burst keeps the action thread busy for about a second
+            self.server.set_responses(course.registration_url, Response(body="registered", delay=0.01))
+        poller = scheduler.Poller(8, batch_section_checks=False)
+
+        def publish_found_seat(course, seats_info, checked_at):
+            self.pipeline.publish(course, courses_manager.get_availability_status(seats_info), checked_at)
+
+        started_at = time.time()
+        poller.poll(courses, publish_found_seat)
+        # the seats are seen again while their sections are still queued or being registered
+        poll_seconds = []
+        completed_courses = []
+        while len(completed_courses) < len(courses) // 2:
+            poll_started_at = time.time()
+            self.assertEqual(len(poller.poll(courses, publish_found_seat)), len(courses))
+            poll_seconds.append(time.time() - poll_started_at)
+            completed_courses.extend(self.pipeline.get_completed())
+        completed_courses.extend(self.wait_for_completed(len(courses) - len(completed_courses), timeout=10))
+        burst_seconds = time.time() - started_at
+
+        # the checks went on while the action thread worked through the burst
+        self.assertGreater(len(poll_seconds), 1)
+        self.assertLess(max(poll_seconds), 0.5)
+        self.assertEqual(sorted(course.name for course in completed_courses), [course.name for course in courses])
+        self.assertEqual(self.count_registrations(courses), [1] * len(courses))
+        # the registrations themselves take a second, the rest is overhead of the pipeline
+        self.assertLess(burst_seconds, 3)
+        self.assertEqual(len(courses_manager.get_courses_watch_list(self.account)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
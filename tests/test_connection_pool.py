@@ -0,0 +1,187 @@
+import socket
+import threading
+import time
+import unittest
+import urllib
+import urllib2
+from support import Response, StubServer, get_stub_ssl_context
+from connection_pool import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+import metrics
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        self.url = self.server.base_url + "/cs/main?req=5&dept=CPSC&course=221&section=101"
+        self.server.set_responses(self.url, Response(body="page"))
+        self.pool = ConnectionPool(2)
+        self.opener = urllib2.build_opener(KeepAliveHTTPHandler(self.pool))
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+
+    def request(self, data=None, timeout=2):
+        response = self.opener.open(self.url, data, timeout=timeout)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_sequential_requests_share_a_connection(self):
+        for _ in range(10):
+            self.assertEqual(self.request(), "page")
+
+        self.assertEqual(self.pool.get_stats(), {"requests sent": 10, "connections opened": 1, "bytes read": 40})
+
+    def test_idle_connections_are_capped(self):
+        responses = [self.opener.open(self.url, timeout=2) for _ in range(4)]
+        for response in responses:
+            response.read()
+            response.close()
+
+        self.assertEqual(self.pool.connections_opened, 4)
+        self.assertEqual(len(self.pool._idle[('http', self.server.base_url[len("http://"):])]), 2)
+
+        # the requests running at the same time afterwards reuse the 2 idle connections
+        threads = [threading.Thread(target=self.request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.pool.connections_opened, 4)
+
+    def test_connection_closed_by_the_server_is_not_reused(self):
+        self.server.set_responses(self.url, Response(body="page", headers={'Connection': 'close'}),
+                                  Response(body="page"))
+
+        self.request()
+        self.request()
+
+        self.assertEqual(self.pool.connections_opened, 2)
+
+    def test_stale_connection_is_replaced(self):
+        self.request()
+        idle_connection = self.pool._idle.values()[0][0]
+        # the server side dropping an idle connection looks the same to the client
+        idle_connection.sock.shutdown(socket.SHUT_RDWR)
+
+        self.assertEqual(self.request(), "page")
+        self.assertEqual(self.pool.connections_opened, 2)
+
+    def test_get_on_a_silently_closed_connection_is_sent_again(self):
+        self.server.set_responses(self.url, Response(body="page", close=True), Response(body="page"))
+        self.request()
+        # lets the server close its side before the connection is reused
+        time.sleep(0.05)
+
+        self.assertEqual(self.request(), "page")
+        self.assertEqual(self.server.count_requests(self.url), 2)
+        self.assertEqual(self.pool.connections_opened, 2)
+
+    def test_post_on_a_silently_closed_connection_is_not_sent_again(self):
+        self.server.set_responses(self.url, Response(body="page", close=True), Response(body="registered"))
+        self.request()
+        time.sleep(0.05)
+
+        # the server may have acted on a POST before closing the connection, so it isn't sent twice
+        with self.assertRaises(urllib2.URLError):
+            self.request(urllib.urlencode({'submit': "Register Selected"}))
+        self.assertEqual(self.server.count_requests(self.url), 1)
+
+    def test_timeout_on_a_reused_connection_is_not_retried(self):
+        # the timeout of the pooled connection is the one of the request that opened it
+        self.request(timeout=0.3)
+        self.server.set_responses(self.url, Response(body="page", delay=0.6))
+
+        started_at = time.time()
+        with self.assertRaises(urllib2.URLError) as context:
+            self.request(timeout=0.3)
+
+        self.assertIsInstance(context.exception.reason, socket.timeout)
+        self.assertLess(time.time() - started_at, 0.5)
+        self.assertEqual(self.server.count_requests(self.url), 2)
+
+    def test_unread_body_is_drained_for_reuse(self):
+        self.server.set_responses(self.url, Response(body="x" * 100000))
+
+        response = self.opener.open(self.url, timeout=2)
+        response.read(10)
+        response.close()
+        self.request()
+
+        self.assertEqual(self.pool.connections_opened, 1)
+
+
+class HTTPSConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(tls=True)
+        self.seat_urls = [self.server.base_url + "/cs/main?req=5&dept=CPSC&course=221&section=10{0}".format(index)
+                          for index in range(5)]
+        self.registration_url = self.server.base_url + "/cs/main?submit=register&wldel=CPSC|221|101"
+        for url in self.seat_urls:
+            self.server.set_responses(url, Response(body="page"))
+        self.server.set_responses(self.registration_url, Response(body="registered"))
+        self.pool = ConnectionPool(2, get_stub_ssl_context())
+        self.addCleanup(setattr, metrics, 'registry', metrics.registry)
+        metrics.registry = metrics.MetricsRegistry()
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+
+    def run_rotations(self, opener, rotations):
+        """
+        Checks every seat page and then registers, like a rotation finding a free seat
+
+        :return: the seconds every registration took
+        """
+        register_seconds = []
+        for _ in range(rotations):
+            for url in self.seat_urls:
+                opener.open(url, timeout=2).read()
+            started_at = time.time()
+            response = opener.open(self.registration_url, urllib.urlencode({'submit': "Register Selected"}), timeout=2)
+            self.assertEqual(response.read(), "registered")
+            register_seconds.append(time.time() - started_at)
+        return sorted(register_seconds)
+
+    def test_handshake_once_per_connection(self):
+        opener = urllib2.build_opener(KeepAliveHTTPSHandler(self.pool))
+
+        self.run_rotations(opener, 3)
+
+        self.assertEqual(self.server.connections_accepted, 1)
+        self.assertEqual(self.pool.get_stats()["connections opened"], 1)
+        count, percentiles = metrics.registry.get_percentiles([50])['tls']
+        self.assertEqual(count, 1)
+        self.assertGreater(percentiles[0], 0)
+
+    def test_certificate_is_verified(self):
+        opener = urllib2.build_opener(KeepAliveHTTPSHandler(ConnectionPool(2)))
+
+        with self.assertRaises(urllib2.URLError) as context:
+            opener.open(self.seat_urls[0], timeout=2)
+        self.assertIn("CERTIFICATE_VERIFY_FAILED", str(context.exception.reason))
+
+    def test_pooling_saves_the_handshakes_of_a_registration(self):
+        rotations = 20
+        unpooled_opener = urllib2.build_opener(urllib2.HTTPSHandler(context=get_stub_ssl_context()))
+        unpooled_seconds = self.run_rotations(unpooled_opener, rotations)
+        unpooled_handshakes = self.server.connections_accepted
+
+        pooled_opener = urllib2.build_opener(KeepAliveHTTPSHandler(self.pool))
+        pooled_seconds = self.run_rotations(pooled_opener, rotations)
+        pooled_handshakes = self.server.connections_accepted - unpooled_handshakes
+
+        # 6 handshakes per rotation without the pool, and the one of the first request with it
+        self.assertEqual(unpooled_handshakes, rotations * 6)
+        self.assertEqual(pooled_handshakes, 1)
+        # the percentiles of the time to register with a free seat found; the first pooled registration already
+        # reuses the connection of the seat checks
+        self.assertLess(pooled_seconds[rotations // 2], unpooled_seconds[rotations // 2])
+        self.assertLess(pooled_seconds[-1], unpooled_seconds[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+from support import Response, StubServer, seat_page, section_listing, use_stub_server
+import courses_manager
+import scheduler
+from seat_parser import SeatsInfo
+
+
+class ListingBatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.poller = scheduler.Poller(4, batch_section_checks=True)
+
+        self.courses = [courses_manager.Course("CPSC 221 {0}".format(section)) for section in (101, 102, 103)]
+        self.listing_url = self.courses[0].sections_url
+        for course in self.courses:
+            self.server.set_responses(course.course_url, Response(body=seat_page(4, 156, 3, 1)))
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_full_sections_are_settled_by_the_listing(self):
+        self.server.set_responses(self.listing_url, Response(body=section_listing(
+            [("CPSC 221 101", "Full"), ("CPSC 221 102", ""), ("CPSC 221 103", "Full")])))
+
+        results = dict(self.poller.poll(self.courses))
+
+        self.assertEqual(self.server.count_requests(self.listing_url), 1)
+        self.assertEqual([self.server.count_requests(course.course_url) for course in self.courses], [0, 1, 0])
+        self.assertEqual(results[self.courses[0]], SeatsInfo(0, None, 0, 0))
+        self.assertEqual(results[self.courses[1]], SeatsInfo(4, 156, 3, 1))
+        self.assertEqual(results[self.courses[2]], SeatsInfo(0, None, 0, 0))
+
+    def test_pages_of_settled_sections_are_fetched_now_and_then(self):
+        self.server.set_responses(self.listing_url, Response(body=section_listing(
+            [("CPSC 221 101", "Full"), ("CPSC 221 102", "Full"), ("CPSC 221 103", "Full")])))
+        self.server.set_responses(self.courses[0].course_url, Response(body=seat_page(0, 160, 0, 0)))
+        poller = scheduler.Poller(4, batch_section_checks=True, page_check_interval=0.2)
+
+        first_results = dict(poller.poll(self.courses[:2]))
+        time.sleep(0.25)
+        second_results = dict(poller.poll(self.courses[:2]))
+        third_results = dict(poller.poll(self.courses[:2]))
+
+        self.assertEqual(self.server.count_requests(self.listing_url), 3)
+        self.assertEqual([self.server.count_requests(course.course_url) for course in self.courses[:2]], [1, 1])
+        self.assertEqual(first_results[self.courses[0]], SeatsInfo(0, None, 0, 0))
+        # the page shows the registration count the listing doesn't
+        self.assertEqual(second_results[self.courses[0]], SeatsInfo(0, 160, 0, 0))
+        self.assertEqual(third_results[self.courses[0]], SeatsInfo(0, None, 0, 0))
+
+    def test_every_page_is_fetched_when_the_listing_fails(self):
+        self.server.set_responses(self.listing_url, Response(500, "Internal Server Error"))
+
+        results = dict(self.poller.poll(self.courses))
+
+        self.assertEqual([self.server.count_requests(course.course_url) for course in self.courses], [1, 1, 1])
+        for course in self.courses:
+            self.assertEqual(results[course], SeatsInfo(4, 156, 3, 1))
+
+    def test_a_lone_section_skips_the_listing(self):
+        results = dict(self.poller.poll(self.courses[:1]))
+
+        self.assertEqual(self.server.count_requests(self.listing_url), 0)
+        self.assertEqual(results[self.courses[0]], SeatsInfo(4, 156, 3, 1))
+
+    def test_monitor_only_courses_always_get_their_page(self):
+        self.server.set_responses(self.listing_url, Response(body=section_listing(
+            [("CPSC 221 101", "Full"), ("CPSC 221 102", "Full"), ("CPSC 221 103", "Full")])))
+        monitored_course = courses_manager.Course("CPSC 221 103", monitor_only=True)
+
+        results = dict(self.poller.poll(self.courses[:2] + [monitored_course]))
+
+        self.assertEqual(self.server.count_requests(self.listing_url), 1)
+        self.assertEqual(self.server.count_requests(monitored_course.course_url), 1)
+        self.assertEqual(results[monitored_course], SeatsInfo(4, 156, 3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
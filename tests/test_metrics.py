@@ -0,0 +1,107 @@
+import unittest
+import urllib2
+from support import Response, StubServer, seat_page, use_stub_server
+import bench_metrics
+import courses_manager
+import metrics
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles_are_bucket_bounds(self):
+        histogram = metrics.Histogram()
+        for seconds in [0.0005] * 50 + [0.003] * 45 + [0.1] * 5:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.get_percentile(50), 0.001)
+        self.assertEqual(histogram.get_percentile(95), 0.004)
+        # the max is tighter than the bound of its bucket
+        self.assertEqual(histogram.get_percentile(100), 0.1)
+        self.assertIsNone(metrics.Histogram().get_percentile(50))
+
+    def test_slower_than_every_bucket(self):
+        histogram = metrics.Histogram()
+        histogram.observe(100)
+
+        self.assertEqual(histogram.bucket_counts[-1], 1)
+        self.assertEqual(histogram.get_percentile(50), 100)
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, metrics, 'registry', metrics.registry)
+        metrics.registry = metrics.MetricsRegistry()
+
+    def get_counts(self):
+        return dict((name, count) for name, (count, _) in metrics.registry.get_percentiles([50]).items())
+
+    def test_seat_check_records_every_stage(self):
+        server = StubServer()
+        self.addCleanup(server.shutdown)
+        use_stub_server(server)
+        course = courses_manager.Course("CPSC 221 101")
+        server.set_responses(course.course_url, Response(body=seat_page(4, 156, 3, 1)))
+
+        course.get_seats_info(courses_manager.AccountSession())
+
+        counts = self.get_counts()
+        for name in ('dns', 'connect', 'first byte', 'body', 'parse', 'seat check'):
+            self.assertEqual(counts.get(name), 1, name)
+        self.assertNotIn('tls', counts)
+        self.assertEqual(metrics.registry._counters, {'requests': 1, 'connections opened': 1})
+
+    def test_failed_requests_and_retries_are_counted(self):
+        server = StubServer()
+        self.addCleanup(server.shutdown)
+        use_stub_server(server)
+        course = courses_manager.Course("CPSC 221 101")
+        server.set_responses(course.course_url, Response(503), Response(body=seat_page(4, 156, 3, 1)))
+
+        course.get_seats_info(courses_manager.AccountSession())
+
+        self.assertEqual(metrics.registry._counters['failed requests'], 1)
+        self.assertEqual(metrics.registry._counters['retries'], 1)
+
+    def test_metrics_page(self):
+        metrics.increment('retries', 2)
+        metrics.observe('connect', 0.003)
+        server = metrics.start_metrics_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        metrics_url = "http://127.0.0.1:{0}/metrics".format(server.server_address[1])
+
+        lines = urllib2.urlopen(metrics_url, timeout=2).read().splitlines()
+
+        self.assertIn("ubc_course_bot_retries_total 2", lines)
+        self.assertIn('ubc_course_bot_connect_seconds_bucket{le="0.002"} 0', lines)
+        self.assertIn('ubc_course_bot_connect_seconds_bucket{le="0.004"} 1', lines)
+        self.assertIn('ubc_course_bot_connect_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn("ubc_course_bot_connect_seconds_count 1", lines)
+        with self.assertRaises(urllib2.HTTPError) as context:
+            urllib2.urlopen(metrics_url[:-len("metrics")] + "other", timeout=2)
+        self.assertEqual(context.exception.code, 404)
+
+    def test_port_in_use_is_not_fatal(self):
+        server = metrics.start_metrics_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.assertIsNone(metrics.start_metrics_server(server.server_address[1]))
+
+    def test_summary(self):
+        metrics.increment('retries')
+        for seconds in (0.001, 0.003):
+            metrics.observe('connect', seconds)
+
+        lines = metrics.registry.format_summary().splitlines()
+
+        self.assertEqual(lines[1:], ["  retries: 1",
+                                     "  connect: 2 times, mean 2.0 ms, p50 1.0 ms, p95 3.0 ms, max 3.0 ms"])
+
+    def test_recording_is_cheap_next_to_a_request(self):
+        # a request to the UBC site takes tens of milliseconds, and a check records about 10 metrics
+        for name, microseconds in bench_metrics.measure(10000):
+            self.assertLess(microseconds, 50, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import email
+import smtplib
+import socket
+import threading
+import time
+import unittest
+import support
+from support import Response, StubServer, seat_page, use_stub_server
+import actions
+import courses_manager
+import notifications
+import scheduler
+
+
+class _StubSMTPConnection(object):
+    def __init__(self, host):
+        self.host = host
+        self.is_logged_in = False
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        if self.host.rejects_login:
+            raise smtplib.SMTPAuthenticationError(535, "Username and Password not accepted")
+        self.is_logged_in = True
+
+    def sendmail(self, from_addr, to_addr, text):
+        self.host.sending.set()
+        self.host.gate.wait()
+        with self.host.lock:
+            if self.host.failures:
+                raise self.host.failures.pop(0)
+            self.host.sent.append((to_addr, email.message_from_string(text)))
+
+    def quit(self):
+        pass
+
+
+class _StubSMTPHost(object):
+    """
+    Stands in for smtplib.SMTP and keeps every email sent through the connections it opened. Sends raise the
+    exceptions in failures first, and wait while gate is cleared.
+    """
+    def __init__(self):
+        self.connections = []
+        self.sent = []
+        self.failures = []
+        self.rejects_login = False
+        self.sending = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+
+    def __call__(self, host, port):
+        connection = _StubSMTPConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def get_sent(self):
+        with self.lock:
+            return [(to_addr, message['Subject'], message.get_payload()[0].get_payload())
+                    for to_addr, message in self.sent]
+
+
+class NotificationDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.smtp = _StubSMTPHost()
+        self.addCleanup(setattr, smtplib, 'SMTP', smtplib.SMTP)
+        smtplib.SMTP = self.smtp
+        self.dispatcher = notifications.NotificationDispatcher("smtp.example.com", 587, "bot@example.com", "password",
+                                                               max_attempts=3, retry_delay=0.01)
+
+    def test_notify_does_not_wait_for_the_email(self):
+        self.smtp.gate.clear()
+        self.addCleanup(self.smtp.gate.set)
+
+        started_at = time.time()
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 101")
+        self.assertLess(time.time() - started_at, 0.05)
+        self.assertTrue(self.smtp.sending.wait(1))
+        self.assertEqual(self.smtp.get_sent(), [])
+
+    def test_connection_is_kept_between_emails(self):
+        for index in range(3):
+            self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 10{0}".format(index))
+            self.dispatcher.flush()
+
+        self.assertEqual([subject for _, subject, _ in self.smtp.get_sent()],
+                         ["CPSC 221 100", "CPSC 221 101", "CPSC 221 102"])
+        self.assertEqual(len(self.smtp.connections), 1)
+
+    def test_notifications_queued_while_sending_are_combined(self):
+        self.smtp.gate.clear()
+        self.dispatcher.notify("user@example.com", "Seat found in CPSC 221 101", "CPSC 221 101")
+        self.assertTrue(self.smtp.sending.wait(1))
+        for section in ("L1A", "L1B"):
+            self.dispatcher.notify("user@example.com", "Seat found in CPSC 221 " + section, "CPSC 221 " + section)
+        self.dispatcher.notify("other@example.com", "Seat found in CPSC 110 101", "CPSC 110 101")
+        self.smtp.gate.set()
+        self.dispatcher.flush()
+
+        self.assertEqual(self.smtp.get_sent(), [
+            ("user@example.com", "CPSC 221 101", "Seat found in CPSC 221 101"),
+            ("user@example.com", "UBC Course Bot: 2 updates",
+             "Seat found in CPSC 221 L1A\n\nSeat found in CPSC 221 L1B"),
+            ("other@example.com", "CPSC 110 101", "Seat found in CPSC 110 101")])
+
+    def test_dropped_connection_is_reopened(self):
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 101")
+        self.dispatcher.flush()
+        self.smtp.failures.append(smtplib.SMTPServerDisconnected("Connection unexpectedly closed"))
+
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 102")
+        self.dispatcher.flush()
+
+        self.assertEqual(len(self.smtp.get_sent()), 2)
+        self.assertEqual(len(self.smtp.connections), 2)
+
+    def test_failed_sends_are_retried(self):
+        self.smtp.failures.extend([smtplib.SMTPDataError(451, "Try again later"), socket.error("reset")])
+
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 101")
+        self.dispatcher.flush()
+
+        self.assertEqual(len(self.smtp.get_sent()), 1)
+        # every failure closes the connection, in case it's the connection that is broken
+        self.assertEqual(len(self.smtp.connections), 3)
+
+    def test_email_is_dropped_after_max_attempts(self):
+        self.smtp.failures.extend([smtplib.SMTPDataError(451, "Try again later")] * 3)
+
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 101")
+        self.dispatcher.flush()
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 102")
+        self.dispatcher.flush()
+
+        self.assertEqual([subject for _, subject, _ in self.smtp.get_sent()], ["CPSC 221 102"])
+
+    def test_rejected_login_is_not_retried(self):
+        self.smtp.rejects_login = True
+
+        self.dispatcher.notify("user@example.com", "Seat found", "CPSC 221 101")
+        self.dispatcher.flush()
+
+        self.assertEqual(self.smtp.get_sent(), [])
+        self.assertEqual(len(self.smtp.connections), 1)
+
+
+class PollWhileEmailIsStuckTest(unittest.TestCase):
+    def setUp(self):
+        self.smtp = _StubSMTPHost()
+        self.addCleanup(setattr, smtplib, 'SMTP', smtplib.SMTP)
+        smtplib.SMTP = self.smtp
+        self.server = StubServer()
+        self.addCleanup(self.server.shutdown)
+        use_stub_server(self.server)
+        self.account = courses_manager.AccountSession()
+        # registrations go out without logging in first
+        self.account.session_state.mark_valid()
+        self.courses = [courses_manager.Course("CPSC 221 1{0:02d}".format(index)) for index in range(20)]
+        for course in self.courses:
+            courses_manager.add_course_to_watch(course, self.account)
+            self.server.set_responses(course.course_url, Response(body=seat_page(5, 155, 4, 1)))
+            self.server.set_responses(course.registration_url, Response(body="registered"))
+        self.dispatcher = notifications.NotificationDispatcher("smtp.example.com", 587, "bot@example.com",
+                                                               "password", max_attempts=3, retry_delay=0.01)
+        self.pipeline = actions.ActionPipeline("user", "password", self.dispatcher, "user@example.com",
+                                               account=self.account)
+        self.poller = scheduler.Poller(8, batch_section_checks=False)
+
+    def publish_found_seat(self, course, seats_info, checked_at):
+        # like main.publish_found_seat
+        self.pipeline.publish(course, courses_manager.get_availability_status(seats_info), checked_at)
+
+    def time_polls(self, count, on_checked=None):
+        """
+        :return: the median seconds a poll of every course took
+        """
+        seconds = []
+        for _ in range(count):
+            started_at = time.time()
+            results = self.poller.poll(self.courses, on_checked)
+            seconds.append(time.time() - started_at)
+            self.assertEqual([seats_info is not None for _, seats_info in results], [True] * len(self.courses))
+        return sorted(seconds)[count // 2]
+
+    def test_polling_keeps_its_pace_while_the_email_host_is_stuck(self):
+        baseline_seconds = self.time_polls(5)
+        self.smtp.gate.clear()
+        self.addCleanup(self.smtp.gate.set)
+
+        # every course has a seat, the first email of the registrations gets stuck in the email host
+        self.poller.poll(self.courses, self.publish_found_seat)
+        self.assertTrue(self.smtp.sending.wait(5))
+        stuck_seconds = self.time_polls(5, self.publish_found_seat)
+
+        self.assertLess(stuck_seconds, 2 * baseline_seconds + 0.05)
+        # the registrations don't wait on the emails either
+        completed_courses = []
+        deadline = time.time() + 5
+        while len(completed_courses) < len(self.courses):
+            self.assertLess(time.time(), deadline, "timed out")
+            self.pipeline.completed_event.wait(0.1)
+            completed_courses.extend(self.pipeline.get_completed())
+        self.assertEqual(self.smtp.get_sent(), [])
+
+        self.smtp.gate.set()
+        self.dispatcher.flush()
+        self.assertGreater(len(self.smtp.get_sent()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
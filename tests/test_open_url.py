@@ -0,0 +1,95 @@
+import ssl
+import unittest
+from support import Response, StubServer, use_stub_server
+import CONFIGS
+import courses_manager
+from retry_policy import CircuitBreakers
+
+
+class _FailingOpener(object):
+    def open(self, request, timeout=None):
+        raise ssl.CertificateError("hostname doesn't match")
+
+
+class OpenUrlTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.url = self.server.base_url + "/cs/main?req=5&dept=CPSC&course=221&section=101"
+        self.healthy_url = self.server.base_url + "/cs/main?req=5&dept=CPSC&course=221&section=102"
+        self.server.set_responses(self.healthy_url, Response(body="healthy"))
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def request(self, url=None):
+        response = courses_manager._URL_request_helper(url or self.url, ["read"])
+        return response["read"] if response is not None else None
+
+    def test_5xx_burst_is_retried(self):
+        self.server.set_responses(self.url, Response(503), Response(502), Response(body="seats"))
+
+        self.assertEqual(self.request(), "seats")
+        self.assertEqual(self.server.count_requests(self.url), 3)
+
+    def test_timeout_is_retried(self):
+        self.server.set_responses(self.url, Response(body="late", delay=CONFIGS.REQUEST_TIMEOUT + 0.3),
+                                  Response(body="seats"))
+
+        self.assertEqual(self.request(), "seats")
+        self.assertEqual(self.server.count_requests(self.url), 2)
+
+    def test_connection_reset_is_retried(self):
+        self.server.set_responses(self.url, Response(reset=True), Response(reset=True), Response(body="seats"))
+
+        self.assertEqual(self.request(), "seats")
+        self.assertEqual(self.server.count_requests(self.url), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.set_responses(self.url, Response(404), Response(body="seats"))
+
+        self.assertIsNone(self.request())
+        self.assertEqual(self.server.count_requests(self.url), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        courses_manager.circuit_breakers = CircuitBreakers(failure_threshold=100)
+        self.server.set_responses(self.url, Response(503))
+
+        self.assertIsNone(self.request())
+        self.assertEqual(self.server.count_requests(self.url), CONFIGS.MAX_REQUEST_ATTEMPTS)
+
+    def test_circuit_opens_without_holding_up_other_endpoints(self):
+        self.server.set_responses(self.url, Response(503))
+
+        self.assertIsNone(self.request())
+        self.assertEqual(self.server.count_requests(self.url), CONFIGS.CIRCUIT_FAILURE_THRESHOLD)
+
+        # skipped right away while open
+        self.assertIsNone(self.request())
+        self.assertEqual(self.server.count_requests(self.url), CONFIGS.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertEqual(self.request(self.healthy_url), "healthy")
+
+    def test_trial_request_closes_the_circuit(self):
+        courses_manager.circuit_breakers = CircuitBreakers(failure_threshold=1, cooldown=0)
+        breaker = courses_manager.circuit_breakers.get(self.url)
+        breaker.record_failure()
+        self.server.set_responses(self.url, Response(body="seats"))
+
+        self.assertEqual(self.request(), "seats")
+        self.assertTrue(breaker.allow_request())
+        self.assertTrue(breaker.allow_request())
+
+    def test_unexpected_error_ends_the_trial_request(self):
+        courses_manager.circuit_breakers = CircuitBreakers(failure_threshold=1, cooldown=0)
+        breaker = courses_manager.circuit_breakers.get(self.url)
+        breaker.record_failure()
+        account = courses_manager.AccountSession()
+        account.opener = _FailingOpener()
+
+        self.assertRaises(ssl.CertificateError, courses_manager._open_url, self.url, account=account)
+        # the circuit let the trial through and is open again, ready for the next trial
+        self.assertTrue(breaker.allow_request())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import multiprocessing
+import unittest
+from support import Response, StubServer, section_listing, use_stub_server
+import bench_parsing
+import CONFIGS
+import courses_manager
+
+
+class _CountingPool(object):
+    """
+    Wraps a parsing pool to count the tables handed to it
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self.applied = 0
+
+    def apply(self, function, args):
+        self.applied += 1
+        return self.pool.apply(function, args)
+
+
+class ParsingPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = multiprocessing.Pool(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.terminate()
+        cls.pool.join()
+
+    def setUp(self):
+        self.addCleanup(setattr, courses_manager, 'parsing_pool', courses_manager.parsing_pool)
+        courses_manager.parsing_pool = self.counting_pool = _CountingPool(self.pool)
+        # a little over the minimum, so the benchmark table is parsed in the pool
+        self.section_count = CONFIGS.PROCESS_PARSE_MIN_BYTES // len(bench_parsing.build_section_table(1)) + 1
+        self.large_table = bench_parsing.build_section_table(self.section_count)
+
+    def test_large_table_is_parsed_in_the_pool(self):
+        section_rows = courses_manager.parse_section_rows(self.large_table)
+
+        self.assertEqual(self.counting_pool.applied, 1)
+        self.assertEqual(section_rows, courses_manager._parse_section_rows(self.large_table))
+        self.assertEqual(len(section_rows), self.section_count)
+        self.assertEqual(section_rows[:2], [("CPSC 221 000", ""), ("CPSC 221 001", "Full")])
+
+    def test_small_table_is_parsed_here(self):
+        small_table = bench_parsing.build_section_table(10)
+
+        self.assertEqual(courses_manager.parse_section_rows(small_table),
+                         courses_manager._parse_section_rows(small_table))
+        self.assertEqual(self.counting_pool.applied, 0)
+
+    def test_failed_pool_falls_back_to_parsing_here(self):
+        broken_pool = multiprocessing.Pool(1)
+        broken_pool.terminate()
+        broken_pool.join()
+        courses_manager.parsing_pool = broken_pool
+
+        self.assertEqual(len(courses_manager.parse_section_rows(self.large_table)), self.section_count)
+
+    def test_listing_parsed_in_the_pool(self):
+        server = StubServer()
+        self.addCleanup(server.shutdown)
+        use_stub_server(server)
+        # about twice the minimum, since the rows of sections that aren't full are a little shorter
+        row_bytes = len(section_listing([("CPSC 221 0000", "Full")])) - len(section_listing([]))
+        section_statuses = [("CPSC 221 {0:04d}".format(index), "Full" if index % 3 else "")
+                            for index in range(2 * CONFIGS.PROCESS_PARSE_MIN_BYTES // row_bytes)]
+        listing_html = section_listing(section_statuses)
+        sections_url = courses_manager.Course("CPSC 221 101").sections_url
+        server.set_responses(sections_url, Response(body=listing_html))
+
+        self.assertEqual(courses_manager.get_section_statuses(sections_url), dict(section_statuses))
+        self.assertEqual(self.counting_pool.applied, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import time
+import unittest
+from support import Response, StubServer, seat_page, section_listing, use_stub_server
+import courses_manager
+import scheduler
+from seat_parser import SeatsInfo
+
+# seconds the stub takes to answer a section page
+PAGE_DELAY = 0.2
+
+
+class PollerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.poller = scheduler.Poller(32, batch_section_checks=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def watch_courses(self, course_count, seats_info=(5, 40, 3, 2)):
+        courses = [courses_manager.Course("CPSC {0} 101".format(100 + index)) for index in range(course_count)]
+        for course in courses:
+            self.server.set_responses(course.course_url, Response(body=seat_page(*seats_info), delay=PAGE_DELAY))
+        return courses
+
+    def test_rotation_latency_stays_flat(self):
+        rotation_times = []
+        for course_count in (4, 16, 32):
+            courses = self.watch_courses(course_count)
+            started_at = time.time()
+            self.poller.poll(courses)
+            rotation_times.append(time.time() - started_at)
+
+        # one course at a time, 4 courses would already take 4 page delays
+        for rotation_time in rotation_times:
+            self.assertLess(rotation_time, 3 * PAGE_DELAY)
+
+    def test_results_keep_the_order_of_the_courses(self):
+        courses = self.watch_courses(8)
+        missing_course = courses_manager.Course("CPSC 999 101")
+        courses.insert(3, missing_course)
+
+        results = self.poller.poll(courses)
+
+        self.assertEqual([course for course, _ in results], courses)
+        for course, seats_info in results:
+            if course is missing_course:
+                self.assertIsNone(seats_info)
+            else:
+                self.assertEqual(seats_info, SeatsInfo(5, 40, 3, 2))
+
+    def test_poll_records_the_result_on_the_course(self):
+        course = self.watch_courses(1)[0]
+
+        self.poller.poll([course])
+        self.assertTrue(course.seats_changed)
+        self.poller.poll([course])
+
+        self.assertEqual(course.last_seats_info, SeatsInfo(5, 40, 3, 2))
+        self.assertFalse(course.seats_changed)
+
+    def test_each_check_is_handed_over_as_it_finishes(self):
+        fast_course, slow_course = self.watch_courses(2)
+        self.server.set_responses(slow_course.course_url, Response(body=seat_page(0, 40, 0, 0), delay=5 * PAGE_DELAY))
+        checked = []
+        started_at = time.time()
+
+        self.poller.poll([slow_course, fast_course],
+                         lambda course, seats_info, checked_at: checked.append((course, time.time() - started_at)))
+
+        self.assertEqual([course for course, _ in checked], [fast_course, slow_course])
+        self.assertLess(checked[0][1], 2 * PAGE_DELAY)
+
+    def test_listing_results_are_handed_over_before_the_pages(self):
+        listed_courses = [courses_manager.Course("CPSC 221 {0}".format(section)) for section in (101, 102)]
+        self.server.set_responses(listed_courses[0].sections_url, Response(body=section_listing(
+            [("CPSC 221 101", "Full"), ("CPSC 221 102", "")])))
+        self.server.set_responses(listed_courses[1].course_url, Response(body=seat_page(4, 156, 3, 1),
+                                                                         delay=PAGE_DELAY))
+        checked = []
+
+        scheduler.Poller(4, batch_section_checks=True).poll(
+            listed_courses, lambda course, seats_info, checked_at: checked.append((course, seats_info)))
+
+        self.assertEqual(checked, [(listed_courses[0], SeatsInfo(0, None, 0, 0)),
+                                   (listed_courses[1], SeatsInfo(4, 156, 3, 1))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import time
+import unittest
+from support import Response, StubServer, seat_page, use_stub_server
+import courses_manager
+import scheduler
+from rate_limiter import AdaptiveRateLimiter, AdaptiveTokenBucket, TokenBucket
+
+# pages per second the throttling stub answers before it starts answering 429
+SERVER_LIMIT = 20
+
+
+class _ThrottlingHandler(object):
+    """
+    Answers with a seat page while fewer than SERVER_LIMIT pages were answered over the last second, with 429 otherwise
+    """
+    def __init__(self):
+        self.answers = []
+
+    def __call__(self):
+        now = time.time()
+        recent_pages = [answered_at for answered_at, status in self.answers
+                        if answered_at > now - 1 and status == 200]
+        status = 429 if len(recent_pages) >= SERVER_LIMIT else 200
+        self.answers.append((now, status))
+        return Response(status, seat_page(3, 40, 3, 0) if status == 200 else "Too Many Requests")
+
+    def get_throttled_ratio(self, start, end):
+        statuses = [status for answered_at, status in self.answers if start <= answered_at < end]
+        return statuses.count(429) / float(len(statuses))
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_rate_is_kept_after_the_burst(self):
+        bucket = TokenBucket(50)
+        started_at = time.time()
+        for _ in range(100):
+            bucket.acquire()
+
+        # the first 50 are the burst, the next 50 take a second
+        self.assertGreater(time.time() - started_at, 0.9)
+
+    def test_adaptive_rate_backs_off_once_per_burst_of_trouble(self):
+        bucket = AdaptiveTokenBucket(max_rate=10, min_rate=1, increase=1)
+        for _ in range(5):
+            bucket.record_throttled()
+        self.assertEqual(bucket.rate, 5)
+
+        for _ in range(50):
+            bucket.record_success()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_adaptive_rate_stops_at_the_min_rate(self):
+        bucket = AdaptiveTokenBucket(max_rate=10, min_rate=4, increase=1)
+        bucket.record_throttled()
+        bucket._last_decrease = 0
+        bucket.record_throttled()
+
+        self.assertEqual(bucket.rate, 4)
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_signs_of_trouble(self):
+        rate_limiter = AdaptiveRateLimiter(10, 1, 1, 2, 10)
+        url = self.server.base_url + "/cs/main"
+        for status, latency, is_blocked in [(200, 0.1, False), (404, 0.1, False)]:
+            rate_limiter.record_response(url, latency, status, is_blocked)
+        self.assertEqual(rate_limiter.get_rates().values(), [10])
+
+        for status, latency, is_blocked in [(429, 0.1, False), (503, 0.1, False), (None, 0.1, False),
+                                            (200, 3, False), (200, 0.1, True)]:
+            rate_limiter = AdaptiveRateLimiter(10, 1, 1, 2, 10)
+            rate_limiter.record_response(url, latency, status, is_blocked)
+            self.assertEqual(rate_limiter.get_rates().values(), [5])
+
+    def test_actions_are_not_held_up_by_checks(self):
+        rate_limiter = AdaptiveRateLimiter(1, 1, 1, 2, 10)
+        url = self.server.base_url + "/cs/main"
+        rate_limiter.acquire(url)
+
+        started_at = time.time()
+        for _ in range(5):
+            rate_limiter.acquire(url, is_action=True)
+        self.assertLess(time.time() - started_at, 0.1)
+
+    def test_check_rate_settles_under_the_server_limit(self):
+        courses_manager.rate_limiter = AdaptiveRateLimiter(5 * SERVER_LIMIT, 1, 5, 1, 5 * SERVER_LIMIT)
+        courses = [courses_manager.Course("CPSC {0} 101".format(100 + index)) for index in range(10)]
+        handler = _ThrottlingHandler()
+        for course in courses:
+            self.server.set_handler(course.course_url, handler)
+        poller = scheduler.Poller(8, batch_section_checks=False)
+
+        started_at = time.time()
+        while time.time() - started_at < 4:
+            poller.poll(courses)
+
+        # the server is flooded at first and then the rate backs off to what it tolerates
+        self.assertGreater(handler.get_throttled_ratio(started_at, started_at + 1), 0.3)
+        self.assertLess(handler.get_throttled_ratio(started_at + 2, started_at + 4), 0.25)
+        self.assertLess(courses_manager.rate_limiter.get_rates().values()[0], 2 * SERVER_LIMIT)
+
+
+if __name__ == '__main__':
+    unittest.main()
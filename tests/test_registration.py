@@ -0,0 +1,126 @@
+import time
+import unittest
+import urlparse
+from support import Response, StubServer, seat_page, use_stub_server
+import actions
+import courses_manager
+import metrics
+import scheduler
+from courses_manager import Course
+
+
+class _NullDispatcher(object):
+    def notify(self, receiver_address, message, subject):
+        pass
+
+
+class PreparedRequestsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.account = courses_manager.AccountSession()
+        # the actions go out without logging in first
+        self.account.session_state.mark_valid()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def get_form(self, url):
+        return dict(urlparse.parse_qsl(self.server.last_bodies[url]))
+
+    def test_requests_are_built_with_the_course(self):
+        course = Course("CPSC 221 L1B", current_registered_section="CPSC 221 L1A")
+
+        self.assertEqual(course.registration_url, courses_manager.COURSE_REGISTRATION_URL_TEMPLATE.format(
+            "CPSC", "221", "L1B"))
+        self.assertEqual(course.switch_form_data, courses_manager.build_switch_form_data("CPSC 221 L1A",
+                                                                                         "CPSC 221 L1B"))
+        self.assertIsNone(Course("CPSC 221 L1B").switch_form_data)
+
+    def test_registration_sends_the_prepared_url(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.registration_url, Response(body="registered"))
+
+        self.assertTrue(course.register_course("user", "password", account=self.account))
+        self.assertEqual(self.server.requests, [course.registration_url])
+
+    def test_failed_registration(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.registration_url, Response(403, "Forbidden"))
+
+        self.assertFalse(course.register_course("user", "password", account=self.account))
+
+    def test_switch_sends_the_prepared_forms_in_order(self):
+        course = Course("CPSC 221 L1B", current_registered_section="CPSC 221 L1A")
+        self.server.set_responses(courses_manager.COURSE_SWITCH_URL, Response(body="switch selected"))
+        self.server.set_responses(courses_manager.COURSE_SWITCH_CONFIRM_URL, Response(body="switched"))
+        connections_opened_before = courses_manager.http_pool.get_stats()["connections opened"]
+
+        self.assertTrue(course.switch_section("user", "password", account=self.account))
+
+        self.assertEqual(self.server.requests, [courses_manager.COURSE_SWITCH_URL,
+                                                courses_manager.COURSE_SWITCH_CONFIRM_URL])
+        self.assertEqual(self.get_form(courses_manager.COURSE_SWITCH_URL)['wldel'], "CPSC|221|L1A")
+        final_form = self.get_form(courses_manager.COURSE_SWITCH_CONFIRM_URL)
+        self.assertEqual((final_form['switchFromKey'], final_form['wldel']), ("CPSC|221|L1A", "CPSC|221|L1B"))
+        # the final request goes out on the connection of the first one
+        self.assertEqual(courses_manager.http_pool.get_stats()["connections opened"] - connections_opened_before, 1)
+
+    def test_switch_stops_when_the_first_request_fails(self):
+        course = Course("CPSC 221 L1B", current_registered_section="CPSC 221 L1A")
+        self.server.set_responses(courses_manager.COURSE_SWITCH_URL, Response(503, "Service Unavailable"))
+
+        self.assertFalse(course.switch_section("user", "password", account=self.account))
+        self.assertNotIn(courses_manager.COURSE_SWITCH_CONFIRM_URL, self.server.requests)
+
+
+class DetectionToRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        self.addCleanup(self.server.shutdown)
+        use_stub_server(self.server)
+        self.addCleanup(setattr, metrics, 'registry', metrics.registry)
+        metrics.registry = metrics.MetricsRegistry()
+        self.account = courses_manager.AccountSession()
+        # the actions go out without logging in first
+        self.account.session_state.mark_valid()
+        self.pipeline = actions.ActionPipeline("user", "password", _NullDispatcher(), "user@example.com",
+                                               account=self.account)
+        self.poller = scheduler.Poller(4, batch_section_checks=False)
+
+    def test_detection_to_request(self):
+        detected_at = {}
+        received_at = {}
+
+        def publish_found_seat(course, seats_info, checked_at):
+            detected_at[course.name] = checked_at
+            self.pipeline.publish(course, courses_manager.get_availability_status(seats_info), checked_at)
+
+        def answer_registration(course):
+            received_at[course.name] = time.time()
+            return Response(body="registered")
+
+        # one opening at a time, each of a section that is checked along with 3 full ones
+        for index in range(20):
+            courses = [Course("CPSC 221 {0}{1:02d}".format(row, index)) for row in range(1, 5)]
+            for course in courses:
+                courses_manager.add_course_to_watch(course, self.account)
+                self.server.set_responses(course.course_url, Response(body=seat_page(0, 160, 0, 0)))
+            self.server.set_responses(courses[0].course_url, Response(body=seat_page(1, 159, 1, 0)))
+            self.server.set_handler(courses[0].registration_url, lambda course=courses[0]: answer_registration(course))
+            self.poller.poll(courses, publish_found_seat)
+            self.assertTrue(self.pipeline.completed_event.wait(5))
+            self.assertEqual(self.pipeline.get_completed(), courses[:1])
+
+        count, (p50_seconds, p99_seconds) = metrics.registry.get_percentiles([50, 99])['detection to request']
+        self.assertEqual(count, 20)
+        # the metric is taken right before the prepared request is sent, the stub server sees it a little later
+        self.assertLessEqual(p50_seconds, 0.002)
+        self.assertLessEqual(p99_seconds, 0.016)
+        arrival_seconds = sorted(received_at[name] - detected_at[name] for name in received_at)
+        self.assertEqual(len(arrival_seconds), 20)
+        self.assertLess(arrival_seconds[len(arrival_seconds) // 2], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from support import SOURCE_DIR, Response, StubServer, seat_page, use_site_urls, use_stub_server
+import courses_manager
+from courses_manager import Course
+from replay import ExchangeRecorder, ReplayHandler
+from seat_parser import SeatsInfo
+
+FIXTURE_PATH = os.path.join(SOURCE_DIR, 'fixtures', 'ubc_session.jsonl')
+
+
+class RecordAndReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='replay')
+        self.path = os.path.join(self.directory, 'exchanges.jsonl')
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.addCleanup(setattr, courses_manager, 'exchange_recorder', courses_manager.exchange_recorder)
+        self.addCleanup(setattr, courses_manager, 'replay_handler', courses_manager.replay_handler)
+
+    def tearDown(self):
+        self.server.shutdown()
+        shutil.rmtree(self.directory)
+
+    def record(self, record_exchanges):
+        """
+        Runs record_exchanges with a new account whose exchanges with the stub server are recorded to self.path
+        """
+        recorder = courses_manager.exchange_recorder = ExchangeRecorder(self.path)
+        try:
+            record_exchanges(courses_manager.AccountSession())
+        finally:
+            courses_manager.exchange_recorder = None
+            recorder.close()
+
+    def replay(self, latency=0):
+        """
+        :return: a new account whose requests are answered from self.path, with the stub server shut down
+        """
+        self.server.shutdown()
+        courses_manager.replay_handler = ReplayHandler(self.path, latency)
+        return courses_manager.AccountSession()
+
+    def read_exchanges(self):
+        with open(self.path) as fixture_file:
+            return [json.loads(line) for line in fixture_file]
+
+    def test_recorded_checks_and_actions_are_replayed(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.course_url, Response(body=seat_page(4, 156, 3, 1)))
+        self.server.set_responses(course.registration_url, Response(body="registered"))
+
+        def record_exchanges(account):
+            self.assertEqual(course.get_seats_info(account), SeatsInfo(4, 156, 3, 1))
+            account.session_state.mark_valid()
+            self.assertTrue(course.register_course("user", "password", account=account))
+        self.record(record_exchanges)
+        account = self.replay()
+
+        self.assertEqual(course.get_seats_info(account), SeatsInfo(4, 156, 3, 1))
+        account.session_state.mark_valid()
+        self.assertTrue(course.register_course("user", "password", account=account))
+        self.assertEqual(courses_manager.replay_handler.replayed, 2)
+
+    def test_request_bodies_are_not_recorded(self):
+        self.server.set_responses(courses_manager.CAS_LOGIN_URL, Response(body="logged in"))
+
+        self.record(lambda account: courses_manager._URL_request_helper(
+            courses_manager.CAS_LOGIN_URL, [], {'username': "user", 'password': "secret password"}, account=account))
+
+        with open(self.path) as fixture_file:
+            self.assertNotIn("secret", fixture_file.read())
+        self.assertEqual([(exchange['method'], exchange['url'], exchange['status'])
+                          for exchange in self.read_exchanges()], [("POST", courses_manager.CAS_LOGIN_URL, 200)])
+
+    def test_responses_are_replayed_in_order_and_the_last_one_repeats(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.course_url, Response(body=seat_page(0, 160, 0, 0)),
+                                  Response(body=seat_page(1, 159, 1, 0)))
+
+        def record_exchanges(account):
+            for _ in range(2):
+                course.get_seats_info(account)
+        self.record(record_exchanges)
+        account = self.replay()
+
+        self.assertEqual([course.get_seats_info(account) for _ in range(3)],
+                         [SeatsInfo(0, 160, 0, 0), SeatsInfo(1, 159, 1, 0), SeatsInfo(1, 159, 1, 0)])
+
+    def test_error_responses_are_replayed(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.course_url, Response(404, "Not Found"))
+
+        self.record(course.get_seats_info)
+        account = self.replay()
+
+        self.assertIsNone(course.get_seats_info(account))
+        self.assertEqual(self.read_exchanges()[0]['status'], 404)
+
+    def test_unrecorded_request_fails_without_the_network(self):
+        self.record(lambda account: None)
+        account = self.replay()
+
+        self.assertIsNone(Course("CPSC 221 101").get_seats_info(account))
+        self.assertEqual(courses_manager.replay_handler.replayed, 0)
+
+    def test_latency_is_injected(self):
+        course = Course("CPSC 221 101")
+        self.server.set_responses(course.course_url, Response(body=seat_page(4, 156, 3, 1)))
+        self.record(course.get_seats_info)
+        account = self.replay(latency=0.1)
+
+        started_at = time.time()
+        course.get_seats_info(account)
+        self.assertGreaterEqual(time.time() - started_at, 0.1)
+
+
+class CheckedInFixtureTest(unittest.TestCase):
+    def setUp(self):
+        use_site_urls()
+        self.addCleanup(setattr, courses_manager, 'replay_handler', courses_manager.replay_handler)
+        courses_manager.replay_handler = ReplayHandler(FIXTURE_PATH)
+        self.account = courses_manager.AccountSession()
+
+    def test_login_check_register_and_switch(self):
+        courses_manager.send_login_request("user", "password", self.account)
+        self.assertTrue(self.account.session_state.is_valid())
+        self.assertTrue(courses_manager.is_logged_in(self.account))
+
+        self.assertEqual(Course("CPSC 221 101").get_seats_info(self.account), SeatsInfo(4, 156, 3, 1))
+        self.assertTrue(Course("CPSC 221 101").register_course("user", "password", account=self.account))
+        self.assertTrue(Course("CPSC 221 102", current_registered_section="CPSC 221 101").switch_section(
+            "user", "password", account=self.account))
+
+
+if __name__ == '__main__':
+    unittest.main()
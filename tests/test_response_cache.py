@@ -0,0 +1,98 @@
+import unittest
+from support import Response, StubServer, seat_page, section_listing, use_site_urls, use_stub_server
+import bench_response_cache
+import courses_manager
+import metrics
+from seat_parser import SeatsInfo
+
+LISTING_HTML = section_listing([("CPSC 221 101", "Full"), ("CPSC 221 102", "")])
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.course = courses_manager.Course("CPSC 221 101")
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_not_modified_page_reuses_the_last_result(self):
+        self.server.set_responses(self.course.course_url,
+                                  Response(body=seat_page(4, 156, 3, 1), headers={'ETag': '"v1"'}),
+                                  Response(304, headers={'ETag': '"v1"'}))
+
+        self.assertEqual(self.course.get_seats_info(), SeatsInfo(4, 156, 3, 1))
+        self.assertNotIn('if-none-match', self.server.last_headers[self.course.course_url])
+        self.assertEqual(self.course.get_seats_info(), SeatsInfo(4, 156, 3, 1))
+
+        self.assertEqual(self.server.last_headers[self.course.course_url]['if-none-match'], '"v1"')
+        self.assertEqual(courses_manager.response_cache.get_stats()['not modified'], 1)
+
+    def test_not_modified_is_not_a_failure(self):
+        self.server.set_responses(self.course.course_url,
+                                  Response(body=seat_page(4, 156, 3, 1), headers={'ETag': '"v1"'}),
+                                  Response(304, headers={'ETag': '"v1"'}))
+        self.course.get_seats_info()
+        for _ in range(5):
+            self.assertEqual(self.course.get_seats_info(), SeatsInfo(4, 156, 3, 1))
+
+        self.assertEqual(self.server.count_requests(self.course.course_url), 6)
+        self.assertTrue(courses_manager.circuit_breakers.get(self.course.course_url).allow_request())
+
+    def test_unchanged_listing_is_not_parsed_again(self):
+        # the page around the section table changes on every request but the sections don't
+        self.server.set_responses(self.course.sections_url,
+                                  Response(body=LISTING_HTML.replace("<html>", "<html><!-- 1 -->")),
+                                  Response(body=LISTING_HTML.replace("<html>", "<html><!-- 2 -->")))
+
+        first_statuses = courses_manager.get_section_statuses(self.course.sections_url)
+        second_statuses = courses_manager.get_section_statuses(self.course.sections_url)
+
+        self.assertEqual(first_statuses, {"CPSC 221 101": "Full", "CPSC 221 102": ""})
+        self.assertIs(second_statuses, first_statuses)
+        self.assertEqual(courses_manager.response_cache.get_stats(), {"not modified": 0, "unchanged": 1, "changed": 1})
+
+    def test_changed_listing_is_parsed_again(self):
+        self.server.set_responses(self.course.sections_url, Response(body=LISTING_HTML),
+                                  Response(body=LISTING_HTML.replace("<td>Full</td>", "<td></td>")))
+
+        courses_manager.get_section_statuses(self.course.sections_url)
+        section_statuses = courses_manager.get_section_statuses(self.course.sections_url)
+
+        self.assertEqual(section_statuses, {"CPSC 221 101": "", "CPSC 221 102": ""})
+        self.assertEqual(courses_manager.response_cache.get_stats()['changed'], 2)
+
+
+class ResponseCacheBenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        # the benchmark answers the urls of the recorded fixture
+        use_site_urls()
+        for name in ('replay_handler', 'default_account', 'response_cache'):
+            self.addCleanup(setattr, courses_manager, name, getattr(courses_manager, name))
+        self.addCleanup(setattr, metrics, 'registry', metrics.registry)
+        self.listing_sequences, self.page_sequences = bench_response_cache.build_sequences(
+            bench_response_cache.FIXTURE_FILE, 20, 10, pad=False)
+
+    def test_etags_only_cost_the_bytes_of_changed_pages(self):
+        page_bytes = sum(len(sequence[0]) for sequences in (self.listing_sequences, self.page_sequences)
+                         for sequence in sequences.values())
+
+        no_cache = bench_response_cache.measure(self.listing_sequences, self.page_sequences, True, False)
+        with_etags = bench_response_cache.measure(self.listing_sequences, self.page_sequences, True, True)
+
+        self.assertAlmostEqual(no_cache[0], page_bytes, delta=page_bytes * 0.1)
+        # every page changes twice in 20 rotations, the rest are answered 304
+        self.assertAlmostEqual(with_etags[0], no_cache[0] / 10, delta=page_bytes * 0.01)
+        self.assertEqual(with_etags[3], {"not modified": 54, "unchanged": 0, "changed": 6})
+
+    def test_without_validators_unchanged_listings_are_not_parsed_again(self):
+        stats = bench_response_cache.measure(self.listing_sequences, self.page_sequences, False, True)[3]
+
+        # the section pages count as unchanged too, but only after they were parsed, since their digest is the seat
+        # counts parsed from them
+        self.assertEqual(stats, {"not modified": 0, "unchanged": 54, "changed": 6})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import random
+import time
+import unittest
+import support
+import courses_manager
+from scheduler import AdaptivePollScheduler
+from seat_parser import SeatsInfo
+import simulate_scheduler
+
+QUIET_INTERVAL = (1200, 1800)
+MIN_INTERVAL = 60
+START = 1000000000.0
+
+
+def run_checks(scheduler, courses, get_seats_info, seconds, start=START):
+    """
+    Checks every course whenever it is due for seconds seconds
+
+    :param get_seats_info: a function taking (course, now) and returning the SeatsInfo the check finds
+    :return: a dictionary mapping every course to the times it was checked at
+    """
+    check_times = dict((course, []) for course in courses)
+    for course in courses:
+        scheduler.add(course, now=start)
+
+    now = start
+    while now < start + seconds:
+        for course in scheduler.pop_due(now):
+            check_times[course].append(now)
+            scheduler.record(course, get_seats_info(course, now), now)
+        now += min(scheduler.time_until_next_check(now), start + seconds - now) or 1
+    return check_times
+
+
+def get_intervals(check_times):
+    return [later - earlier for earlier, later in zip(check_times, check_times[1:])]
+
+
+class AdaptivePollSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.courses = [courses_manager.Course("CPSC {0} 101".format(100 + index)) for index in range(20)]
+
+    def create_scheduler(self, checks_per_hour=10 ** 6, hot_windows=()):
+        return AdaptivePollScheduler(checks_per_hour, MIN_INTERVAL, QUIET_INTERVAL, hot_windows)
+
+    def test_quiet_courses_get_the_quiet_interval(self):
+        check_times = run_checks(self.create_scheduler(), self.courses[:1],
+                                 lambda course, now: SeatsInfo(20, 100, 20, 0), 6 * 60 * 60)
+
+        for interval in get_intervals(check_times[self.courses[0]]):
+            self.assertGreaterEqual(interval, QUIET_INTERVAL[0] * (1 - AdaptivePollScheduler.JITTER))
+            self.assertLessEqual(interval, QUIET_INTERVAL[1] * (1 + AdaptivePollScheduler.JITTER))
+
+    def test_changing_courses_get_the_min_interval(self):
+        check_times = run_checks(self.create_scheduler(), self.courses[:1],
+                                 lambda course, now: SeatsInfo(20, int(now), 20, 0), 60 * 60)
+
+        # a change can only be seen from the second check on, and it takes 2 changes to get the hottest
+        for interval in get_intervals(check_times[self.courses[0]])[2:]:
+            self.assertLessEqual(interval, MIN_INTERVAL * (1 + AdaptivePollScheduler.JITTER))
+
+    def test_hot_courses_cool_down_once_they_stop_changing(self):
+        def get_seats_info(course, now):
+            return SeatsInfo(20, int(now) if now < START + 60 * 60 else 0, 20, 0)
+
+        intervals = get_intervals(run_checks(self.create_scheduler(), self.courses[:1], get_seats_info,
+                                             24 * 60 * 60)[self.courses[0]])
+
+        self.assertLess(intervals[2], 2 * MIN_INTERVAL)
+        self.assertGreater(intervals[-1], QUIET_INTERVAL[0] * 0.8)
+
+    def test_near_full_courses_are_checked_more_often(self):
+        check_times = run_checks(self.create_scheduler(), self.courses[:2],
+                                 lambda course, now: SeatsInfo(1 if course is self.courses[0] else 20, 100, 1, 0),
+                                 12 * 60 * 60)
+
+        self.assertGreater(len(check_times[self.courses[0]]), 2 * len(check_times[self.courses[1]]))
+
+    def test_full_courses_without_changes_get_the_quiet_interval(self):
+        check_times = run_checks(self.create_scheduler(), self.courses[:1],
+                                 lambda course, now: SeatsInfo(0, 100, 0, 0), 6 * 60 * 60)
+
+        for interval in get_intervals(check_times[self.courses[0]]):
+            self.assertGreaterEqual(interval, QUIET_INTERVAL[0] * (1 - AdaptivePollScheduler.JITTER))
+
+    def test_registration_changes_seen_between_listing_checks_heat_up(self):
+        page_checked_at = {}
+
+        def get_seats_info(course, now):
+            # the listing hides the registration count, which a page check sees every 2 hours like with
+            # scheduler.Poller, with listing checks in between; the first course changes hands every hour
+            if now - page_checked_at.setdefault(course, now) < 2 * 60 * 60:
+                return SeatsInfo(0, None, 0, 0)
+            page_checked_at[course] = now
+            return SeatsInfo(0, 100 + int(now - START) // (60 * 60) if course is self.courses[0] else 100, 0, 0)
+
+        check_times = run_checks(self.create_scheduler(), self.courses[:2], get_seats_info, 24 * 60 * 60)
+
+        self.assertGreater(len(check_times[self.courses[0]]), 1.5 * len(check_times[self.courses[1]]))
+
+    def test_add_drop_windows_heat_every_course(self):
+        today = time.strftime('%Y-%m-%d', time.localtime(START))
+        scheduler = self.create_scheduler(hot_windows=[(today, today)])
+        check_times = run_checks(scheduler, self.courses[:1], lambda course, now: SeatsInfo(20, 100, 20, 0), 60 * 60)
+
+        self.assertGreater(len(check_times[self.courses[0]]), 60 * 60 / QUIET_INTERVAL[0] * 4)
+
+    def test_budget_stretches_every_interval(self):
+        checks_per_hour = 120
+        # unstretched, 20 changing courses would take 20 * 60 checks per hour
+        check_times = run_checks(self.create_scheduler(checks_per_hour), self.courses,
+                                 lambda course, now: SeatsInfo(20, int(now), 20, 0), 4 * 60 * 60)
+
+        # the first hour includes the first check of every course
+        checks_in_last_hours = sum(len([check_time for check_time in times if check_time >= START + 60 * 60])
+                                   for times in check_times.values())
+        self.assertLessEqual(checks_in_last_hours / 3.0, checks_per_hour * (1 + AdaptivePollScheduler.JITTER))
+        self.assertGreater(checks_in_last_hours / 3.0, checks_per_hour * 0.8)
+
+        # stretched evenly, so every course still gets its share
+        for times in check_times.values():
+            self.assertGreater(len(times), 3 * checks_per_hour / len(self.courses) * 0.8)
+
+    def test_removed_courses_are_not_due(self):
+        scheduler = self.create_scheduler()
+        scheduler.add(self.courses[0], now=START)
+        scheduler.add(self.courses[1], now=START)
+        scheduler.remove(self.courses[0])
+
+        self.assertEqual(scheduler.pop_due(START), [self.courses[1]])
+        self.assertIsNone(scheduler.time_until_next_check(START))
+
+
+class SimulatorTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.timelines = simulate_scheduler.generate_timelines(10, 12, seed=0)
+
+    def test_openings(self):
+        timeline = [(0, SeatsInfo(0, 50, 0, 0)), (10, SeatsInfo(1, 49, 1, 0)), (20, SeatsInfo(1, 49, 1, 0)),
+                    (30, SeatsInfo(0, 50, 0, 0)), (40, SeatsInfo(2, 48, 2, 0))]
+
+        self.assertEqual(simulate_scheduler.get_openings(timeline), [(10, 30), (40, None)])
+
+    def test_both_schedulers_keep_to_the_budget(self):
+        for scheduler in (simulate_scheduler.UniformPollScheduler(60), AdaptivePollScheduler(60, hot_windows=[])):
+            check_times = simulate_scheduler.simulate(scheduler, self.timelines, 0, 12 * 60 * 60)
+            check_count = sum(len(times) for times in check_times.values())
+            self.assertLessEqual(check_count, 12 * 60 * (1 + AdaptivePollScheduler.JITTER) + len(self.timelines))
+
+    def test_adaptive_catches_openings_sooner_with_the_same_checks(self):
+        timelines = simulate_scheduler.generate_timelines(100, 48, seed=0)
+        end = 48 * 60 * 60
+        adaptive_check_times = simulate_scheduler.simulate(AdaptivePollScheduler(600, hot_windows=[]), timelines, 0,
+                                                           end, page_check_interval=20 * 60)
+        check_count = sum(len(times) for times in adaptive_check_times.values())
+        uniform_check_times = simulate_scheduler.simulate(simulate_scheduler.UniformPollScheduler(check_count / 48.0),
+                                                          timelines, 0, end)
+
+        adaptive_delays, _ = simulate_scheduler.measure_detection(timelines, adaptive_check_times)
+        uniform_delays, _ = simulate_scheduler.measure_detection(timelines, uniform_check_times)
+        self.assertGreaterEqual(len(adaptive_delays), 0.95 * len(uniform_delays))
+        self.assertLess(sum(adaptive_delays) / len(adaptive_delays), 0.9 * sum(uniform_delays) / len(uniform_delays))
+
+    def test_detection_delay(self):
+        timelines = {"CPSC 221 101": [(0, SeatsInfo(0, 50, 0, 0)), (100, SeatsInfo(1, 49, 1, 0)),
+                                      (200, SeatsInfo(0, 50, 0, 0)), (300, SeatsInfo(1, 49, 1, 0)),
+                                      (310, SeatsInfo(0, 50, 0, 0))]}
+
+        delays, missed = simulate_scheduler.measure_detection(timelines, {"CPSC 221 101": [0, 150, 305, 400]})
+
+        self.assertEqual((delays, missed), ([50, 5], 0))
+        self.assertEqual(simulate_scheduler.measure_detection(timelines, {"CPSC 221 101": [0, 250, 400]}),
+                         ([], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import support
+import seat_history
+from seat_history import SeatHistory
+from seat_parser import SeatsInfo
+
+
+class SeatHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='seat_history')
+        self.path = os.path.join(self.directory, 'seat_history.dat')
+        self.history = SeatHistory(self.path)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.history.close()
+        self.history = SeatHistory(self.path)
+
+    def test_timeline(self):
+        self.history.append("CPSC 221 101", 10, SeatsInfo(0, 150, 0, 0))
+        self.history.append("MATH 200 101", 15, SeatsInfo(5, 40, 5, 0))
+        self.history.append("cpsc  221 101", 20, SeatsInfo(1, 149, 1, 0))
+        self.history.append("CPSC 221 101", 30, SeatsInfo(0, None, 0, 0))
+
+        self.assertEqual(self.history.get_timeline("CPSC 221 101"),
+                         [(10, SeatsInfo(0, 150, 0, 0)), (20, SeatsInfo(1, 149, 1, 0)), (30, SeatsInfo(0, None, 0, 0))])
+        self.assertEqual(self.history.get_timeline("CPSC 221 101", start=15, end=30), [(20, SeatsInfo(1, 149, 1, 0))])
+        self.assertEqual(self.history.get_timeline("PHYS 101 101"), [])
+        self.assertEqual(self.history.get_sections(), ["CPSC 221 101", "MATH 200 101"])
+
+    def test_changes_ignore_missing_counts(self):
+        self.history.append("CPSC 221 101", 10, SeatsInfo(0, 150, 0, 0))
+        self.history.append("CPSC 221 101", 20, SeatsInfo(0, None, 0, 0))
+        self.history.append("CPSC 221 101", 30, SeatsInfo(1, 149, 1, 0))
+        self.history.append("CPSC 221 101", 40, SeatsInfo(1, 149, 1, 0))
+
+        self.assertEqual(self.history.get_changes("CPSC 221 101"),
+                         [(30, SeatsInfo(0, None, 0, 0), SeatsInfo(1, 149, 1, 0))])
+
+    def test_churn_rates(self):
+        for index in range(5):
+            self.history.append("CPSC 221 101", index * 30 * 60, SeatsInfo(0, 150 + index, 0, 0))
+            self.history.append("MATH 200 101", index * 30 * 60, SeatsInfo(5, 40, 5, 0))
+
+        self.assertEqual(self.history.get_churn_rates(), {"CPSC 221 101": 2.0, "MATH 200 101": 0.0})
+
+    def test_reopen(self):
+        self.history.append("CPSC 221 101", 10, SeatsInfo(0, 150, 0, 0))
+        self.history.append("MATH 200 101", 20, SeatsInfo(5, 40, 5, 0))
+        self.reopen()
+        self.history.append("MATH 200 101", 30, SeatsInfo(4, 41, 4, 0))
+        self.history.append("PHYS 101 101", 40, SeatsInfo(2, 10, 2, 0))
+        self.reopen()
+
+        self.assertEqual(self.history.record_count, 4)
+        self.assertEqual(self.history.get_sections(), ["CPSC 221 101", "MATH 200 101", "PHYS 101 101"])
+        self.assertEqual(self.history.get_timeline("MATH 200 101"),
+                         [(20, SeatsInfo(5, 40, 5, 0)), (30, SeatsInfo(4, 41, 4, 0))])
+        self.assertEqual(self.history.get_timeline("PHYS 101 101"), [(40, SeatsInfo(2, 10, 2, 0))])
+
+    def test_grows_past_the_initial_capacity(self):
+        record_count = seat_history.INITIAL_CAPACITY * 2 + 1
+        for index in range(record_count):
+            self.history.append("CPSC 221 {0}".format(101 + index % 3), index, SeatsInfo(index % 7, index % 300, 0, 0))
+        self.reopen()
+
+        self.assertEqual(self.history.record_count, record_count)
+        timeline = self.history.get_timeline("CPSC 221 102")
+        self.assertEqual(len(timeline), (record_count + 1) // 3)
+        self.assertEqual(timeline[-1], (record_count - 2, SeatsInfo((record_count - 2) % 7, (record_count - 2) % 300,
+                                                                    0, 0)))
+
+    def test_refuses_a_history_open_in_another_process(self):
+        self.history.append("CPSC 221 101", 10, SeatsInfo(0, 150, 0, 0))
+        open_history = ("import sys\nsys.path.insert(0, {0!r})\nfrom seat_history import SeatHistory\n"
+                        "try:\n    SeatHistory({1!r}).close()\nexcept IOError as e:\n    print e\n").format(
+            support.SOURCE_DIR, self.path)
+
+        self.assertIn("used by another running bot", subprocess.check_output([sys.executable, '-c', open_history]))
+        self.assertRaises(IOError, SeatHistory, self.path)
+
+        # the records are left as they were and the history opens again once closed
+        self.history.append("CPSC 221 101", 20, SeatsInfo(1, 149, 1, 0))
+        self.history.close()
+        self.assertEqual(subprocess.check_output([sys.executable, '-c', open_history]), "")
+        self.history = SeatHistory(self.path)
+        self.assertEqual(self.history.record_count, 2)
+
+    def test_refuses_other_files(self):
+        other_path = os.path.join(self.directory, 'other.dat')
+        with open(other_path, 'w') as other_file:
+            other_file.write("not a seat history at all")
+
+        self.assertRaises(ValueError, SeatHistory, other_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import timeit
+import unittest
+from support import Response, StubServer, seat_page, use_stub_server
+import bench_seat_parser
+import courses_manager
+from seat_parser import SeatSummaryParser, SeatsInfo, parse_seats_info
+
+PAGE_HTML = seat_page(4, 156, 3, 1, padding=300)
+SEATS_INFO = SeatsInfo(4, 156, 3, 1)
+
+
+def feed_in_chunks(page_html, chunk_size):
+    parser = SeatSummaryParser()
+    for start in range(0, len(page_html), chunk_size):
+        if parser.feed(page_html[start:start + chunk_size]):
+            break
+    return parser
+
+
+class SeatSummaryParserTest(unittest.TestCase):
+    def test_whole_page(self):
+        self.assertEqual(parse_seats_info(PAGE_HTML), SEATS_INFO)
+
+    def test_page_split_at_every_position(self):
+        for split in range(len(PAGE_HTML) + 1):
+            parser = SeatSummaryParser()
+            parser.feed(PAGE_HTML[:split])
+            parser.feed(PAGE_HTML[split:])
+            self.assertEqual(parser.result(), SEATS_INFO, "split at {0}".format(split))
+
+    def test_every_chunk_size(self):
+        for chunk_size in range(1, len(PAGE_HTML) + 1):
+            self.assertEqual(feed_in_chunks(PAGE_HTML, chunk_size).result(), SEATS_INFO,
+                             "chunks of {0}".format(chunk_size))
+
+    def test_done_once_the_summary_is_consumed(self):
+        summary_end = PAGE_HTML.find("</table>")
+        parser = SeatSummaryParser()
+
+        self.assertTrue(parser.feed(PAGE_HTML[:summary_end]))
+        self.assertTrue(parser.feed("anything after the summary"))
+        self.assertEqual(parser.result(), SEATS_INFO)
+
+    def test_missing_seat_count(self):
+        page_html = PAGE_HTML.replace("Currently Registered", "Currently Waitlisted")
+
+        self.assertIsNone(parse_seats_info(page_html))
+        self.assertIsNone(feed_in_chunks(page_html, 7).result())
+
+    def test_page_without_summary(self):
+        self.assertIsNone(parse_seats_info("<html><body>Please log in</body></html>"))
+
+
+class SeatParserBenchmarkTest(unittest.TestCase):
+    def test_every_parser_agrees_on_the_benchmark_pages(self):
+        pages = bench_seat_parser.build_pages()
+        self.assertEqual([(name, seats_info) for name, _, seats_info in pages],
+                         [("recorded", SEATS_INFO), ("full size", SEATS_INFO), ("malformed", None),
+                          ("no section", None)])
+
+        # raises if any parser gets a page wrong
+        results = bench_seat_parser.measure(pages, 1)
+        self.assertEqual(len(results), 3 * len(pages))
+
+    def test_single_pass_skips_what_comes_before_the_summary(self):
+        pages = dict((name, html) for name, html, _ in bench_seat_parser.build_pages())
+        for name in ("full size", "no section"):
+            four_regex_seconds, single_pass_seconds = [
+                min(timeit.repeat(lambda: parse(pages[name]), number=200, repeat=3))
+                for parse in (bench_seat_parser.parse_with_four_regexes, parse_seats_info)]
+            self.assertLess(single_pass_seconds, four_regex_seconds / 2, name)
+
+
+class StreamedSeatCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_summary_spanning_read_chunks(self):
+        course = courses_manager.Course("CPSC 221 101")
+        # puts the seat summary across the boundary of the first 2 chunks read
+        padding = courses_manager.READ_CHUNK_SIZE - len("<html><body>") - 100
+        self.server.set_responses(course.course_url, Response(body=seat_page(4, 156, 3, 1, padding=padding)))
+
+        self.assertEqual(course.get_seats_info(), SEATS_INFO)
+
+
+if __name__ == '__main__':
+    unittest.main()
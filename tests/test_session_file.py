@@ -0,0 +1,183 @@
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from support import LOGOUT_BUTTON_HTML, SOURCE_DIR, Response, StubServer, use_site_urls, use_stub_server
+import courses_manager
+import main
+from replay import ReplayHandler
+
+
+class SessionFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='session')
+        self.cookie_file = os.path.join(self.directory, 'session_cookies.lwp')
+        self.user_cookie_file = courses_manager.get_session_file(self.cookie_file, "user")
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.login_page_url = self.server.base_url + "/cs/secure/login"
+        self.server.set_responses(self.login_page_url, Response(
+            body="<html>" + LOGOUT_BUTTON_HTML + "</html>", headers={'Set-Cookie': "JSESSIONID=session-1; Path=/"}))
+        self.server.set_responses(courses_manager.LOGIN_STATUS_URL,
+                                  Response(body="<html>" + LOGOUT_BUTTON_HTML + "</html>"))
+
+    def tearDown(self):
+        self.server.shutdown()
+        shutil.rmtree(self.directory)
+
+    def log_in_and_save(self, user_id="user"):
+        account = courses_manager.AccountSession(user_id, "password", cookie_file=self.cookie_file)
+        courses_manager._URL_request_helper(self.login_page_url, account=account)
+        courses_manager.save_session(account)
+
+    def resume(self, user_id="user"):
+        """
+        :return: a tuple (whether the session was resumed, the new AccountSession)
+        """
+        # like main.py, the account isn't known until the session is resumed
+        account = courses_manager.AccountSession(cookie_file=self.cookie_file)
+        # cancels the refresh timer of the resumed session so it doesn't run into the other tests
+        self.addCleanup(account.session_state.mark_invalid)
+        return courses_manager.resume_session(user_id, "password", account), account
+
+    def test_session_file_is_private(self):
+        self.log_in_and_save()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.user_cookie_file).st_mode), 0600)
+        with open(self.user_cookie_file) as cookie_file:
+            self.assertIn("JSESSIONID", cookie_file.read())
+
+    def test_readable_session_file_is_made_private(self):
+        with open(self.user_cookie_file, 'w'):
+            pass
+        os.chmod(self.user_cookie_file, 0644)
+
+        self.log_in_and_save()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.user_cookie_file).st_mode), 0600)
+
+    def test_saved_session_is_resumed_with_one_request(self):
+        self.log_in_and_save()
+        del self.server.requests[:]
+
+        is_resumed, account = self.resume()
+
+        self.assertTrue(is_resumed)
+        self.assertTrue(account.session_state.is_valid())
+        self.assertEqual(self.server.requests, [courses_manager.LOGIN_STATUS_URL])
+        self.assertEqual(self.server.last_headers[courses_manager.LOGIN_STATUS_URL]['cookie'], "JSESSIONID=session-1")
+
+    def test_expired_session_is_not_resumed(self):
+        self.log_in_and_save()
+        self.server.set_responses(courses_manager.LOGIN_STATUS_URL, Response(body="<html>Please log in</html>"))
+
+        is_resumed, account = self.resume()
+
+        self.assertFalse(is_resumed)
+        self.assertFalse(account.session_state.is_valid())
+
+    def test_session_of_another_account_is_not_resumed(self):
+        self.log_in_and_save("alice")
+        del self.server.requests[:]
+
+        is_resumed, account = self.resume("bob")
+
+        self.assertFalse(is_resumed)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(len(account.cookie_jar), 0)
+        self.assertEqual(os.listdir(self.directory), ["session_cookies_alice.lwp"])
+
+    def test_account_without_a_user_id_is_not_saved(self):
+        account = courses_manager.AccountSession(cookie_file=self.cookie_file)
+        courses_manager._URL_request_helper(self.login_page_url, account=account)
+
+        courses_manager.save_session(account)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_missing_or_broken_session_file(self):
+        self.assertEqual(self.resume()[0], False)
+        self.assertEqual(self.server.requests, [])
+
+        with open(self.user_cookie_file, 'w') as cookie_file:
+            cookie_file.write("not a cookie file")
+        self.assertEqual(self.resume()[0], False)
+        self.assertEqual(self.server.requests, [])
+
+
+class WarmStartTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='session')
+        self.cookie_file = os.path.join(self.directory, 'session_cookies.lwp')
+        use_site_urls()
+        self.addCleanup(setattr, courses_manager, 'replay_handler', courses_manager.replay_handler)
+        # every exchange with the UBC site takes as long as a round trip to it
+        courses_manager.replay_handler = ReplayHandler(os.path.join(SOURCE_DIR, 'fixtures', 'ubc_session.jsonl'),
+                                                       latency=0.05)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def start(self):
+        """
+        Starts like main.py, up to the first seat check
+
+        :return: seconds taken to start
+        """
+        started_at = time.time()
+        account = courses_manager.AccountSession(cookie_file=self.cookie_file)
+        self.addCleanup(account.session_state.mark_invalid)
+        if not courses_manager.resume_session("user", "password", account):
+            courses_manager.send_login_request("user", "password", account)
+            self.assertTrue(courses_manager.is_logged_in(account))
+        courses_manager.Course("CPSC 221 101").get_seats_info(account)
+        return time.time() - started_at
+
+    def test_warm_start_skips_the_login(self):
+        cold_start_seconds = self.start()
+        replayed_before = courses_manager.replay_handler.replayed
+        warm_start_seconds = self.start()
+
+        # the login status check and the seat check, against the 3 login requests, a login status check and the seat
+        # check of a cold start
+        self.assertEqual(courses_manager.replay_handler.replayed - replayed_before, 2)
+        self.assertLess(warm_start_seconds, cold_start_seconds / 2)
+
+
+class WatchListFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='watch_list')
+        self.path = os.path.join(self.directory, 'courses.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_watch_list(self, *lines):
+        with open(self.path, 'w') as watch_list_file:
+            watch_list_file.write("\n".join(lines) + "\n")
+
+    def test_comments_and_empty_lines_are_skipped(self):
+        self.write_watch_list("# labs first", "CPSC 221 L1A|L1B, T, F", "", "  eosc 114 101, t, f, EOSC 114 102  ")
+
+        self.assertEqual(main.read_watch_list_file(self.path), ["CPSC 221 L1A|L1B, T, F",
+                                                                "eosc 114 101, t, f, EOSC 114 102"])
+
+    def test_any_invalid_line_rejects_the_file(self):
+        for invalid_line in ("CPSC 221 101, T", "CPSC221 101, T, F", "CPSC 221 101, T, F, EOSC 114",
+                             "CPSC 221 L1A|MATH 200 101, T, F"):
+            self.write_watch_list("CPSC 221 101, T, F", invalid_line)
+            self.assertIsNone(main.read_watch_list_file(self.path), invalid_line)
+
+    def test_courses_listed_first_get_the_highest_priority(self):
+        courses = [main.parse_course_info(line, priority)
+                   for priority, line in ((2, "CPSC 221 101, T, F"), (1, "EOSC 114 101, F, T, EOSC 114 102"))]
+
+        self.assertEqual([(course.name, course.priority, course.allow_restricted_seats, course.monitor_only,
+                           course.current_registered_section) for course in sum(courses, [])],
+                         [("CPSC 221 101", 2, True, False, None), ("EOSC 114 101", 1, False, True, "EOSC 114 102")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import time
+import unittest
+from support import LOGOUT_BUTTON_HTML, Response, StubServer, use_stub_server
+import courses_manager
+from courses_manager import SessionState
+
+
+class SessionStateTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.server.set_responses(courses_manager.LOGIN_STATUS_URL,
+                                  Response(body="<html>" + LOGOUT_BUTTON_HTML + "</html>"))
+        self.account = courses_manager.AccountSession()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def count_login_checks(self):
+        return self.server.count_requests(courses_manager.LOGIN_STATUS_URL)
+
+    def test_trusted_session_makes_no_request(self):
+        self.account.session_state.mark_valid()
+
+        self.account.session_state.ensure_logged_in("user", "password")
+
+        self.assertEqual(self.server.requests, [])
+
+    def test_untrusted_session_is_checked_first(self):
+        self.account.session_state.ensure_logged_in("user", "password")
+
+        # the check found the session still logged in so no login was needed
+        self.assertEqual(self.server.requests, [courses_manager.LOGIN_STATUS_URL])
+        self.assertTrue(self.account.session_state.is_valid())
+
+    def test_session_is_trusted_for_the_ttl(self):
+        session_state = SessionState(self.account, ttl=0.2, refresh_margin=0)
+        session_state.mark_valid()
+        self.assertTrue(session_state.is_valid())
+
+        time.sleep(0.3)
+        self.assertFalse(session_state.is_valid())
+        session_state.ensure_logged_in("user", "password")
+        self.assertEqual(self.count_login_checks(), 1)
+
+    def test_session_is_refreshed_before_it_runs_out(self):
+        session_state = SessionState(self.account, ttl=0.4, refresh_margin=0.3)
+        self.account.session_state = session_state
+        # cancels the refresh timer so it doesn't run into the other tests
+        self.addCleanup(session_state.mark_invalid)
+        session_state.set_credentials("user", "password")
+        session_state.mark_valid()
+
+        # refreshed every 0.1 seconds, so it's still trusted long after the ttl
+        time.sleep(0.6)
+        self.assertGreaterEqual(self.count_login_checks(), 2)
+        self.assertTrue(session_state.is_valid())
+
+    def test_redirect_to_the_login_page_ends_the_session(self):
+        course = courses_manager.Course("CPSC 221 101")
+        self.server.set_responses(course.course_url,
+                                  Response(302, headers={'Location': courses_manager.CAS_LOGIN_URL + "?service=x"}))
+        self.server.set_responses(courses_manager.CAS_LOGIN_URL + "?service=x", Response(body="<html>login</html>"))
+        self.account.session_state.mark_valid()
+
+        self.assertIsNone(course.get_seats_info(self.account))
+        self.assertFalse(self.account.session_state.is_valid())
+
+
+if __name__ == '__main__':
+    unittest.main()
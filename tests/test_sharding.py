@@ -0,0 +1,161 @@
+import multiprocessing
+import threading
+import time
+import unittest
+from support import Response, StubServer, seat_page, use_stub_server
+import courses_manager
+import sharding
+from scheduler import AdaptivePollScheduler
+from seat_parser import SeatsInfo
+
+AUTHKEY = 'test shard key'
+# seconds the stub takes to answer a section page, long enough that the workers wait on the stub rather than the CPU
+PAGE_DELAY = 0.2
+
+
+def run_worker(address, node_id):
+    worker = sharding.Worker(address, AUTHKEY, node_id)
+    # every course is checked as soon as its last check is done
+    worker._poll_scheduler = AdaptivePollScheduler(10 ** 9, 0.001, (0.001, 0.001), [])
+    worker.run()
+
+
+class HashRingTest(unittest.TestCase):
+    def setUp(self):
+        self.ring = sharding.HashRing()
+        for node_id in ("worker 1", "worker 2", "worker 3", "worker 4"):
+            self.ring.add_node(node_id)
+        self.keys = ["CPSC {0} {1}".format(100 + index // 10, 101 + index % 10) for index in range(2000)]
+
+    def get_assignments(self):
+        return dict((key, self.ring.get_node(key)) for key in self.keys)
+
+    def test_keys_spread_evenly(self):
+        assignments = self.get_assignments().values()
+        for node_id in ("worker 1", "worker 2", "worker 3", "worker 4"):
+            self.assertGreater(assignments.count(node_id), len(self.keys) / 4 * 0.6)
+            self.assertLess(assignments.count(node_id), len(self.keys) / 4 * 1.4)
+
+    def test_leaving_node_only_moves_its_own_keys(self):
+        before = self.get_assignments()
+        self.ring.remove_node("worker 2")
+        after = self.get_assignments()
+
+        for key in self.keys:
+            if before[key] != "worker 2":
+                self.assertEqual(after[key], before[key])
+            self.assertNotEqual(after[key], "worker 2")
+
+    def test_joining_node_only_takes_keys(self):
+        before = self.get_assignments()
+        self.ring.add_node("worker 5")
+        after = self.get_assignments()
+
+        moved_keys = [key for key in self.keys if after[key] != before[key]]
+        self.assertTrue(all(after[key] == "worker 5" for key in moved_keys))
+        self.assertLess(len(moved_keys), len(self.keys) / 5 * 1.4)
+
+    def test_empty_ring(self):
+        self.assertIsNone(sharding.HashRing().get_node("CPSC 221 101"))
+
+
+class AddressAndAuthkeyTest(unittest.TestCase):
+    def test_requires_an_authkey(self):
+        self.assertRaises(ValueError, sharding.check_address_and_authkey, ('127.0.0.1', 6000), None)
+        self.assertRaises(ValueError, sharding.check_address_and_authkey, ('127.0.0.1', 6000), '')
+
+    def test_requires_a_loopback_address(self):
+        self.assertRaises(ValueError, sharding.check_address_and_authkey, ('10.1.2.3', 6000), AUTHKEY)
+        self.assertRaises(ValueError, sharding.check_address_and_authkey, ('no such host.invalid', 6000), AUTHKEY)
+        sharding.check_address_and_authkey(('localhost', 6000), AUTHKEY)
+        sharding.check_address_and_authkey(('127.0.0.1', 6000), AUTHKEY)
+
+
+class ShardedCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.checks = []
+        self.checks_changed = threading.Condition()
+        self.coordinator = sharding.Coordinator(('127.0.0.1', 0), AUTHKEY, on_checked=self.on_checked)
+        self.workers = []
+
+        self.courses = [courses_manager.Course("CPSC {0} 101".format(100 + index)) for index in range(80)]
+        for course in self.courses:
+            self.server.set_responses(course.course_url, Response(body=seat_page(0, 150, 0, 0), delay=PAGE_DELAY))
+            self.coordinator.add_course(course)
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.terminate()
+            worker.join()
+        self.server.shutdown()
+
+    def on_checked(self, course, seats_info, checked_at):
+        with self.checks_changed:
+            self.checks.append((course.name, seats_info, checked_at))
+            self.checks_changed.notify_all()
+
+    def start_workers(self, worker_count):
+        # the workers are forked so they check the stub server too
+        for index in range(worker_count):
+            worker = multiprocessing.Process(target=run_worker, args=(self.coordinator._listener.address,
+                                                                      "worker {0}".format(len(self.workers) + 1)))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        self.wait_for(lambda: self.coordinator.get_stats()["workers"] == len(self.workers))
+
+    def wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        with self.checks_changed:
+            while not condition():
+                self.assertLess(time.time(), deadline, "timed out")
+                self.checks_changed.wait(0.1)
+
+    def get_checked_names(self, since=0):
+        with self.checks_changed:
+            return set(name for name, _, checked_at in self.checks if checked_at >= since)
+
+    def measure_checks_per_second(self, seconds):
+        with self.checks_changed:
+            del self.checks[:]
+        time.sleep(seconds)
+        with self.checks_changed:
+            return len(self.checks) / float(seconds)
+
+    def test_every_course_is_checked_and_reported(self):
+        self.start_workers(2)
+        all_names = set(course.name for course in self.courses)
+        self.wait_for(lambda: self.get_checked_names() == all_names)
+
+        with self.checks_changed:
+            self.assertTrue(all(seats_info == SeatsInfo(0, 150, 0, 0) for _, seats_info, _ in self.checks))
+        courses, seats_info = self.coordinator.get_observations(1)[0]
+        self.assertIn(courses, self.courses)
+
+    def test_courses_of_a_leaving_worker_move_to_the_others(self):
+        self.start_workers(2)
+        all_names = set(course.name for course in self.courses)
+        self.wait_for(lambda: self.get_checked_names() == all_names)
+
+        self.workers[0].terminate()
+        self.wait_for(lambda: self.coordinator.get_stats()["workers"] == 1)
+        left_at = time.time()
+        self.wait_for(lambda: self.get_checked_names(left_at) == all_names)
+
+    def test_checks_per_second_grow_with_the_workers(self):
+        checks_per_second = []
+        for worker_count in (1, 2, 4):
+            self.start_workers(worker_count - len(self.workers))
+            # lets the courses settle on their new workers
+            time.sleep(0.5)
+            checks_per_second.append(self.measure_checks_per_second(2))
+
+        # every worker checks at most MAX_CONCURRENT_CHECKS pages at a time
+        self.assertGreater(checks_per_second[1], checks_per_second[0] * 1.5)
+        self.assertGreater(checks_per_second[2], checks_per_second[1] * 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from support import LOGOUT_BUTTON_HTML, Response, StubServer, seat_page, use_stub_server
+import bench_streaming
+import CONFIGS
+import courses_manager
+from seat_parser import SeatsInfo
+
+# bytes of page after the part that matters, far more than is read before stopping
+TRAILING_BYTES = 4 * 1024 * 1024
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        use_stub_server(self.server)
+        self.account = courses_manager.AccountSession()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def get_bytes_read(self):
+        return courses_manager.http_pool.get_stats()["bytes read"]
+
+    def test_seat_check_stops_after_the_summary(self):
+        course = courses_manager.Course("CPSC 221 101")
+        self.server.set_responses(course.course_url, Response(
+            body=seat_page(4, 156, 3, 1) + "<!--" + "x" * TRAILING_BYTES + "-->"))
+        bytes_read_before = self.get_bytes_read()
+
+        self.assertEqual(course.get_seats_info(self.account), SeatsInfo(4, 156, 3, 1))
+
+        self.assertLess(self.get_bytes_read() - bytes_read_before, 4 * courses_manager.READ_CHUNK_SIZE)
+        # the logout button on the page shows the session is still valid
+        self.assertTrue(self.account.session_state.is_valid())
+
+    def test_login_check_stops_at_the_logout_button(self):
+        self.server.set_responses(courses_manager.LOGIN_STATUS_URL, Response(
+            body="<html>" + LOGOUT_BUTTON_HTML + "x" * TRAILING_BYTES + "</html>"))
+        bytes_read_before = self.get_bytes_read()
+
+        self.assertTrue(courses_manager.is_logged_in(self.account))
+
+        self.assertLess(self.get_bytes_read() - bytes_read_before, 4 * courses_manager.READ_CHUNK_SIZE)
+        self.assertTrue(self.account.session_state.is_valid())
+
+    def test_login_check_without_the_button(self):
+        self.account.session_state.mark_valid()
+        self.server.set_responses(courses_manager.LOGIN_STATUS_URL, Response(body="<html>Please log in</html>"))
+
+        self.assertFalse(courses_manager.is_logged_in(self.account))
+        self.assertFalse(self.account.session_state.is_valid())
+
+    def test_blocked_page(self):
+        course = courses_manager.Course("CPSC 221 101")
+        self.server.set_responses(course.course_url,
+                                  Response(body="<html><head>" + courses_manager.BLOCKED_PAGE_HTML + "</head></html>"))
+
+        self.assertIsNone(course.get_seats_info(self.account))
+        # the server refusing pages is taken as a sign of trouble
+        self.assertEqual(courses_manager.rate_limiter.get_rates().values(), [CONFIGS.MAX_REQUESTS_PER_SECOND / 2.0])
+
+
+class StreamingBenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        for name in ('COURSE_URL_TEMPLATE', 'http_pool', 'default_account', 'response_cache'):
+            self.addCleanup(setattr, courses_manager, name, getattr(courses_manager, name))
+        _, self.page_html, self.seats_info = [page for page in bench_streaming.build_pages()
+                                              if page[0] == "full size"][0]
+
+    def measure(self, check, bytes_per_second=None):
+        return bench_streaming.measure(check, self.page_html, self.seats_info, 10, bytes_per_second)
+
+    def test_streamed_check_reads_up_to_the_summary(self):
+        full_read = self.measure(bench_streaming.check_with_full_read)
+        streamed = self.measure(bench_streaming.check_streamed)
+
+        self.assertEqual(full_read[0], len(self.page_html))
+        summary_end = self.page_html.index("Restricted Seats Remaining")
+        self.assertLess(streamed[0], summary_end + courses_manager.READ_CHUNK_SIZE)
+        # the rest of the page is thrown away with its connection
+        self.assertEqual((full_read[2], streamed[2]), (0.1, 1.0))
+
+    def test_streamed_check_is_faster_over_a_slow_link(self):
+        full_read = self.measure(bench_streaming.check_with_full_read, 1024 * 1024)
+        streamed = self.measure(bench_streaming.check_streamed, 1024 * 1024)
+
+        self.assertLess(streamed[3], full_read[3] * 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
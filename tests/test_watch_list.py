@@ -0,0 +1,61 @@
+import unittest
+import support
+import courses_manager
+from courses_manager import Course, WatchList
+
+
+class WatchListTest(unittest.TestCase):
+    def setUp(self):
+        self.watch_list = WatchList()
+        self.register_course = Course("CPSC 221 101")
+        self.switch_course = Course("CPSC 221 102", current_registered_section="CPSC 221 103")
+        self.monitor_course = Course("MATH 200 101", monitor_only=True)
+        for course in (self.register_course, self.switch_course, self.monitor_course):
+            self.watch_list.add(course)
+
+    def test_names_are_normalized(self):
+        self.assertFalse(self.watch_list.add(Course("cpsc  221 101")))
+        self.assertIn("cpsc 221  101", self.watch_list)
+        self.assertIs(self.watch_list.get(" Cpsc 221 101 "), self.register_course)
+        self.assertEqual(len(self.watch_list), 3)
+
+    def test_indexes(self):
+        self.assertEqual(sorted(course.name for course in self.watch_list.get_by_department("cpsc")),
+                         ["CPSC 221 101", "CPSC 221 102"])
+        self.assertEqual(self.watch_list.get_by_action(WatchList.REGISTER), [self.register_course])
+        self.assertEqual(self.watch_list.get_by_action(WatchList.SWITCH), [self.switch_course])
+        self.assertEqual(self.watch_list.get_by_action(WatchList.MONITOR), [self.monitor_course])
+        self.assertEqual(self.watch_list.get_by_department("PHYS"), [])
+
+    def test_remove(self):
+        self.assertTrue(self.watch_list.remove("CPSC 221 102"))
+        self.assertFalse(self.watch_list.remove(self.switch_course))
+
+        self.assertNotIn(self.switch_course, self.watch_list)
+        self.assertEqual(self.watch_list.get_by_action(WatchList.SWITCH), [])
+        self.assertEqual(self.watch_list.get_by_department("CPSC"), [self.register_course])
+
+    def test_remove_while_iterating(self):
+        for course in self.watch_list:
+            self.watch_list.remove(course)
+
+        self.assertEqual(len(self.watch_list), 0)
+        self.assertEqual(list(self.watch_list), [])
+
+    def test_iterates_in_insertion_order(self):
+        self.assertEqual(list(self.watch_list), [self.register_course, self.switch_course, self.monitor_course])
+
+    def test_module_functions_use_the_account_watch_list(self):
+        account = courses_manager.AccountSession()
+
+        courses_manager.add_course_to_watch(Course("CPSC 221 101"), account)
+        courses_manager.add_course_to_watch(Course("CPSC 221 101"), account)
+        self.assertEqual([course.name for course in courses_manager.get_courses_watch_list(account)],
+                         ["CPSC 221 101"])
+
+        courses_manager.remove_course_from_watch(Course("CPSC 221 101"), account)
+        self.assertEqual(len(courses_manager.get_courses_watch_list(account)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()